@@ -0,0 +1,118 @@
+"""Database throughput under concurrent load, per pool configuration.
+
+Worker threads run short repository-style reads (a track lookup by video_id
+or a user's latest history page) against the database configured in ``.env``
+and report queries per second, query latency and pool checkout wait for each
+configuration, e.g. pre-ping on/off or a pool smaller than the thread count:
+
+    python -m bench.db_qps --threads 32 --seconds 10 --pool-size 5 --max-overflow 10
+
+The tracks/history tables are only read; an empty database still measures
+pool and round-trip overhead.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import threading
+import time
+from typing import Dict, List
+
+from bench.run import percentile
+
+
+def _load_keys(engine, limit: int = 1000):
+    from sqlalchemy import select
+    from db.models import Track, User
+    with engine.connect() as conn:
+        video_ids = [r[0] for r in conn.execute(select(Track.video_id).limit(limit))]
+        user_ids = [r[0] for r in conn.execute(select(User.id).limit(limit))]
+    return video_ids or ['missing'], user_ids or [0]
+
+
+def _run_config(label: str, args, *, pre_ping: bool) -> Dict[str, float]:
+    from sqlalchemy import select
+    from sqlalchemy.orm import sessionmaker
+    from db.db_session import make_engine
+    from db.models import History, Track
+
+    engine = make_engine(args.pool_size, args.max_overflow, pre_ping=pre_ping)
+    factory = sessionmaker(bind=engine, expire_on_commit=False, future=True)
+    video_ids, user_ids = _load_keys(engine)
+    latencies: List[List[float]] = [[] for _ in range(args.threads)]
+    waits: List[List[float]] = [[] for _ in range(args.threads)]
+    errors = [0] * args.threads
+    start_barrier = threading.Barrier(args.threads + 1)
+    deadline = [0.0]
+
+    def worker(i: int) -> None:
+        rnd = random.Random(args.seed + i)
+        start_barrier.wait()
+        while time.perf_counter() < deadline[0]:
+            started = time.perf_counter()
+            try:
+                with factory() as session:
+                    session.connection()
+                    acquired = time.perf_counter()
+                    if rnd.random() < 0.7:
+                        session.execute(select(Track.id, Track.title).where(Track.video_id == rnd.choice(video_ids))).first()
+                    else:
+                        session.execute(
+                            select(History.id, History.track_id)
+                            .where(History.user_id == rnd.choice(user_ids))
+                            .order_by(History.id.desc())
+                            .limit(20)
+                        ).all()
+                    session.commit()
+            except Exception:
+                errors[i] += 1
+                continue
+            waits[i].append(acquired - started)
+            latencies[i].append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(args.threads)]
+    for t in threads:
+        t.start()
+    deadline[0] = time.perf_counter() + args.seconds
+    start_barrier.wait()
+    for t in threads:
+        t.join()
+    engine.dispose()
+
+    all_lat = [v for row in latencies for v in row]
+    all_wait = [v for row in waits for v in row]
+    return {
+        'config': label,
+        'queries': len(all_lat),
+        'qps': round(len(all_lat) / args.seconds, 1),
+        'p50_ms': round(percentile(all_lat, 50) * 1000, 2),
+        'p99_ms': round(percentile(all_lat, 99) * 1000, 2),
+        'wait_p99_ms': round(percentile(all_wait, 99) * 1000, 2),
+        'errors': sum(errors),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--pool-size', type=int, default=int(os.getenv('DB_POOL_SIZE', '5')))
+    parser.add_argument('--max-overflow', type=int, default=int(os.getenv('DB_MAX_OVERFLOW', '10')))
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+    os.environ.setdefault('TELEGRAM_TOKEN', '123456:BENCH-TOKEN')
+
+    rows = [
+        _run_config('recycle only', args, pre_ping=False),
+        _run_config('pre-ping', args, pre_ping=True),
+    ]
+    print(f"threads={args.threads} pool_size={args.pool_size} max_overflow={args.max_overflow} seconds={args.seconds}")
+    print(f"\n{'config':<16}{'queries':>10}{'qps':>10}{'p50 ms':>10}{'p99 ms':>10}{'wait p99':>10}{'errors':>8}")
+    for r in rows:
+        print(f"{r['config']:<16}{r['queries']:>10}{r['qps']:>10}{r['p50_ms']:>10.2f}{r['p99_ms']:>10.2f}"
+              f"{r['wait_p99_ms']:>10.2f}{r['errors']:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import io
+import json
+import re
+import threading
+import time
+import itertools
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qs
+
+# Local stand-in for api.telegram.org. Implements just the Bot API methods the
+# handlers call and answers with minimal but valid objects. Point PTB at it with
+# TELEGRAM_API_BASE_URL=http://127.0.0.1:<port>. It also serves thumbnail JPEGs
+# under /thumbs/<id>.jpg for the fake YouTube layer.
+
+_PATH_RE = re.compile(r"^/bot(?P<token>[^/]+)/(?P<method>\w+)$")
+_MULTIPART_FIELD_RE = re.compile(rb'name="(?P<name>[^"]+)"\r\n(?:[^\r\n]+\r\n)*\r\n(?P<value>[^\r]*)\r\n')
+
+
+def _tiny_jpeg() -> bytes:
+    try:
+        from PIL import Image
+        buf = io.BytesIO()
+        Image.new('RGB', (320, 180), (40, 40, 40)).save(buf, format='JPEG', quality=70)
+        return buf.getvalue()
+    except Exception:
+        return b''
+
+
+class FakeBotApi:
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, *, latency_ms: float = 0.0, upload_ms_per_mb: float = 0.0):
+        self.latency_ms = latency_ms
+        self.upload_ms_per_mb = upload_ms_per_mb
+        self.calls: Dict[str, int] = {}
+        self._ids = itertools.count(1000)
+        self._lock = threading.Lock()
+        self._thumb = _tiny_jpeg()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeBotApi":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="FakeBotApi", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _count(self, method: str) -> int:
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            return next(self._ids)
+
+    def _message(self, message_id: int, chat_id: Any, **extra) -> Dict[str, Any]:
+        try:
+            chat_id = int(chat_id)
+        except (TypeError, ValueError):
+            chat_id = 0
+        return {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            **extra,
+        }
+
+    def handle(self, method: str, params: Dict[str, Any], body_size: int) -> Any:
+        message_id = self._count(method)
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        if method == 'getMe':
+            return {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot",
+                    "can_join_groups": True, "can_read_all_group_messages": False, "supports_inline_queries": False}
+        if method in ('deleteMessage', 'answerCallbackQuery', 'setMyCommands', 'deleteWebhook'):
+            return True
+        if method == 'sendAudio':
+            if self.upload_ms_per_mb:
+                time.sleep(body_size / (1024 * 1024) * self.upload_ms_per_mb / 1000)
+            audio = {
+                "file_id": f"bench-file-{message_id}",
+                "file_unique_id": f"bench-u-{message_id}",
+                "duration": int(params.get('duration') or 0),
+                "title": params.get('title'),
+                "performer": params.get('performer'),
+            }
+            return self._message(message_id, params.get('chat_id'), audio=audio, caption=params.get('caption'))
+        if method in ('sendMessage', 'editMessageText', 'editMessageReplyMarkup', 'sendVideo', 'sendDocument'):
+            if method.startswith('edit') and params.get('message_id'):
+                message_id = int(params['message_id'])
+            return self._message(message_id, params.get('chat_id'), text=params.get('text') or '')
+        return True
+
+    def _make_handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):  # keep benchmark output clean
+                pass
+
+            def _reply(self, status: int, payload: bytes, content_type: str = 'application/json'):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                if self.path.startswith('/thumbs/'):
+                    self._reply(200, api._thumb, 'image/jpeg')
+                    return
+                self.do_POST()
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                match = _PATH_RE.match(self.path.split('?', 1)[0])
+                if not match:
+                    self._reply(404, b'{"ok":false,"error_code":404,"description":"Not Found"}')
+                    return
+                ctype = self.headers.get('Content-Type') or ''
+                params: Dict[str, Any] = {}
+                if ctype.startswith('application/json') and body:
+                    params = json.loads(body)
+                elif ctype.startswith('multipart/form-data'):
+                    for m in _MULTIPART_FIELD_RE.finditer(body):
+                        params.setdefault(m.group('name').decode(), m.group('value').decode('utf-8', 'replace'))
+                elif body:
+                    params = {k: v[0] for k, v in parse_qs(body.decode()).items()}
+                result = api.handle(match.group('method'), params, len(body))
+                self._reply(200, json.dumps({"ok": True, "result": result}).encode())
+
+        return Handler
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import shutil
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# Drop-in replacement for yt_dlp.YoutubeDL used by the benchmarks. It keeps the
+# real YouTubeService code path (options, hooks, file naming, metrics) and only
+# replaces network extraction and FFmpeg with sleeps and fixture files.
+
+# A silent MPEG-1 Layer III frame (128 kbps, 44.1 kHz) is 417 bytes.
+_MP3_FRAME = b'\xff\xfb\x90\x64' + b'\x00' * 413
+
+
+def write_fixture_mp3(path: str, size_kb: int) -> str:
+    frames = max(1, size_kb * 1024 // len(_MP3_FRAME))
+    with open(path, 'wb') as f:
+        f.write(_MP3_FRAME * frames)
+    return path
+
+
+def fake_video_id(query: str) -> str:
+    digest = hashlib.sha1(query.strip().lower().encode('utf-8')).hexdigest()
+    return digest[:11]
+
+
+class FakeYoutubeDLFactory:
+    """Callable replacing yt_dlp.YoutubeDL with configurable latencies (seconds)."""
+
+    def __init__(self, fixture_path: str, thumb_base_url: str, *, search_latency: float = 0.0,
+                 download_latency: float = 0.0, transcode_latency: float = 0.0, duration: int = 180):
+        self.fixture_path = fixture_path
+        self.thumb_base_url = thumb_base_url.rstrip('/')
+        self.search_latency = search_latency
+        self.download_latency = download_latency
+        self.transcode_latency = transcode_latency
+        self.duration = duration
+        self.extractions = 0
+        self.downloads = 0
+
+    def __call__(self, opts: Optional[Dict[str, Any]] = None) -> "FakeYoutubeDL":
+        return FakeYoutubeDL(self, opts or {})
+
+    def info_for(self, video_id: str) -> Dict[str, Any]:
+        return {
+            'id': video_id,
+            'title': f'Bench track {video_id}',
+            'webpage_url': f'https://www.youtube.com/watch?v={video_id}',
+            'duration': self.duration,
+            'uploader': 'Bench Artist',
+            'thumbnail': f'{self.thumb_base_url}/thumbs/{video_id}.jpg',
+            'ext': 'webm',
+        }
+
+
+class FakeYoutubeDL:
+    def __init__(self, factory: FakeYoutubeDLFactory, opts: Dict[str, Any]):
+        self.factory = factory
+        self.params = opts
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def _video_id(self, query: str) -> str:
+        if query.startswith('ytsearch'):
+            return fake_video_id(query.split(':', 1)[-1])
+        for marker in ('v=', 'youtu.be/', 'shorts/'):
+            if marker in query:
+                return query.split(marker, 1)[1][:11]
+        return fake_video_id(query)
+
+    def prepare_filename(self, info: Dict[str, Any]) -> str:
+        outtmpl = self.params.get('outtmpl') or '%(id)s.%(ext)s'
+        if isinstance(outtmpl, dict):
+            outtmpl = outtmpl.get('default', '%(id)s.%(ext)s')
+        return outtmpl % info
+
+    def _hooks(self, key: str) -> List[Callable[[Dict[str, Any]], None]]:
+        return list(self.params.get(key) or [])
+
+    def extract_info(self, query: str, download: bool = False, **_kwargs) -> Dict[str, Any]:
+        self.factory.extractions += 1
+        if self.factory.search_latency:
+            time.sleep(self.factory.search_latency)
+        info = self.factory.info_for(self._video_id(query))
+        if download:
+            self._download(info)
+        if query.startswith('ytsearch'):
+            return {'_type': 'playlist', 'entries': [info]}
+        return info
+
+    def process_ie_result(self, info: Dict[str, Any], download: bool = True, **_kwargs) -> Dict[str, Any]:
+        if download:
+            self._download(info)
+        return info
+
+    def _download(self, info: Dict[str, Any]) -> None:
+        self.factory.downloads += 1
+        total = os.path.getsize(self.factory.fixture_path)
+        steps = 4
+        for i in range(1, steps + 1):
+            time.sleep(self.factory.download_latency / steps)
+            for hook in self._hooks('progress_hooks'):
+                hook({'status': 'downloading', 'downloaded_bytes': total * i // steps, 'total_bytes': total})
+        raw_path = self.prepare_filename(info)
+        os.makedirs(os.path.dirname(raw_path) or '.', exist_ok=True)
+        shutil.copyfile(self.factory.fixture_path, raw_path)
+        for hook in self._hooks('progress_hooks'):
+            hook({'status': 'finished', 'filename': raw_path})
+
+        codec = 'mp3'
+        for pp in self.params.get('postprocessors') or []:
+            if pp.get('key') == 'FFmpegExtractAudio':
+                codec = pp.get('preferredcodec') or codec
+                for hook in self._hooks('postprocessor_hooks'):
+                    hook({'status': 'started', 'postprocessor': 'ExtractAudio', 'info_dict': info})
+                time.sleep(self.factory.transcode_latency)
+                final_path = os.path.splitext(raw_path)[0] + '.' + codec
+                os.replace(raw_path, final_path)
+                info['filepath'] = final_path
+                for hook in self._hooks('postprocessor_hooks'):
+                    hook({'status': 'finished', 'postprocessor': 'ExtractAudio', 'info_dict': info})
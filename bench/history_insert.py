@@ -0,0 +1,143 @@
+"""History insert throughput and pruning: heap table vs monthly partitions.
+
+Builds both layouts in a scratch schema of the database configured in
+``.env`` and drops it afterwards:
+
+- legacy: one heap table with the pre-partitioning index set (primary key,
+  user, track, user+time and the two column-level indexes);
+- partitioned: monthly range partitions with the primary key (id,
+  downloaded_at) and the user+time index.
+
+Worker threads insert rows one statement per transaction (as
+record_download does), with timestamps advancing across --months months.
+The oldest month is then pruned: DELETE on the heap, DROP TABLE on the
+partition.
+
+    python -m bench.history_insert --rows 200000 --threads 8 --months 6
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict
+
+SCHEMA = 'bench_history'
+
+
+def _legacy_ddl() -> list[str]:
+    return [
+        f"CREATE TABLE {SCHEMA}.history_legacy (id SERIAL PRIMARY KEY, user_id BIGINT, track_id INTEGER, "
+        f"downloaded_at TIMESTAMPTZ DEFAULT now())",
+        f"CREATE INDEX ix_legacy_user ON {SCHEMA}.history_legacy (user_id)",
+        f"CREATE INDEX ix_legacy_track ON {SCHEMA}.history_legacy (track_id)",
+        f"CREATE INDEX ix_legacy_user_time ON {SCHEMA}.history_legacy (user_id, downloaded_at)",
+        f"CREATE INDEX ix_legacy_user_id ON {SCHEMA}.history_legacy (user_id)",
+        f"CREATE INDEX ix_legacy_track_id ON {SCHEMA}.history_legacy (track_id)",
+    ]
+
+
+def _partitioned_ddl(start: datetime, months: int) -> list[str]:
+    from db.partitions import add_months
+    ddl = [
+        f"CREATE TABLE {SCHEMA}.history_part (id BIGSERIAL, user_id BIGINT, track_id INTEGER, "
+        f"downloaded_at TIMESTAMPTZ NOT NULL DEFAULT now(), PRIMARY KEY (id, downloaded_at)) "
+        f"PARTITION BY RANGE (downloaded_at)",
+        f"CREATE INDEX ix_part_user_time ON {SCHEMA}.history_part (user_id, downloaded_at)",
+    ]
+    for n in range(months):
+        month = add_months(start, n)
+        ddl.append(
+            f"CREATE TABLE {SCHEMA}.history_part_{n} PARTITION OF {SCHEMA}.history_part "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+        )
+    ddl.append(f"CREATE TABLE {SCHEMA}.history_part_default PARTITION OF {SCHEMA}.history_part DEFAULT")
+    return ddl
+
+
+def _insert(engine, table: str, args, start: datetime, span: timedelta) -> Dict[str, float]:
+    from sqlalchemy import text
+    stmt = text(f"INSERT INTO {SCHEMA}.{table} (user_id, track_id, downloaded_at) VALUES (:u, :t, :ts)")
+    counter = iter(range(args.rows))
+    lock = threading.Lock()
+    step = span / args.rows
+
+    def worker(seed: int) -> None:
+        rnd = random.Random(seed)
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            with engine.begin() as conn:
+                conn.execute(stmt, {'u': rnd.randrange(args.users), 't': rnd.randrange(args.tracks),
+                                    'ts': start + step * i})
+
+    threads = [threading.Thread(target=worker, args=(args.seed + n,)) for n in range(args.threads)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    with engine.connect() as conn:
+        size = conn.execute(text(
+            "SELECT sum(pg_total_relation_size(c.oid)) FROM pg_class c "
+            "WHERE c.relnamespace = CAST(:schema AS regnamespace) AND c.relkind IN ('r', 'p') AND c.relname LIKE :like"
+        ), {'schema': SCHEMA, 'like': f"{table}%"}).scalar()
+    return {'rows_per_s': round(args.rows / elapsed, 1), 'seconds': round(elapsed, 2), 'mb': round((size or 0) / 2 ** 20, 1)}
+
+
+def _prune(engine, sql: str) -> float:
+    from sqlalchemy import text
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        conn.execute(text(sql))
+    return round((time.perf_counter() - started) * 1000, 1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--months', type=int, default=6)
+    parser.add_argument('--users', type=int, default=5_000)
+    parser.add_argument('--tracks', type=int, default=20_000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+    os.environ.setdefault('TELEGRAM_TOKEN', '123456:BENCH-TOKEN')
+
+    from sqlalchemy import create_engine, text
+    from config import MUSIC_BOT_DB_URL
+    from db.partitions import add_months, month_start
+
+    engine = create_engine(MUSIC_BOT_DB_URL, pool_size=args.threads, max_overflow=0, future=True)
+    start = add_months(month_start(datetime.now(timezone.utc)), -args.months + 1)
+    span = add_months(start, args.months) - start
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        for ddl in _legacy_ddl() + _partitioned_ddl(start, args.months):
+            conn.execute(text(ddl))
+    try:
+        legacy = _insert(engine, 'history_legacy', args, start, span)
+        part = _insert(engine, 'history_part', args, start, span)
+        legacy['prune_ms'] = _prune(
+            engine, f"DELETE FROM {SCHEMA}.history_legacy WHERE downloaded_at < '{add_months(start, 1).isoformat()}'")
+        part['prune_ms'] = _prune(engine, f"DROP TABLE {SCHEMA}.history_part_0")
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        engine.dispose()
+
+    print(f"rows={args.rows} threads={args.threads} months={args.months}")
+    print(f"\n{'layout':<14}{'rows/s':>12}{'seconds':>10}{'size MB':>10}{'prune 1 month ms':>20}")
+    for name, r in (('heap', legacy), ('partitioned', part)):
+        print(f"{name:<14}{r['rows_per_s']:>12}{r['seconds']:>10}{r['mb']:>10}{r['prune_ms']:>20}")
+
+
+if __name__ == '__main__':
+    main()
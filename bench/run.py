@@ -0,0 +1,244 @@
+"""Offline end-to-end load test for the bot handlers and the HTTP bridge.
+
+Runs the real ``create_application`` handlers and ``FlaskService`` routes
+against a local fake Bot API server and a stubbed yt-dlp/FFmpeg layer, so no
+network access is needed. The database is the one configured in ``.env``
+(MUSIC_BOT_DB_URL / PG_*); use a throwaway database.
+
+    python -m bench.run --users 50 --requests 4 --catalog 30 --http-ratio 0.25
+
+Reports throughput, p50/p99 latency per entry point and per stage (from
+tracing spans), peak memory and the number of SQL statements executed.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import resource
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+from typing import Any, Dict, List
+
+from bench.fake_bot_api import FakeBotApi
+from bench.fake_youtube import FakeYoutubeDLFactory, write_fixture_mp3
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = math.ceil(pct / 100 * len(ordered))
+    return ordered[min(len(ordered), max(rank, 1)) - 1]
+
+
+class TraceCollector:
+    def __init__(self):
+        self.traces: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+    def __call__(self, trace) -> None:
+        with self._lock:
+            self.traces.append(trace.to_dict())
+            self._changed.notify_all()
+
+    def wait_for(self, count: int, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while len(self.traces) < count:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._changed.wait(remaining)
+            return True
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        by_entry: Dict[str, List[float]] = {}
+        by_stage: Dict[str, List[float]] = {}
+        with self._lock:
+            traces = list(self.traces)
+        for t in traces:
+            by_entry.setdefault(t['name'], []).append(t['duration_ms'] or 0.0)
+            for s in t['spans']:
+                by_stage.setdefault(s['name'], []).append(s['duration_ms'])
+
+        def _stats(values: List[float]) -> Dict[str, float]:
+            return {'count': len(values), 'p50_ms': percentile(values, 50), 'p99_ms': percentile(values, 99),
+                    'max_ms': max(values) if values else 0.0}
+
+        return {
+            'entry': {k: _stats(v) for k, v in sorted(by_entry.items())},
+            'stage': {k: _stats(v) for k, v in sorted(by_stage.items())},
+        }
+
+
+def _text_update(update_id: int, user_id: int, text: str) -> Dict[str, Any]:
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}'},
+            'text': text,
+        },
+    }
+
+
+async def _run(args, fake_api: FakeBotApi, workdir: str) -> Dict[str, Any]:
+    import yt_dlp
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    from telegram import Update
+
+    fixture = write_fixture_mp3(os.path.join(workdir, 'fixture.mp3'), args.audio_kb)
+    factory = FakeYoutubeDLFactory(
+        fixture, fake_api.base_url,
+        search_latency=args.search_ms / 1000,
+        download_latency=args.download_ms / 1000,
+        transcode_latency=args.transcode_ms / 1000,
+    )
+    yt_dlp.YoutubeDL = factory
+
+    from bot import create_application
+    from db.db_session import init_db
+    from services.http_api import FlaskService
+    from services import tracing
+
+    init_db()
+    bridge = FlaskService(api_key='bench')
+    app = create_application(bridge)
+    await app.initialize()
+    bridge.attach_application(app)
+    bridge.set_loop(asyncio.get_running_loop())
+
+    collector = TraceCollector()
+    tracing.add_sink(collector)
+    query_count = [0]
+
+    def _count_query(*_a, **_kw):
+        query_count[0] += 1
+    event.listen(Engine, 'before_cursor_execute', _count_query)
+
+    rng = random.Random(args.seed)
+    plan = []
+    for user in range(args.users):
+        user_id = 10_000_000 + user
+        for _ in range(args.requests):
+            query = f"bench song {rng.randrange(args.catalog)}"
+            plan.append((user_id, query, rng.random() < args.http_ratio))
+
+    def _post_http(user_id: int, query: str) -> int:
+        resp = bridge.app.test_client().post('/api/send_song', json={'chat_id': user_id, 'query': query}, headers={'X-Api-Key': 'bench'})
+        return resp.status_code
+
+    update_ids = iter(range(1, len(plan) + 1))
+    loop = asyncio.get_running_loop()
+
+    async def user_session(user_id: int, items):
+        for _, query, via_http in items:
+            if via_http:
+                await loop.run_in_executor(None, _post_http, user_id, query)
+            else:
+                update = Update.de_json(_text_update(next(update_ids), user_id, query), app.bot)
+                await app.process_update(update)
+
+    per_user: Dict[int, list] = {}
+    for item in plan:
+        per_user.setdefault(item[0], []).append(item)
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(user_session(uid, items) for uid, items in per_user.items()))
+    # HTTP-originated work finishes asynchronously in the PTB loop; wait for its traces
+    await asyncio.to_thread(collector.wait_for, len(plan), args.timeout)
+    elapsed = time.perf_counter() - started
+    peak_traced = tracemalloc.get_traced_memory()[1] if args.tracemalloc else None
+    if args.tracemalloc:
+        tracemalloc.stop()
+
+    tracing.remove_sink(collector)
+    event.remove(Engine, 'before_cursor_execute', _count_query)
+    await app.shutdown()
+
+    completed = len(collector.traces)
+    return {
+        'requests': len(plan),
+        'completed': completed,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(completed / elapsed, 2) if elapsed else 0.0,
+        'latency': collector.summary(),
+        'db_queries': query_count[0],
+        'db_queries_per_request': round(query_count[0] / completed, 2) if completed else 0.0,
+        'yt_extractions': factory.extractions,
+        'yt_downloads': factory.downloads,
+        'bot_api_calls': dict(sorted(fake_api.calls.items())),
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'tracemalloc_peak_kb': round(peak_traced / 1024) if peak_traced is not None else None,
+    }
+
+
+def _print_report(result: Dict[str, Any]) -> None:
+    print(f"requests: {result['completed']}/{result['requests']} in {result['elapsed_s']}s "
+          f"({result['throughput_rps']} req/s)")
+    for section in ('entry', 'stage'):
+        print(f"\n{section:<28}{'count':>8}{'p50 ms':>12}{'p99 ms':>12}{'max ms':>12}")
+        for name, s in result['latency'][section].items():
+            print(f"{name:<28}{s['count']:>8}{s['p50_ms']:>12.1f}{s['p99_ms']:>12.1f}{s['max_ms']:>12.1f}")
+    print(f"\ndb queries: {result['db_queries']} ({result['db_queries_per_request']}/request)")
+    print(f"yt-dlp extractions: {result['yt_extractions']}, downloads: {result['yt_downloads']}")
+    print(f"bot api calls: {result['bot_api_calls']}")
+    mem = f"max rss: {result['max_rss_kb']} KB"
+    if result['tracemalloc_peak_kb'] is not None:
+        mem += f", tracemalloc peak: {result['tracemalloc_peak_kb']} KB"
+    print(mem)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=3, help='requests per user')
+    parser.add_argument('--catalog', type=int, default=25, help='distinct songs queried')
+    parser.add_argument('--http-ratio', type=float, default=0.25, help='share of requests sent via /api/send_song')
+    parser.add_argument('--search-ms', type=float, default=300)
+    parser.add_argument('--download-ms', type=float, default=800)
+    parser.add_argument('--transcode-ms', type=float, default=400)
+    parser.add_argument('--api-latency-ms', type=float, default=20)
+    parser.add_argument('--upload-ms-per-mb', type=float, default=100)
+    parser.add_argument('--audio-kb', type=int, default=512, help='fixture audio size')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--timeout', type=float, default=300)
+    parser.add_argument('--tracemalloc', action='store_true', help='track Python heap peak (slower)')
+    parser.add_argument('--json', dest='json_path', help='also write the report as JSON')
+    parser.add_argument('--keep', action='store_true', help='keep the temporary download directory')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='musicbot-bench-')
+    fake_api = FakeBotApi(latency_ms=args.api_latency_ms, upload_ms_per_mb=args.upload_ms_per_mb).start()
+    # Must be set before config/services are imported
+    os.environ['MUSIC_DOWNLOAD_DIR'] = os.path.join(workdir, 'downloads')
+    os.environ['TELEGRAM_API_BASE_URL'] = fake_api.base_url
+    os.environ.setdefault('TELEGRAM_TOKEN', '123456:BENCH-TOKEN')
+    os.environ.setdefault('TRACE_FILE', '')
+    try:
+        result = asyncio.run(_run(args, fake_api, workdir))
+    finally:
+        fake_api.stop()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+    _print_report(result)
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
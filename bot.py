@@ -1,14 +1,44 @@
+import time
+
+_STARTED = time.perf_counter()
+
 import asyncio
 import logging
 import os
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
 from telegram import Update
 from telegram.ext import Application, ContextTypes
 
-from config import TELEGRAM_TOKEN
-from db.db_session import init_db
-from handlers.song import build_handlers as build_song_handlers
-from handlers.account import build_handlers as build_account_handlers
-from services.http_api import FlaskService
+from config import TELEGRAM_TOKEN, TELEGRAM_API_BASE_URL
+from services.metrics import QUEUE_DEPTH, STARTUP_SECONDS
+
+# Handlers and services (SQLAlchemy, the yt-dlp wrappers, the in-memory indexes) are
+# imported inside main()/create_application() so each startup phase reports its own cost.
+if TYPE_CHECKING:
+    from services.http_api import FlaskService
+
+_IMPORTED = time.perf_counter()
+_startup_phases = {'imports': _IMPORTED - _STARTED}
+
+
+@contextmanager
+def _startup_phase(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _startup_phases[name] = time.perf_counter() - start
+
+
+def _report_startup() -> None:
+    total = time.perf_counter() - _STARTED
+    for phase, seconds in _startup_phases.items():
+        STARTUP_SECONDS.set(seconds, phase=phase)
+    STARTUP_SECONDS.set(total, phase='total')
+    breakdown = ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in _startup_phases.items())
+    logging.info("Startup took %.2fs (%s); `python -X importtime bot.py` for per-module import times", total, breakdown)
+
 
 async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
     logging.exception("Unhandled exception while handling update: %s", update)
@@ -20,23 +50,64 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> N
             pass
 
 
-def create_application(http_bridge: FlaskService | None = None) -> Application:
+def create_application(http_bridge: "FlaskService | None" = None) -> Application:
     if not TELEGRAM_TOKEN or TELEGRAM_TOKEN == 'REPLACE_WITH_YOUR_TOKEN':
         raise RuntimeError("Telegram bot token not set")
 
+    with _startup_phase('import_handlers'):
+        from handlers.song import build_handlers as build_song_handlers
+        from handlers.account import build_handlers as build_account_handlers
+        from handlers.history import build_handlers as build_history_handlers
+        from handlers.recommend import build_handlers as build_recommend_handlers
+        from handlers.lyrics import build_handlers as build_lyrics_handlers
+        from handlers.video import build_handlers as build_video_handlers
+        from handlers.playlist import build_handlers as build_playlist_handlers
+        from handlers.favorites import build_handlers as build_favorites_handlers
+        from services.recomender import schedule_refresh as schedule_recommender_refresh
+        from services.search_index import schedule_refresh as schedule_search_index_refresh
+        from services.jobs import resume_jobs
+        from services.throttle import schedule_persistence as schedule_throttle_persistence
+        from services.maintenance import schedule_maintenance
+        from services.youtube import preload_youtube_dl
+
     async def _post_init(app: Application):
         # Bind PTB's running loop to HTTP bridge for cross-thread scheduling
         if http_bridge is not None:
             http_bridge.attach_application(app)
             http_bridge.set_loop(asyncio.get_running_loop())
+        with _startup_phase('resume_jobs'):
+            await resume_jobs(app)
+        _report_startup()
+        app.create_task(asyncio.to_thread(preload_youtube_dl))
 
-    app = Application.builder().token(TELEGRAM_TOKEN).post_init(_post_init).build()
+    builder = Application.builder().token(TELEGRAM_TOKEN).post_init(_post_init)
+    if TELEGRAM_API_BASE_URL:
+        base = TELEGRAM_API_BASE_URL.rstrip('/')
+        builder = builder.base_url(f"{base}/bot").base_file_url(f"{base}/file/bot")
+    app = builder.build()
+    QUEUE_DEPTH.set_function(app.update_queue.qsize, queue='updates')
     # Register handlers
     for h in build_song_handlers():
         app.add_handler(h)
     for h in build_account_handlers():
         app.add_handler(h)
+    for h in build_history_handlers():
+        app.add_handler(h)
+    for h in build_recommend_handlers():
+        app.add_handler(h)
+    for h in build_lyrics_handlers():
+        app.add_handler(h)
+    for h in build_video_handlers():
+        app.add_handler(h)
+    for h in build_playlist_handlers():
+        app.add_handler(h)
+    for h in build_favorites_handlers():
+        app.add_handler(h)
     app.add_error_handler(error_handler)
+    schedule_recommender_refresh(app)
+    schedule_search_index_refresh(app)
+    schedule_throttle_persistence(app)
+    schedule_maintenance(app)
     return app
 
 def main():
@@ -46,17 +117,22 @@ def main():
     )
     logging.getLogger("httpx").setLevel(logging.WARNING)
     logging.info("Initializing database…")
-    init_db()
+    with _startup_phase('init_db'):
+        from db.db_session import init_db
+        init_db()
     logging.info("Database ready.")
 
     # Start lightweight HTTP bridge for website -> bot actions
-    flask_host = os.getenv('FLASK_HOST', '127.0.0.1')
-    flask_port = int(os.getenv('FLASK_PORT', '5001'))
-    flask_api_key = os.getenv('FLASK_API_KEY')
-    http_bridge = FlaskService(host=flask_host, port=flask_port, api_key=flask_api_key)
-    http_bridge.start()
+    with _startup_phase('http_bridge'):
+        from services.http_api import FlaskService
+        flask_host = os.getenv('FLASK_HOST', '127.0.0.1')
+        flask_port = int(os.getenv('FLASK_PORT', '5001'))
+        flask_api_key = os.getenv('FLASK_API_KEY')
+        http_bridge = FlaskService(host=flask_host, port=flask_port, api_key=flask_api_key)
+        http_bridge.start()
 
-    app = create_application(http_bridge)
+    with _startup_phase('build_application'):
+        app = create_application(http_bridge)
 
     logging.info("Starting bot polling…")
     app.run_polling(allowed_updates=Update.ALL_TYPES)
@@ -27,10 +27,23 @@ if not MUSIC_BOT_DB_URL.startswith('postgresql'):
 
 WEBAPP_URL = os.getenv('WEBAPP_URL', 'http://localhost:8000')
 
+# Optional self-hosted Bot API server (or the offline benchmark fake), e.g. http://127.0.0.1:8081
+TELEGRAM_API_BASE_URL = os.getenv('TELEGRAM_API_BASE_URL')
+
 # SQLAlchemy tuning
 SQL_ECHO = os.getenv('SQL_ECHO', '0') == '1'
 DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
 DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+# The HTTP bridge gets its own, smaller pool so API bursts cannot starve the bot
+DB_BRIDGE_POOL_SIZE = int(os.getenv('DB_BRIDGE_POOL_SIZE', '3'))
+DB_BRIDGE_MAX_OVERFLOW = int(os.getenv('DB_BRIDGE_MAX_OVERFLOW', '5'))
+# Seconds to wait for a pooled connection before giving up
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10'))
+# Connections older than this are replaced on checkout (below server/proxy idle timeouts)
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+# A SELECT 1 round trip per checkout; only worth it when connections die between recycles
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', '0') == '1'
+DB_QUERY_CACHE_SIZE = int(os.getenv('DB_QUERY_CACHE_SIZE', '1200'))
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
 
 __all__ = [
@@ -39,6 +52,13 @@ __all__ = [
     'SQL_ECHO',
     'DB_POOL_SIZE',
     'DB_MAX_OVERFLOW',
+    'DB_BRIDGE_POOL_SIZE',
+    'DB_BRIDGE_MAX_OVERFLOW',
+    'DB_POOL_TIMEOUT',
+    'DB_POOL_RECYCLE',
+    'DB_POOL_PRE_PING',
+    'DB_QUERY_CACHE_SIZE',
     'LOG_LEVEL',
     'WEBAPP_URL',
+    'TELEGRAM_API_BASE_URL',
 ]
@@ -1,43 +1,188 @@
 
 import os
+import time
+import logging
+import threading
+from collections import deque
 from contextlib import contextmanager
-from sqlalchemy import create_engine
+from contextvars import ContextVar
+from typing import Deque, Dict, Iterator
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker
 from .models import Base
-from config import MUSIC_BOT_DB_URL
+from .partitions import ensure_partitions, is_partitioned
+from config import (
+    MUSIC_BOT_DB_URL, SQL_ECHO, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_BRIDGE_POOL_SIZE, DB_BRIDGE_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING, DB_QUERY_CACHE_SIZE,
+)
+from services.metrics import Gauge, Histogram
 
 DB_URL = MUSIC_BOT_DB_URL
 
-ENGINE_ECHO = os.getenv("SQL_ECHO", "0") == "1"
-POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
-MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+POOL_WAIT_SECONDS = Histogram(
+    'musicbot_db_pool_wait_seconds',
+    'Time spent waiting for a pooled database connection.',
+    ('pool',),
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+POOL_CONNECTIONS = Gauge('musicbot_db_pool_connections', 'Pooled database connections by state.', ('pool', 'state'))
 
-engine_kwargs = {
-    "echo": ENGINE_ECHO,
-    "future": True,
+# Recent checkout waits per pool, for the diagnostics endpoint's percentiles
+WAIT_SAMPLES = 1024
+
+
+def make_engine(pool_size: int, max_overflow: int, *, pre_ping: bool = DB_POOL_PRE_PING) -> Engine:
+    # Liveness comes from recycling connections before the server or a proxy drops them; a pre-ping
+    # round trip on every checkout is optional. Disconnects still invalidate the pool on first use.
+    return create_engine(
+        DB_URL,
+        echo=SQL_ECHO,
+        future=True,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=pre_ping,
+        # LIFO keeps hot connections busy and lets idle ones age out through recycle
+        pool_use_lifo=True,
+        query_cache_size=DB_QUERY_CACHE_SIZE,
+    )
+
+
+engine = make_engine(DB_POOL_SIZE, DB_MAX_OVERFLOW)
+bridge_engine = make_engine(DB_BRIDGE_POOL_SIZE, DB_BRIDGE_MAX_OVERFLOW)
+
+_engines: Dict[str, Engine] = {'bot': engine, 'bridge': bridge_engine}
+_sessionmakers = {
+    name: sessionmaker(bind=eng, autoflush=False, autocommit=False, expire_on_commit=False, future=True)
+    for name, eng in _engines.items()
 }
-if DB_URL.startswith("postgresql"):
-    engine_kwargs.update({
-        "pool_pre_ping": True,
-        "pool_size": POOL_SIZE,
-        "max_overflow": MAX_OVERFLOW,
-    })
-elif DB_URL.startswith("sqlite"):
-    engine_kwargs.update({
-        "connect_args": {"check_same_thread": False},
-    })
+SessionLocal = _sessionmakers['bot']
+
+# Which pool get_session() draws from; the HTTP bridge switches its request threads to 'bridge'
+_pool_name: ContextVar[str] = ContextVar('db_pool', default='bot')
+
+_stats_lock = threading.Lock()
+_waits: Dict[str, Deque[float]] = {name: deque(maxlen=WAIT_SAMPLES) for name in _engines}
+_counters: Dict[str, Dict[str, int]] = {name: {'checkouts': 0, 'connects': 0, 'invalidated': 0} for name in _engines}
+
+
+def _count(name: str, key: str) -> None:
+    with _stats_lock:
+        _counters[name][key] += 1
+
+
+def _instrument(name: str, eng: Engine) -> None:
+    event.listen(eng, 'connect', lambda *_: _count(name, 'connects'))
+    event.listen(eng, 'checkout', lambda *_: _count(name, 'checkouts'))
+    event.listen(eng, 'invalidate', lambda *_: _count(name, 'invalidated'))
+    pool = eng.pool
+    POOL_CONNECTIONS.set_function(pool.checkedout, pool=name, state='checked_out')
+    POOL_CONNECTIONS.set_function(pool.checkedin, pool=name, state='checked_in')
+    POOL_CONNECTIONS.set_function(lambda: max(pool.overflow(), 0), pool=name, state='overflow')
+
+
+for _name, _eng in _engines.items():
+    _instrument(_name, _eng)
+
+
+def set_pool(name: str):
+    """Route this context's sessions to another pool; returns a token for reset_pool()."""
+    if name not in _engines:
+        raise ValueError(f"Unknown pool {name!r}")
+    return _pool_name.set(name)
+
 
-engine = create_engine(DB_URL, **engine_kwargs)
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False, future=True)
+def reset_pool(token) -> None:
+    _pool_name.reset(token)
+
+
+@contextmanager
+def use_pool(name: str) -> Iterator[None]:
+    token = set_pool(name)
+    try:
+        yield
+    finally:
+        reset_pool(token)
+
+
+def _percentile(ordered, pct: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+
+def pool_stats() -> Dict[str, dict]:
+    """Per-pool occupancy and checkout wait percentiles (ms) over the last WAIT_SAMPLES sessions."""
+    result = {}
+    for name, eng in _engines.items():
+        pool = eng.pool
+        with _stats_lock:
+            waits = sorted(_waits[name])
+            counters = dict(_counters[name])
+        result[name] = {
+            'size': pool.size(),
+            'max_overflow': pool._max_overflow,
+            'checked_out': pool.checkedout(),
+            'checked_in': pool.checkedin(),
+            'overflow': max(pool.overflow(), 0),
+            'timeout': pool.timeout(),
+            'recycle': pool._recycle,
+            'pre_ping': pool._pre_ping,
+            **counters,
+            'wait_ms': {
+                'samples': len(waits),
+                'p50': round(_percentile(waits, 50) * 1000, 3),
+                'p99': round(_percentile(waits, 99) * 1000, 3),
+                'max': round(waits[-1] * 1000, 3) if waits else 0.0,
+            },
+        }
+    return result
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic.ini")
+
+
+def schema_is_current() -> bool:
+    """True when the database is stamped with the newest Alembic revision."""
+    try:
+        from alembic.config import Config
+        from alembic.script import ScriptDirectory
+        heads = set(ScriptDirectory.from_config(Config(ALEMBIC_INI)).get_heads())
+        with engine.connect() as conn:
+            current = {row[0] for row in conn.execute(text("SELECT version_num FROM alembic_version"))}
+    except Exception:
+        return False
+    return bool(heads) and current == heads
 
 
 def init_db():
+    # create_all reflects every table; pointless when migrations already brought the schema to head
+    if schema_is_current():
+        logging.info("Schema is at the Alembic head; skipping create_all.")
+        return
+    logging.warning("Schema not at the Alembic head (run `alembic upgrade head`); creating missing tables.")
     Base.metadata.create_all(engine)
+    # create_all makes the partitioned parent only; rows need a partition to land in
+    with engine.begin() as conn:
+        if is_partitioned(conn):
+            ensure_partitions(conn, months_ahead=3)
+        else:
+            logging.warning("history is not partitioned yet; run `alembic upgrade head` to convert it.")
+
 
 @contextmanager
 def get_session():
-    session = SessionLocal()
+    name = _pool_name.get()
+    session = _sessionmakers[name]()
     try:
+        # Take the connection up front so pool waits are measured (sessions here always query)
+        started = time.perf_counter()
+        session.connection()
+        waited = time.perf_counter() - started
+        POOL_WAIT_SECONDS.observe(waited, pool=name)
+        with _stats_lock:
+            _waits[name].append(waited)
         yield session
         session.commit()
     except Exception:
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, func, Boolean, UniqueConstraint, Index, BigInteger
+from sqlalchemy import Column, Integer, String, DateTime, Date, ForeignKey, func, Boolean, UniqueConstraint, Index, BigInteger, Text, LargeBinary, JSON
 from sqlalchemy.orm import declarative_base, relationship
 
 Base = declarative_base()
@@ -18,42 +18,52 @@ class User(Base):
     user_state = Column(String, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
-    history = relationship("History", back_populates="user", cascade="all, delete-orphan")
-    favorites = relationship("Favorite", back_populates="user", cascade="all, delete-orphan")
+    # Collections are never loaded implicitly (read paths select columns, see services/repository.py);
+    # the database's ON DELETE CASCADE removes the rows.
+    history = relationship("History", back_populates="user", cascade="all, delete-orphan",
+                           lazy="raise_on_sql", passive_deletes=True)
+    favorites = relationship("Favorite", back_populates="user", cascade="all, delete-orphan",
+                             lazy="raise_on_sql", passive_deletes=True)
 
 class Track(Base):
     __tablename__ = "tracks"
     __table_args__ = (
         Index("ix_tracks_created_at", "created_at"),
         Index("ix_tracks_title", "title"),
+        Index("ux_tracks_video_id", "video_id", unique=True),
     )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
+    video_id = Column(String(64), nullable=False)  # canonical YouTube id; identity of the track
     title = Column(String, nullable=False)
     artist = Column(String, nullable=True)
-    youtube_url = Column(String, nullable=False, unique=True, index=True)
+    youtube_url = Column(String, nullable=False)
     thumbnail_url = Column(String, nullable=True)
     duration = Column(Integer, nullable=False, default=0)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
-    history = relationship("History", back_populates="track", cascade="all, delete-orphan")
-    favorites = relationship("Favorite", back_populates="track", cascade="all, delete-orphan")
+    history = relationship("History", back_populates="track", cascade="all, delete-orphan",
+                           lazy="raise_on_sql", passive_deletes=True)
+    favorites = relationship("Favorite", back_populates="track", cascade="all, delete-orphan",
+                             lazy="raise_on_sql", passive_deletes=True)
 
 class History(Base):
+    # Range-partitioned by month on downloaded_at (see db/partitions.py); the partition key must be
+    # part of the primary key. Two B-trees per partition: the key and the per-user timeline.
     __tablename__ = "history"
     __table_args__ = (
-        Index("ix_history_user", "user_id"),
-        Index("ix_history_track", "track_id"),
         Index("ix_history_user_time", "user_id", "downloaded_at"),
+        {"postgresql_partition_by": "RANGE (downloaded_at)"},
     )
 
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    user_id = Column(BigInteger, ForeignKey("users.id", ondelete="CASCADE"), index=True)
-    track_id = Column(Integer, ForeignKey("tracks.id", ondelete="CASCADE"), index=True)
-    downloaded_at = Column(DateTime(timezone=True), server_default=func.now())
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    user_id = Column(BigInteger, ForeignKey("users.id", ondelete="CASCADE"))
+    track_id = Column(Integer, ForeignKey("tracks.id", ondelete="CASCADE"))
+    downloaded_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now(), nullable=False)
 
-    user = relationship("User", back_populates="history")
-    track = relationship("Track", back_populates="history")
+    user = relationship("User", back_populates="history", lazy="raise_on_sql")
+    # Entries are always shown with their track: load it in the same query
+    track = relationship("Track", back_populates="history", lazy="joined")
 
 class Favorite(Base):
     __tablename__ = "favorites"
@@ -67,5 +77,88 @@ class Favorite(Base):
     user_id = Column(BigInteger, ForeignKey("users.id", ondelete="CASCADE"), index=True)
     track_id = Column(Integer, ForeignKey("tracks.id", ondelete="CASCADE"), index=True)
 
-    user = relationship("User", back_populates="favorites")
-    track = relationship("Track", back_populates="favorites")
+    user = relationship("User", back_populates="favorites", lazy="raise_on_sql")
+    track = relationship("Track", back_populates="favorites", lazy="joined")
+
+# Incrementally maintained play-count aggregates (see services/stats.py)
+
+class TrackPlayCount(Base):
+    __tablename__ = "track_play_counts"
+    __table_args__ = (
+        Index("ix_track_play_counts_plays", "plays"),
+    )
+
+    track_id = Column(Integer, ForeignKey("tracks.id", ondelete="CASCADE"), primary_key=True)
+    plays = Column(BigInteger, nullable=False, default=0)
+    last_played_at = Column(DateTime(timezone=True), nullable=True)
+
+class UserTrackPlayCount(Base):
+    __tablename__ = "user_track_play_counts"
+    __table_args__ = (
+        Index("ix_user_track_play_counts_user_plays", "user_id", "plays"),
+    )
+
+    user_id = Column(BigInteger, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    track_id = Column(Integer, ForeignKey("tracks.id", ondelete="CASCADE"), primary_key=True)
+    plays = Column(BigInteger, nullable=False, default=0)
+    last_played_at = Column(DateTime(timezone=True), nullable=True)
+
+class DailyTrackPlayCount(Base):
+    __tablename__ = "daily_track_play_counts"
+    __table_args__ = (
+        Index("ix_daily_track_play_counts_day_plays", "day", "plays"),
+    )
+
+    day = Column(Date, primary_key=True)
+    track_id = Column(Integer, ForeignKey("tracks.id", ondelete="CASCADE"), primary_key=True)
+    plays = Column(BigInteger, nullable=False, default=0)
+
+class Lyrics(Base):
+    __tablename__ = "lyrics"
+
+    # keyed like tracks.video_id but without a foreign key: looking up lyrics must not create tracks
+    video_id = Column(String(64), primary_key=True)
+    provider = Column(String, nullable=True)
+    text = Column(Text, nullable=True)  # NULL: looked up, nothing found (negative cache)
+    fetched_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+class DownloadJob(Base):
+    """A user-facing download (see services/jobs.py); survives restarts so it can be resumed."""
+    __tablename__ = "download_jobs"
+    __table_args__ = (
+        Index("ix_download_jobs_status_updated", "status", "updated_at"),
+    )
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    kind = Column(String(16), nullable=False, default="audio")  # audio | video
+    video_id = Column(String(64), nullable=False)
+    url = Column(String, nullable=False)
+    title = Column(String, nullable=True)
+    user_id = Column(BigInteger, nullable=False)  # Telegram user id (row may not exist yet)
+    chat_id = Column(BigInteger, nullable=False)
+    message_id = Column(BigInteger, nullable=True)  # progress message to update on resume
+    status = Column(String(16), nullable=False, default="queued")  # queued | running | ready | done | failed
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    progress = Column(Integer, nullable=True)  # percent, reported by external workers
+    worker_id = Column(String(64), nullable=True)
+    result_meta = Column(JSON, nullable=True)  # TrackMeta of the finished download (status=ready)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class AudioFingerprint(Base):
+    """Content hash + energy fingerprint of a cached MP3 (see services/dedup.py)."""
+    __tablename__ = "audio_fingerprints"
+    __table_args__ = (
+        Index("ix_audio_fingerprints_hash", "content_hash"),
+        Index("ix_audio_fingerprints_duration", "duration"),
+    )
+
+    video_id = Column(String(64), primary_key=True)
+    content_hash = Column(String(64), nullable=False)
+    fingerprint = Column(LargeBinary, nullable=False)
+    fp_bits = Column(Integer, nullable=False)
+    duration = Column(Integer, nullable=True)
+    canonical_id = Column(String(64), nullable=False)  # id whose file holds this audio (itself if unique)
+    profile = Column(String(16), nullable=True)  # encoding profile (services.youtube.AUDIO_PROFILES)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
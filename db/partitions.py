@@ -0,0 +1,122 @@
+"""Monthly range partitions of the history table.
+
+history is partitioned on downloaded_at: one child table per UTC month
+(history_YYYY_MM) plus history_default, which only catches rows outside every
+monthly range (it should stay empty). Partitions are created ahead of time
+and retention drops whole months instead of deleting rows.
+
+All functions take a Connection and run in the caller's transaction. DDL on
+a partition briefly locks the parent, so callers set a short lock_timeout.
+"""
+from __future__ import annotations
+
+import re
+import logging
+from datetime import datetime, timezone
+from typing import List, Tuple
+
+from sqlalchemy import text
+
+PARENT = 'history'
+DEFAULT_PARTITION = 'history_default'
+_NAME_RE = re.compile(r'^history_(\d{4})_(\d{2})$')
+
+
+def month_start(dt: datetime) -> datetime:
+    return dt.astimezone(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month: datetime, n: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + n
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(month: datetime) -> str:
+    return f"{PARENT}_{month.year:04d}_{month.month:02d}"
+
+
+def is_partitioned(conn) -> bool:
+    return conn.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:name))"
+    ), {'name': PARENT}).scalar()
+
+
+def list_partitions(conn) -> List[Tuple[str, datetime]]:
+    """Monthly partitions as (name, month start), oldest first."""
+    names = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = CAST(:parent AS regclass)"
+    ), {'parent': PARENT}).scalars()
+    result = []
+    for name in names:
+        m = _NAME_RE.match(name)
+        if m:
+            result.append((name, datetime(int(m.group(1)), int(m.group(2)), 1, tzinfo=timezone.utc)))
+    return sorted(result, key=lambda p: p[1])
+
+
+def _bounds(month: datetime) -> Tuple[str, str]:
+    return month.isoformat(), add_months(month, 1).isoformat()
+
+
+def _default_months(conn) -> List[datetime]:
+    """Months that have rows stranded in the default partition (it is kept empty, so this is cheap)."""
+    rows = conn.execute(text(
+        f"SELECT DISTINCT date_trunc('month', downloaded_at AT TIME ZONE 'UTC') FROM {DEFAULT_PARTITION}"
+    )).scalars()
+    return [m.replace(tzinfo=timezone.utc) for m in rows]
+
+
+def create_partition(conn, month: datetime) -> Tuple[str, int]:
+    """Create a month's partition; returns (name, rows moved out of the default partition).
+
+    Postgres refuses to create a partition while the default one holds rows of its range
+    (e.g. after the maintenance job missed a month boundary). Those rows are moved: detach
+    the default, create the month, copy its rows over and re-attach the default.
+    """
+    name = partition_name(month)
+    lower, upper = _bounds(month)
+    ddl = f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT} FOR VALUES FROM ('{lower}') TO ('{upper}')"
+    in_range = f"downloaded_at >= '{lower}' AND downloaded_at < '{upper}'"
+    has_default = conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {'name': DEFAULT_PARTITION}).scalar()
+    stranded = has_default and conn.execute(text(
+        f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE {in_range})"
+    )).scalar()
+    if not stranded:
+        conn.execute(text(ddl))
+        return name, 0
+    conn.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {DEFAULT_PARTITION}"))
+    conn.execute(text(ddl))
+    moved = conn.execute(text(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE {in_range} RETURNING id, user_id, track_id, downloaded_at) "
+        f"INSERT INTO {PARENT} (id, user_id, track_id, downloaded_at) SELECT * FROM moved"
+    )).rowcount
+    conn.execute(text(f"ALTER TABLE {PARENT} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT"))
+    logging.warning("History rows for %s had landed in %s (a month boundary was missed); moved %d rows into %s",
+                    month.strftime('%Y-%m'), DEFAULT_PARTITION, moved, name)
+    return name, moved
+
+
+def ensure_partitions(conn, months_ahead: int, now: datetime | None = None) -> List[str]:
+    """Create the default partition, monthly ones from the current month to months_ahead, and
+    one for every month with rows stranded in the default partition. Returns new names."""
+    existing = {name for name, _ in list_partitions(conn)}
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {PARENT} DEFAULT"))
+    current = month_start(now or datetime.now(timezone.utc))
+    months = {add_months(current, n) for n in range(months_ahead + 1)} | set(_default_months(conn))
+    created = []
+    for month in sorted(months):
+        if partition_name(month) not in existing:
+            created.append(create_partition(conn, month)[0])
+    return created
+
+
+def drop_partitions_before(conn, cutoff: datetime) -> List[str]:
+    """Drop monthly partitions that end at or before cutoff (whole months only). Returns dropped names."""
+    dropped = []
+    for name, month in list_partitions(conn):
+        if add_months(month, 1) > cutoff:
+            break
+        conn.execute(text(f"DROP TABLE {name}"))
+        dropped.append(name)
+    return dropped
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
+from telegram.ext import ContextTypes, CommandHandler, CallbackQueryHandler
+
+from services.favorites import toggle_favorite, UnknownTrackError
+from services.repository import list_favorites, get_track_meta
+from services.throttle import reject_if_throttled
+from handlers.song import auto_download_and_send
+from utils.keyboard import favorite_keyboard
+
+FAVORITES_PAGE_SIZE = 10
+
+
+def _favorites_keyboard(rows, next_cursor: str | None) -> InlineKeyboardMarkup:
+    buttons = []
+    for row in rows:
+        label = f"{row['title']} — {row['artist']}" if row['artist'] else row['title']
+        buttons.append([InlineKeyboardButton(f"❤️ {label}"[:60], callback_data=f"favplay:{row['video_id']}")])
+    if next_cursor:
+        buttons.append([InlineKeyboardButton("More ▶", callback_data=f"favs:{next_cursor}")])
+    return InlineKeyboardMarkup(buttons)
+
+
+async def _send_page(message, user_id: int, cursor: str | None = None) -> None:
+    rows, next_cursor = await asyncio.to_thread(list_favorites, user_id, FAVORITES_PAGE_SIZE, cursor)
+    if not rows and not cursor:
+        await message.reply_text("No favorites yet. Tap 🤍 under a song to add it.")
+        return
+    await message.reply_text("Your favorites (tap to get the song):", reply_markup=_favorites_keyboard(rows, next_cursor))
+
+
+async def cmd_favorites(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        await _send_page(update.message, update.effective_user.id)
+    except Exception:
+        logging.exception("Failed to load favorites")
+        await update.message.reply_text("Failed to load favorites. Try again later.")
+
+
+async def handle_favorites_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    cursor = (query.data or "").split(":", 1)[1]
+    try:
+        await _send_page(query.message, update.effective_user.id, cursor)
+    except Exception:
+        logging.exception("Failed to load favorites page")
+        return
+    try:
+        await query.edit_message_reply_markup(reply_markup=None)
+    except Exception:
+        pass
+
+
+async def handle_favorite_toggle(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    video_id = (query.data or "").split(":", 1)[1]
+    try:
+        favorite = await asyncio.to_thread(toggle_favorite, update.effective_user.id, video_id)
+    except UnknownTrackError:
+        await query.answer("Still saving this song — try again in a moment.")
+        return
+    except Exception:
+        logging.exception("Failed to toggle favorite %s", video_id)
+        await query.answer("Failed to update favorites.")
+        return
+    await query.answer("Added to favorites ❤️" if favorite else "Removed from favorites")
+    try:
+        await query.edit_message_reply_markup(reply_markup=favorite_keyboard(video_id, favorite))
+    except Exception:
+        pass
+
+
+async def handle_favorite_play(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    if await reject_if_throttled(update):
+        return
+    await query.answer()
+    video_id = (query.data or "").split(":", 1)[1]
+    track_meta = get_track_meta(video_id)
+    if not track_meta:
+        await query.message.reply_text("Track not found.")
+        return
+    # known file_id or cached file: sent without downloading
+    await auto_download_and_send(update, context, track_meta)
+
+
+def build_handlers():
+    return [
+        CommandHandler("favorites", cmd_favorites),
+        CallbackQueryHandler(handle_favorite_toggle, pattern=r"^fav:[\w-]+$"),
+        CallbackQueryHandler(handle_favorite_play, pattern=r"^favplay:[\w-]+$"),
+        CallbackQueryHandler(handle_favorites_page, pattern=r"^favs:\d+$"),
+    ]
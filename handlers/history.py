@@ -1,2 +1,90 @@
+import asyncio
+import logging
+from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
+from telegram.ext import ContextTypes, CommandHandler, CallbackQueryHandler
 
+from services.repository import list_history
+from services.stats import top_tracks, user_top_tracks
 
+HISTORY_PAGE_SIZE = 10
+
+
+def _format_duration(seconds: int | None) -> str:
+    if not seconds:
+        return ""
+    return f" ({seconds // 60}:{seconds % 60:02d})"
+
+
+def _render_page(rows) -> str:
+    if not rows:
+        return "Your history is empty."
+    lines = ["Your recent downloads:"]
+    for row in rows:
+        when = row['downloaded_at'].strftime('%Y-%m-%d') if row['downloaded_at'] else ''
+        artist = f" — {row['artist']}" if row['artist'] else ""
+        lines.append(f"• {row['title']}{artist}{_format_duration(row['duration'])} · {when}")
+    return "\n".join(lines)
+
+
+def _page_keyboard(next_cursor: str | None) -> InlineKeyboardMarkup | None:
+    if not next_cursor:
+        return None
+    return InlineKeyboardMarkup([[InlineKeyboardButton("More ▶", callback_data=f"hist:{next_cursor}")]])
+
+
+async def cmd_history(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        rows, next_cursor = await asyncio.to_thread(list_history, update.effective_user.id, HISTORY_PAGE_SIZE)
+    except Exception:
+        logging.exception("Failed to load history")
+        await update.message.reply_text("Failed to load history. Try again later.")
+        return
+    await update.message.reply_text(_render_page(rows), reply_markup=_page_keyboard(next_cursor))
+
+
+async def handle_history_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    cursor = (query.data or "").split(":", 1)[1]
+    try:
+        rows, next_cursor = await asyncio.to_thread(list_history, update.effective_user.id, HISTORY_PAGE_SIZE, cursor)
+    except Exception:
+        logging.exception("Failed to load history page")
+        return
+    # Older pages are sent as new messages so earlier pages stay readable
+    await query.message.reply_text(_render_page(rows), reply_markup=_page_keyboard(next_cursor))
+    try:
+        await query.edit_message_reply_markup(reply_markup=None)
+    except Exception:
+        pass
+
+
+def _render_top(title: str, rows) -> str:
+    if not rows:
+        return f"{title}\nNothing here yet."
+    lines = [title]
+    for i, row in enumerate(rows, 1):
+        artist = f" — {row['artist']}" if row['artist'] else ""
+        lines.append(f"{i}. {row['title']}{artist} · {row['plays']} plays")
+    return "\n".join(lines)
+
+
+async def cmd_top(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        weekly = await asyncio.to_thread(top_tracks, 10, 7)
+        mine = await asyncio.to_thread(user_top_tracks, update.effective_user.id, 5)
+    except Exception:
+        logging.exception("Failed to load top tracks")
+        await update.message.reply_text("Failed to load stats. Try again later.")
+        return
+    await update.message.reply_text(
+        _render_top("🔥 Top tracks this week:", weekly) + "\n\n" + _render_top("🎧 Your most played:", mine)
+    )
+
+
+def build_handlers():
+    return [
+        CommandHandler("history", cmd_history),
+        CommandHandler("top", cmd_top),
+        CallbackQueryHandler(handle_history_page, pattern=r"^hist:\d+\.\d+$"),
+    ]
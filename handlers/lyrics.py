@@ -0,0 +1,69 @@
+import logging
+from telegram import Update
+from telegram.ext import ContextTypes, CommandHandler
+
+from services.lyrics import get_lyrics
+from services.resolver import resolve_query
+from services.youtube import get_youtube_service
+from services.tracing import traced
+from services.throttle import reject_if_throttled
+
+TELEGRAM_TEXT_LIMIT = 4096
+
+
+def _chunks(text: str, size: int = TELEGRAM_TEXT_LIMIT):
+    while text:
+        if len(text) <= size:
+            yield text
+            return
+        cut = text.rfind('\n', 0, size)
+        if cut <= 0:
+            cut = size
+        yield text[:cut]
+        text = text[cut:].lstrip('\n')
+
+
+async def handle_lyrics_query(update: Update, context: ContextTypes.DEFAULT_TYPE, query: str):
+    if not query:
+        await update.message.reply_text("Send a song name or YouTube link to get its lyrics.")
+        return
+    status = await update.message.reply_text(f"Looking up lyrics: {query} …")
+    try:
+        track_meta = await resolve_query(query)
+        if track_meta and track_meta.title == track_meta.url:
+            # unknown link: the resolver's placeholder has no title/artist to search lyrics by
+            track_meta = await get_youtube_service().fetch_meta(track_meta.url)
+    except Exception:
+        logging.exception("Lyrics search failed")
+        await status.edit_text("Search failed. Try again later.")
+        return
+    if not track_meta:
+        await status.edit_text("No results.")
+        return
+    try:
+        result = await get_lyrics(track_meta)
+    except Exception:
+        logging.exception("Lyrics lookup failed")
+        await status.edit_text("Lyrics lookup failed. Try again later.")
+        return
+    if not result:
+        await status.edit_text(f"No lyrics found for: {track_meta.title}")
+        return
+    text = f"📃 {track_meta.title}\n\n{result.text}"
+    chunks = list(_chunks(text))
+    await status.edit_text(chunks[0])
+    for chunk in chunks[1:]:
+        await update.effective_chat.send_message(chunk)
+
+
+@traced('bot.lyrics')
+async def cmd_lyrics(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if await reject_if_throttled(update):
+        return
+    await handle_lyrics_query(update, context, " ".join(context.args or []).strip())
+
+
+def build_handlers():
+    return [
+        CommandHandler("lyrics", cmd_lyrics),
+    ]
@@ -0,0 +1,101 @@
+import logging
+from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
+from telegram.ext import ContextTypes, CommandHandler, CallbackQueryHandler
+
+from services.youtube import get_youtube_service
+from services.repository import record_download
+from services.delivery import send_audio_file
+from services.playlist import PlaylistJob, start_job, get_job, run_playlist
+from services.progress import ProgressMessage
+from services.tracing import traced
+from services.throttle import THROTTLE_USER_LIMIT, check_user, reject_if_throttled, retry_text
+from utils.youtube_url import parse_playlist_id
+
+
+def _cancel_keyboard(job: PlaylistJob) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([[InlineKeyboardButton("✖ Cancel", callback_data=f"plcancel:{job.job_id}")]])
+
+
+def _status_text(job: PlaylistJob) -> str:
+    text = f"📀 {job.title}\n{job.delivered}/{len(job.entries)} sent"
+    if job.failed:
+        text += f", {job.failed} failed"
+    return text
+
+
+async def _run(update: Update, context: ContextTypes.DEFAULT_TYPE, job: PlaylistJob, progress: ProgressMessage):
+    chat_id = progress.chat_id
+
+    async def deliver(track_meta, file_path):
+        await send_audio_file(context.bot, chat_id, track_meta, file_path)
+        try:
+            record_download(update.effective_user, track_meta)
+        except Exception:
+            logging.exception("DB error while saving history")
+
+    async def report(job: PlaylistJob):
+        await progress.update(_status_text(job), reply_markup=_cancel_keyboard(job))
+
+    try:
+        await run_playlist(job, deliver, report)
+    except Exception:
+        logging.exception("Playlist job %s failed", job.job_id)
+    if job.cancelled:
+        await progress.update(_status_text(job) + " — cancelled.")
+    else:
+        await progress.update(_status_text(job) + " — done ✅")
+
+
+async def handle_playlist(update: Update, context: ContextTypes.DEFAULT_TYPE, url: str):
+    if not parse_playlist_id(url):
+        await update.message.reply_text("Send a YouTube playlist or album link.")
+        return
+    status = await update.message.reply_text("Reading playlist…")
+    try:
+        title, entries = await get_youtube_service().extract_playlist(url)
+    except Exception:
+        logging.exception("Playlist extraction failed")
+        await status.edit_text("Failed to read the playlist. Try again later.")
+        return
+    if not entries:
+        await status.edit_text("The playlist is empty or unavailable.")
+        return
+    # the one charge for this request: every queued item is a download (capped so a long
+    # playlist is not refused forever)
+    retry_after = check_user(update.effective_user.id, min(len(entries), THROTTLE_USER_LIMIT))
+    if retry_after:
+        await status.edit_text(retry_text(retry_after))
+        return
+    job = start_job(update.effective_user.id, title, entries)
+    progress = ProgressMessage(context.bot, status.chat_id, status.message_id)
+    await progress.update(_status_text(job), reply_markup=_cancel_keyboard(job))
+    # run outside the handler so updates (e.g. the cancel button) keep being processed
+    context.application.create_task(_run(update, context, job, progress), update=update)
+
+
+@traced('bot.playlist')
+async def cmd_playlist(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # cost 0: refuse users already over budget; handle_playlist charges the items
+    if await reject_if_throttled(update, cost=0):
+        return
+    await handle_playlist(update, context, " ".join(context.args or []).strip())
+
+
+async def handle_playlist_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    job = get_job((query.data or "").split(":", 1)[1])
+    if job is None:
+        await query.answer("Already finished.")
+        return
+    if job.user_id != update.effective_user.id:
+        await query.answer("Only the requester can cancel this.")
+        return
+    job.cancel()
+    await query.answer("Cancelling…")
+
+
+def build_handlers():
+    return [
+        CommandHandler("playlist", cmd_playlist),
+        CallbackQueryHandler(handle_playlist_cancel, pattern=r"^plcancel:\w+$"),
+    ]
@@ -0,0 +1,58 @@
+import asyncio
+import logging
+from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
+from telegram.ext import ContextTypes, CommandHandler, CallbackQueryHandler
+
+from services.recomender import recommend_tracks
+from services.repository import get_track_meta
+from services.stats import top_tracks
+from handlers.song import auto_download_and_send
+from services.throttle import reject_if_throttled
+
+RECOMMEND_COUNT = 8
+
+
+def _keyboard(rows) -> InlineKeyboardMarkup:
+    buttons = []
+    for row in rows:
+        label = f"{row['title']} — {row['artist']}" if row['artist'] else row['title']
+        buttons.append([InlineKeyboardButton(label[:60], callback_data=f"rec:{row['video_id']}")])
+    return InlineKeyboardMarkup(buttons)
+
+
+async def cmd_recommend(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        rows = await asyncio.to_thread(recommend_tracks, update.effective_user.id, RECOMMEND_COUNT)
+        title = "🎯 Recommended for you:"
+        if not rows:
+            # cold start: nothing to go on yet, show what is popular
+            rows = await asyncio.to_thread(top_tracks, RECOMMEND_COUNT, 7)
+            title = "🔥 Popular this week:"
+    except Exception:
+        logging.exception("Failed to build recommendations")
+        await update.message.reply_text("Failed to load recommendations. Try again later.")
+        return
+    if not rows:
+        await update.message.reply_text("No recommendations yet. Download a few songs first!")
+        return
+    await update.message.reply_text(title, reply_markup=_keyboard(rows))
+
+
+async def handle_recommendation_pick(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    if await reject_if_throttled(update):
+        return
+    await query.answer()
+    video_id = (query.data or "").split(":", 1)[1]
+    track_meta = get_track_meta(video_id)
+    if not track_meta:
+        await query.message.reply_text("Track not found.")
+        return
+    await auto_download_and_send(update, context, track_meta)
+
+
+def build_handlers():
+    return [
+        CommandHandler("recommend", cmd_recommend),
+        CallbackQueryHandler(handle_recommendation_pick, pattern=r"^rec:[\w:-]+$"),
+    ]
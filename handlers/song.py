@@ -1,15 +1,21 @@
-import asyncio
 import logging
-import os
-from typing import List
-from telegram import Update, InputFile, Message
+from telegram import Update, Message
 from telegram.ext import ContextTypes, CommandHandler, MessageHandler, filters
 
 from utils.states import get_mode, set_mode, reset_mode, UserMode
 from utils.keyboard import main_menu_keyboard
-from services.youtube import get_youtube_service, TrackMeta
+from services.youtube import get_youtube_service, TrackMeta, MediaTooLargeError
 from services.repository import record_download
-from services.media import ensure_thumbnail
+from services.jobs import run_download, JobNotClaimedError
+from services.delivery import send_audio_file, is_deliverable
+from services.resolver import resolve_query
+from services.progress import ProgressMessage
+from services.tracing import traced
+from services.throttle import reject_if_throttled
+from handlers.lyrics import handle_lyrics_query
+from handlers.video import handle_video_query
+from handlers.playlist import handle_playlist
+from utils.youtube_url import is_playlist_url
 
 
 # Handlers
@@ -30,16 +36,31 @@ async def menu_button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
         set_mode(context.user_data, UserMode.DOWNLOAD)
         await update.message.reply_text("Send a query to search tracks.")
     elif text == "📃 Lyrics":
-        await update.message.reply_text("Lyrics feature coming soon.")
+        set_mode(context.user_data, UserMode.LYRICS)
+        await update.message.reply_text("Send a song name or YouTube link to get its lyrics.")
+    elif text == "🎬 Video":
+        set_mode(context.user_data, UserMode.VIDEO)
+        await update.message.reply_text("Send a song name or YouTube link to get the video.")
     else:
         await update.message.reply_text("Unknown action.")
 
+@traced('bot.text_query')
 async def text_query_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = (update.message.text or "").strip()
     mode = get_mode(context.user_data)
+    playlist = mode in (UserMode.DOWNLOAD, UserMode.IDLE) and is_playlist_url(text)
+    # playlists are charged per item by handle_playlist
+    if text and await reject_if_throttled(update, cost=0 if playlist else 1):
+        return
 
-    if mode in (UserMode.DOWNLOAD, UserMode.IDLE):
+    if playlist:
+        await handle_playlist(update, context, text)
+    elif mode in (UserMode.DOWNLOAD, UserMode.IDLE):
         await _handle_search(update, context, text)
+    elif mode == UserMode.LYRICS:
+        await handle_lyrics_query(update, context, text)
+    elif mode == UserMode.VIDEO:
+        await handle_video_query(update, context, text)
     else:
         await update.message.reply_text("Please choose an action from the menu.")
 
@@ -47,163 +68,72 @@ async def _handle_search(update: Update, context: ContextTypes.DEFAULT_TYPE, que
     if not query:
         await update.message.reply_text("Empty query.")
         return
-    svc = get_youtube_service()
     searching_msg = await update.message.reply_text(f"Searching: {query} …")
     try:
-        results: List[TrackMeta] = await svc.search(query, limit=1)
+        track_meta = await resolve_query(query)
     except Exception:
         logging.exception("Search failed")
         await searching_msg.edit_text("Search failed. Try again later.")
         return
-    if not results:
+    if not track_meta:
         await searching_msg.edit_text("No results.")
         return
-    track_meta = results[0]
     svc = get_youtube_service()
     cached = svc.find_cached_file(track_meta.id)
-    if cached:
+    if is_deliverable(track_meta, cached):
         try:
-            thumb_res = await ensure_thumbnail(track_meta.thumbnail, track_meta.id)
-            thumb_input = None
-            thumb_fh = None
-            if thumb_res:
-                try:
-                    thumb_fh = open(thumb_res.path, 'rb')
-                    thumb_input = InputFile(thumb_fh)
-                except Exception:
-                    thumb_input = None
-            with open(cached, 'rb') as f:
-                await update.effective_chat.send_audio(
-                    audio=InputFile(f, filename=os.path.basename(cached)),
-                    title=track_meta.title,
-                    performer=track_meta.uploader or "Unknown",
-                    duration=track_meta.duration or 0,
-                    caption=f"@i_am_web_music_bot",
-                    thumbnail=thumb_input,
-                )
-            record_download(update.effective_user, track_meta)
-            if thumb_fh:
-                try:
-                    thumb_fh.close()
-                except Exception:
-                    pass
+            await send_audio_file(context.bot, update.effective_chat.id, track_meta, cached)
+        except Exception:
+            logging.exception("Failed sending cached file; will re-download.")
+        else:
+            # the file is delivered: a bookkeeping failure must not send it again
+            try:
+                record_download(update.effective_user, track_meta)
+            except Exception:
+                logging.exception("DB error while saving history")
             try:
                 await searching_msg.delete()
             except Exception:
                 pass
             return
-        except Exception:
-            logging.exception("Failed sending cached file; will re-download.")
     await searching_msg.edit_text(f"Found: {track_meta.title}\nStarting download…")
-    await _auto_download_and_send(update, context, track_meta, searching_msg)
+    await auto_download_and_send(update, context, track_meta, searching_msg)
 
-async def _auto_download_and_send(update: Update, context: ContextTypes.DEFAULT_TYPE, track_meta: TrackMeta, search_message: Message | None = None):
+async def auto_download_and_send(update: Update, context: ContextTypes.DEFAULT_TYPE, track_meta: TrackMeta, search_message: Message | None = None):
     svc = get_youtube_service()
     cached = svc.find_cached_file(track_meta.id)
-    if cached and os.path.isfile(cached):
+    if is_deliverable(track_meta, cached):
         try:
-            thumb_res = await ensure_thumbnail(track_meta.thumbnail, track_meta.id)
-            thumb_input = None
-            thumb_fh = None
-            if thumb_res:
-                try:
-                    thumb_fh = open(thumb_res.path, 'rb')
-                    thumb_input = InputFile(thumb_fh)
-                except Exception:
-                    thumb_input = None
-            with open(cached, 'rb') as f:
-                await update.effective_chat.send_audio(
-                    audio=InputFile(f, filename=os.path.basename(cached)),
-                    title=track_meta.title,
-                    performer=track_meta.uploader or "Unknown",
-                    duration=track_meta.duration or 0,
-                    caption=f"@i_am_web_music_bot",
-                    thumbnail=thumb_input,
-                )
-            record_download(update.effective_user, track_meta)
-            if thumb_fh:
-                try:
-                    thumb_fh.close()
-                except Exception:
-                    pass
+            await send_audio_file(context.bot, update.effective_chat.id, track_meta, cached)
+        except Exception:
+            logging.exception("Failed sending cached file inside auto_download_and_send; proceeding to download.")
+        else:
+            try:
+                record_download(update.effective_user, track_meta)
+            except Exception:
+                logging.exception("DB error while saving history")
             if search_message:
                 try:
                     await search_message.delete()
                 except Exception:
                     pass
             return
-        except Exception:
-            logging.exception("Failed sending cached file inside _auto_download_and_send; proceeding to download.")
-
-    progress_message = await update.effective_chat.send_message(f"Downloading: {track_meta.title} …")
-    chat_id = progress_message.chat_id
-    message_id = progress_message.message_id
-    loop = asyncio.get_running_loop()
 
-    async def _edit_progress(text: str):
-        try:
-            await context.bot.edit_message_text(chat_id=chat_id, message_id=message_id, text=text)
-        except Exception:
-            pass
-
-    def progress_hook(d):
-        if d.get('status') == 'downloading':
-            total = d.get('total_bytes') or d.get('total_bytes_estimate') or 0
-            downloaded = d.get('downloaded_bytes', 0)
-            if total:
-                pct = downloaded / total * 100
-                loop.call_soon_threadsafe(asyncio.create_task, _edit_progress(f"Downloading: {pct:.1f}%"))
-        elif d.get('status') == 'finished':
-            loop.call_soon_threadsafe(asyncio.create_task, _edit_progress("Processing audio…"))
-
-    svc = get_youtube_service()
+    progress = await ProgressMessage.send(context.bot, update.effective_chat.id, f"Downloading: {track_meta.title} …")
     try:
-        file_path, final_meta = await svc.download_audio(track_meta.url, progress=progress_hook)
-    except Exception:
-        logging.exception("Download failed")
-        await _edit_progress("Download failed.")
+        await run_download(context.bot, 'audio', track_meta, update.effective_user, progress)
+    except MediaTooLargeError:
+        await progress.update("This track is too long to fit Telegram's upload limit.")
         return
-
-    try:
-        thumb_res = await ensure_thumbnail(final_meta.thumbnail, final_meta.id)
-        thumb_input = None
-        thumb_fh = None
-        if thumb_res:
-            try:
-                thumb_fh = open(thumb_res.path, 'rb')
-                thumb_input = InputFile(thumb_fh)
-            except Exception:
-                thumb_input = None
-        with open(file_path, 'rb') as f:
-            audio = InputFile(f, filename=os.path.basename(file_path))
-            await context.bot.send_audio(
-                chat_id=chat_id,
-                audio=audio,
-                title=final_meta.title,
-                performer=final_meta.uploader or "Unknown",
-                duration=final_meta.duration or 0,
-                caption=f"@i_am_web_music_bot",
-                thumbnail=thumb_input,
-            )
-        if thumb_fh:
-            try:
-                thumb_fh.close()
-            except Exception:
-                pass
-    except Exception:
-        logging.exception("Failed sending audio")
-        await _edit_progress("Failed to send audio.")
+    except JobNotClaimedError:
+        # the user has been told already
         return
-
-    try:
-        record_download(update.effective_user, final_meta)
     except Exception:
-        logging.exception("DB error while saving history")
+        logging.exception("Download failed")
+        await progress.update("Download failed.")
+        return
 
-    try:
-        await context.bot.delete_message(chat_id=chat_id, message_id=message_id)
-    except Exception:
-        pass
+    await progress.delete()
     if search_message:
         try:
             await search_message.delete()
@@ -215,6 +145,6 @@ async def _auto_download_and_send(update: Update, context: ContextTypes.DEFAULT_
 def build_handlers():
     return [
         CommandHandler("start", cmd_start),
-        MessageHandler(filters.Regex(r"^(📥 Download|🔍 Search|📃 Lyrics)$"), menu_button_handler),
+        MessageHandler(filters.Regex(r"^(📥 Download|🔍 Search|📃 Lyrics|🎬 Video)$"), menu_button_handler),
         MessageHandler(filters.TEXT & ~filters.COMMAND, text_query_handler),
     ]
@@ -0,0 +1,76 @@
+import logging
+from telegram import Update
+from telegram.ext import ContextTypes, CommandHandler
+
+from services.youtube import get_youtube_service, MediaTooLargeError
+from services.repository import record_download
+from services.jobs import run_download, JobNotClaimedError
+from services.delivery import send_video_file, is_deliverable
+from services.resolver import resolve_query
+from services.progress import ProgressMessage
+from services.tracing import traced
+from services.throttle import reject_if_throttled
+
+
+async def handle_video_query(update: Update, context: ContextTypes.DEFAULT_TYPE, query: str):
+    if not query:
+        await update.message.reply_text("Send a song name or YouTube link to get the video.")
+        return
+    status = await update.message.reply_text(f"Searching: {query} …")
+    try:
+        track_meta = await resolve_query(query)
+    except Exception:
+        logging.exception("Video search failed")
+        await status.edit_text("Search failed. Try again later.")
+        return
+    if not track_meta:
+        await status.edit_text("No results.")
+        return
+
+    chat_id = update.effective_chat.id
+    svc = get_youtube_service()
+    cached = svc.find_cached_file(track_meta.id, ext='mp4')
+    if is_deliverable(track_meta, cached, kind='video'):
+        try:
+            await send_video_file(context.bot, chat_id, track_meta, cached)
+        except Exception:
+            logging.exception("Failed sending cached video; will re-download.")
+        else:
+            try:
+                record_download(update.effective_user, track_meta)
+            except Exception:
+                logging.exception("DB error while saving history")
+            try:
+                await status.delete()
+            except Exception:
+                pass
+            return
+
+    progress = ProgressMessage(context.bot, status.chat_id, status.message_id, label="video")
+    await progress.update(f"Downloading video: {track_meta.title} …")
+    try:
+        await run_download(context.bot, 'video', track_meta, update.effective_user, progress)
+    except MediaTooLargeError:
+        await progress.update("This video is too long to fit Telegram's upload limit. Try 📥 Download for the audio.")
+        return
+    except JobNotClaimedError:
+        # the user has been told already
+        return
+    except Exception:
+        logging.exception("Video download failed")
+        await progress.update("Download failed.")
+        return
+    await progress.delete()
+
+
+@traced('bot.video')
+async def cmd_video(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if await reject_if_throttled(update):
+        return
+    await handle_video_query(update, context, " ".join(context.args or []).strip())
+
+
+def build_handlers():
+    return [
+        CommandHandler("video", cmd_video),
+    ]
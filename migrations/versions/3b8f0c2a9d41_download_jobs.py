@@ -0,0 +1,45 @@
+"""download jobs
+
+Revision ID: 3b8f0c2a9d41
+Revises: c75666fb685b
+Create Date: 2026-10-19 12:20:44.107532
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b8f0c2a9d41'
+down_revision: Union[str, Sequence[str], None] = 'c75666fb685b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'download_jobs',
+        sa.Column('id', sa.BigInteger(), primary_key=True, autoincrement=True),
+        sa.Column('kind', sa.String(length=16), nullable=False),
+        sa.Column('video_id', sa.String(length=64), nullable=False),
+        sa.Column('url', sa.String(), nullable=False),
+        sa.Column('title', sa.String(), nullable=True),
+        sa.Column('user_id', sa.BigInteger(), nullable=False),
+        sa.Column('chat_id', sa.BigInteger(), nullable=False),
+        sa.Column('message_id', sa.BigInteger(), nullable=True),
+        sa.Column('status', sa.String(length=16), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    )
+    op.create_index('ix_download_jobs_status_updated', 'download_jobs', ['status', 'updated_at'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_download_jobs_status_updated', table_name='download_jobs')
+    op.drop_table('download_jobs')
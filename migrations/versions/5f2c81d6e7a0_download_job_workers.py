@@ -0,0 +1,32 @@
+"""download job workers
+
+Revision ID: 5f2c81d6e7a0
+Revises: a41d7e95c0b3
+Create Date: 2026-10-19 13:34:52.218406
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5f2c81d6e7a0'
+down_revision: Union[str, Sequence[str], None] = 'a41d7e95c0b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('download_jobs', sa.Column('progress', sa.Integer(), nullable=True))
+    op.add_column('download_jobs', sa.Column('worker_id', sa.String(length=64), nullable=True))
+    op.add_column('download_jobs', sa.Column('result_meta', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('download_jobs', 'result_meta')
+    op.drop_column('download_jobs', 'worker_id')
+    op.drop_column('download_jobs', 'progress')
@@ -0,0 +1,28 @@
+"""audio profile
+
+Revision ID: 8e6b3f1a2c57
+Revises: 5f2c81d6e7a0
+Create Date: 2026-10-19 14:02:37.541190
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e6b3f1a2c57'
+down_revision: Union[str, Sequence[str], None] = '5f2c81d6e7a0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('audio_fingerprints', sa.Column('profile', sa.String(length=16), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('audio_fingerprints', 'profile')
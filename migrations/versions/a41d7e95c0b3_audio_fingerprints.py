@@ -0,0 +1,41 @@
+"""audio fingerprints
+
+Revision ID: a41d7e95c0b3
+Revises: 3b8f0c2a9d41
+Create Date: 2026-10-19 12:51:09.662014
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a41d7e95c0b3'
+down_revision: Union[str, Sequence[str], None] = '3b8f0c2a9d41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'audio_fingerprints',
+        sa.Column('video_id', sa.String(length=64), primary_key=True),
+        sa.Column('content_hash', sa.String(length=64), nullable=False),
+        sa.Column('fingerprint', sa.LargeBinary(), nullable=False),
+        sa.Column('fp_bits', sa.Integer(), nullable=False),
+        sa.Column('duration', sa.Integer(), nullable=True),
+        sa.Column('canonical_id', sa.String(length=64), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    )
+    op.create_index('ix_audio_fingerprints_hash', 'audio_fingerprints', ['content_hash'])
+    op.create_index('ix_audio_fingerprints_duration', 'audio_fingerprints', ['duration'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_audio_fingerprints_duration', table_name='audio_fingerprints')
+    op.drop_index('ix_audio_fingerprints_hash', table_name='audio_fingerprints')
+    op.drop_table('audio_fingerprints')
@@ -0,0 +1,105 @@
+"""partition history by month
+
+Revision ID: b7d40c9e1f26
+Revises: 8e6b3f1a2c57
+Create Date: 2026-10-19 16:20:11.604418
+
+"""
+from datetime import datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d40c9e1f26'
+down_revision: Union[str, Sequence[str], None] = '8e6b3f1a2c57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Monthly partitions created beyond the current month (the maintenance job keeps extending them)
+MONTHS_AHEAD = 3
+
+# history's indexes before partitioning (named and column-level ones)
+OLD_INDEXES = ('ix_history_user', 'ix_history_track', 'ix_history_user_time', 'ix_history_user_id',
+               'ix_history_track_id')
+
+
+def _add_months(month: datetime, n: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + n
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+    op.execute("LOCK TABLE history IN EXCLUSIVE MODE")
+    op.rename_table('history', 'history_old')
+    # free the index/constraint names for the new table; the old indexes are not needed for the copy
+    op.execute("ALTER TABLE history_old RENAME CONSTRAINT history_pkey TO history_old_pkey")
+    for name in OLD_INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+    # Keep the id sequence so ids continue where they were (readers page on history.id)
+    op.execute("ALTER SEQUENCE history_id_seq OWNED BY NONE")
+    op.execute("ALTER SEQUENCE history_id_seq AS bigint")
+    op.execute("""
+        CREATE TABLE history (
+            id BIGINT NOT NULL DEFAULT nextval('history_id_seq'),
+            user_id BIGINT REFERENCES users (id) ON DELETE CASCADE,
+            track_id INTEGER REFERENCES tracks (id) ON DELETE CASCADE,
+            downloaded_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            PRIMARY KEY (id, downloaded_at)
+        ) PARTITION BY RANGE (downloaded_at)
+    """)
+    op.execute("ALTER SEQUENCE history_id_seq OWNED BY history.id")
+    op.execute("CREATE INDEX ix_history_user_time ON history (user_id, downloaded_at)")
+
+    now = datetime.now(timezone.utc)
+    oldest = conn.execute(sa.text("SELECT min(downloaded_at) FROM history_old")).scalar() or now
+    month = oldest.astimezone(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    last = _add_months(now.replace(day=1, hour=0, minute=0, second=0, microsecond=0), MONTHS_AHEAD)
+    while month <= last:
+        upper = _add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE history_{month.year:04d}_{month.month:02d} PARTITION OF history "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')"
+        )
+        month = upper
+    op.execute("CREATE TABLE history_default PARTITION OF history DEFAULT")
+
+    op.execute("""
+        INSERT INTO history (id, user_id, track_id, downloaded_at)
+        SELECT id, user_id, track_id, COALESCE(downloaded_at, now()) FROM history_old
+    """)
+    op.drop_table('history_old')
+    op.execute("ANALYZE history")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("LOCK TABLE history IN EXCLUSIVE MODE")
+    op.rename_table('history', 'history_part')
+    op.execute("ALTER TABLE history_part RENAME CONSTRAINT history_pkey TO history_part_pkey")
+    op.execute("DROP INDEX IF EXISTS ix_history_user_time")
+    op.execute("ALTER SEQUENCE history_id_seq OWNED BY NONE")
+    op.execute("""
+        CREATE TABLE history (
+            id INTEGER PRIMARY KEY DEFAULT nextval('history_id_seq'),
+            user_id BIGINT REFERENCES users (id) ON DELETE CASCADE,
+            track_id INTEGER REFERENCES tracks (id) ON DELETE CASCADE,
+            downloaded_at TIMESTAMPTZ DEFAULT now()
+        )
+    """)
+    op.execute("""
+        INSERT INTO history (id, user_id, track_id, downloaded_at)
+        SELECT id, user_id, track_id, downloaded_at FROM history_part
+    """)
+    op.execute("DROP TABLE history_part")
+    op.execute("ALTER SEQUENCE history_id_seq AS integer")
+    op.execute("ALTER SEQUENCE history_id_seq OWNED BY history.id")
+    op.create_index('ix_history_user_id', 'history', ['user_id'])
+    op.create_index('ix_history_track_id', 'history', ['track_id'])
+    op.create_index('ix_history_user', 'history', ['user_id'])
+    op.create_index('ix_history_track', 'history', ['track_id'])
+    op.create_index('ix_history_user_time', 'history', ['user_id', 'downloaded_at'])
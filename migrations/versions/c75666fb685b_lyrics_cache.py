@@ -0,0 +1,34 @@
+"""lyrics cache
+
+Revision ID: c75666fb685b
+Revises: ddfd62398cca
+Create Date: 2026-10-19 11:41:03.318270
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c75666fb685b'
+down_revision: Union[str, Sequence[str], None] = 'ddfd62398cca'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'lyrics',
+        sa.Column('track_id', sa.Integer(), sa.ForeignKey('tracks.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('provider', sa.String(), nullable=True),
+        sa.Column('text', sa.Text(), nullable=True),
+        sa.Column('fetched_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('lyrics')
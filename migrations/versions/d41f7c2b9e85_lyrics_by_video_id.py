@@ -0,0 +1,42 @@
+"""lyrics keyed by video_id
+
+Revision ID: d41f7c2b9e85
+Revises: b7d40c9e1f26
+Create Date: 2026-10-19 18:05:47.112903
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd41f7c2b9e85'
+down_revision: Union[str, Sequence[str], None] = 'b7d40c9e1f26'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('lyrics', sa.Column('video_id', sa.String(length=64), nullable=True))
+    op.execute("UPDATE lyrics l SET video_id = t.video_id FROM tracks t WHERE t.id = l.track_id")
+    op.execute("DELETE FROM lyrics WHERE video_id IS NULL")
+    op.drop_constraint('lyrics_pkey', 'lyrics', type_='primary')
+    op.drop_column('lyrics', 'track_id')
+    op.alter_column('lyrics', 'video_id', nullable=False)
+    op.create_primary_key('lyrics_pkey', 'lyrics', ['video_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.add_column('lyrics', sa.Column('track_id', sa.Integer(), nullable=True))
+    op.execute("UPDATE lyrics l SET track_id = t.id FROM tracks t WHERE t.video_id = l.video_id")
+    # lyrics of videos that never became tracks cannot be kept under the old key
+    op.execute("DELETE FROM lyrics WHERE track_id IS NULL")
+    op.drop_constraint('lyrics_pkey', 'lyrics', type_='primary')
+    op.drop_column('lyrics', 'video_id')
+    op.alter_column('lyrics', 'track_id', nullable=False)
+    op.create_primary_key('lyrics_pkey', 'lyrics', ['track_id'])
+    op.create_foreign_key('lyrics_track_id_fkey', 'lyrics', 'tracks', ['track_id'], ['id'], ondelete='CASCADE')
@@ -0,0 +1,53 @@
+"""play count aggregates
+
+Revision ID: ddfd62398cca
+Revises: e94c71959b3e
+Create Date: 2026-10-19 11:02:17.550912
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ddfd62398cca'
+down_revision: Union[str, Sequence[str], None] = 'e94c71959b3e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema. Backfill afterwards with `python -m services.stats rebuild`."""
+    op.create_table(
+        'track_play_counts',
+        sa.Column('track_id', sa.Integer(), sa.ForeignKey('tracks.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('plays', sa.BigInteger(), nullable=False),
+        sa.Column('last_played_at', sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index('ix_track_play_counts_plays', 'track_play_counts', ['plays'])
+
+    op.create_table(
+        'user_track_play_counts',
+        sa.Column('user_id', sa.BigInteger(), sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('track_id', sa.Integer(), sa.ForeignKey('tracks.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('plays', sa.BigInteger(), nullable=False),
+        sa.Column('last_played_at', sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index('ix_user_track_play_counts_user_plays', 'user_track_play_counts', ['user_id', 'plays'])
+
+    op.create_table(
+        'daily_track_play_counts',
+        sa.Column('day', sa.Date(), primary_key=True),
+        sa.Column('track_id', sa.Integer(), sa.ForeignKey('tracks.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('plays', sa.BigInteger(), nullable=False),
+    )
+    op.create_index('ix_daily_track_play_counts_day_plays', 'daily_track_play_counts', ['day', 'plays'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('daily_track_play_counts')
+    op.drop_table('user_track_play_counts')
+    op.drop_table('track_play_counts')
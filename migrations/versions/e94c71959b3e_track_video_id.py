@@ -0,0 +1,68 @@
+"""track video_id identity
+
+Revision ID: e94c71959b3e
+Revises: 7dca7734166d
+Create Date: 2026-10-19 10:12:41.204311
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e94c71959b3e'
+down_revision: Union[str, Sequence[str], None] = '7dca7734166d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Same URL shapes as utils.youtube_url.parse_video_id (watch?v=, youtu.be, shorts, embed, live, v)
+VIDEO_ID_PATTERN = r'(?:[?&]v=|youtu\.be/|/shorts/|/embed/|/live/|/v/)([A-Za-z0-9_-]{11})'
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('tracks', sa.Column('video_id', sa.String(length=64), nullable=True))
+
+    # Backfill; URLs that are not recognisable YouTube links keep a stable synthetic id
+    op.execute(sa.text(
+        "UPDATE tracks SET video_id = COALESCE(substring(youtube_url from :pattern), 'url:' || md5(youtube_url))"
+    ).bindparams(pattern=VIDEO_ID_PATTERN))
+
+    # Merge duplicates onto the oldest row per video_id
+    op.execute("""
+        CREATE TEMP TABLE track_merge ON COMMIT DROP AS
+        SELECT id, keep_id FROM (
+            SELECT id, min(id) OVER (PARTITION BY video_id) AS keep_id FROM tracks
+        ) ranked
+        WHERE id <> keep_id
+    """)
+    op.execute("""
+        UPDATE history h SET track_id = m.keep_id
+        FROM track_merge m WHERE h.track_id = m.id
+    """)
+    op.execute("""
+        INSERT INTO favorites (user_id, track_id)
+        SELECT DISTINCT f.user_id, m.keep_id
+        FROM favorites f JOIN track_merge m ON f.track_id = m.id
+        ON CONFLICT ON CONSTRAINT uq_favorites_user_track DO NOTHING
+    """)
+    op.execute("DELETE FROM tracks t USING track_merge m WHERE t.id = m.id")
+    op.execute("""
+        UPDATE tracks SET youtube_url = 'https://www.youtube.com/watch?v=' || video_id
+        WHERE video_id NOT LIKE 'url:%'
+    """)
+
+    op.alter_column('tracks', 'video_id', nullable=False)
+    op.create_index('ux_tracks_video_id', 'tracks', ['video_id'], unique=True)
+    # youtube_url is no longer an identity: drop its unique index/constraint
+    op.execute("DROP INDEX IF EXISTS ix_tracks_youtube_url")
+    op.execute("ALTER TABLE tracks DROP CONSTRAINT IF EXISTS tracks_youtube_url_key")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index('ix_tracks_youtube_url', 'tracks', ['youtube_url'], unique=True)
+    op.drop_index('ux_tracks_video_id', table_name='tracks')
+    op.drop_column('tracks', 'video_id')
@@ -0,0 +1,59 @@
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from services.metrics import record_cache
+
+
+class Coalescer:
+    """Merge concurrent calls for the same key into one, optionally re-serving the result for `window` seconds.
+
+    Callers share one task's result or exception; failures are never re-served. A cancelled
+    caller detaches; the shared call is only cancelled when no caller is left.
+    Meant for use from a single event loop (the PTB loop, which the HTTP bridge schedules onto).
+    """
+
+    def __init__(self, name: str, window: float = 0.0, max_entries: int = 1024):
+        self.name = name
+        self.window = window
+        self.max_entries = max_entries
+        self._inflight: Dict[str, list] = {}  # key -> [task, waiters]
+        self._recent: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        recent = self._recent.get(key)
+        if recent is not None and time.monotonic() - recent[0] < self.window:
+            record_cache(self.name, True)
+            return recent[1]
+        entry = self._inflight.get(key)
+        if entry is None:
+            record_cache(self.name, False)
+            entry = [asyncio.ensure_future(self._lead(key, factory)), 0]
+            # failures nobody is left to await must not warn as "exception never retrieved"
+            entry[0].add_done_callback(lambda t: t.cancelled() or t.exception())
+            entry[0].add_done_callback(lambda _: self._inflight.get(key) is entry and self._inflight.pop(key))
+            self._inflight[key] = entry
+        else:
+            record_cache(self.name, True)
+        task = entry[0]
+        entry[1] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            # a cancelled caller only detaches; the shared call is cancelled once nobody waits for it
+            entry[1] -= 1
+            if not entry[1] and not task.done():
+                if self._inflight.get(key) is entry:
+                    self._inflight.pop(key)
+                task.cancel()
+            raise
+
+    async def _lead(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        result = await factory()
+        if self.window:
+            self._recent[key] = (time.monotonic(), result)
+            self._recent.move_to_end(key)
+            while len(self._recent) > self.max_entries:
+                self._recent.popitem(last=False)
+        return result
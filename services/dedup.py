@@ -0,0 +1,217 @@
+"""Content-hash and acoustic-fingerprint dedup for cached MP3s.
+
+Different uploads of one song (official video, lyric video, "- Topic"
+channel) arrive under different video ids. After transcoding, each MP3 gets
+a SHA-256 and a small energy-envelope fingerprint (ffmpeg decodes to 2 kHz
+mono and measures each 100 ms frame's RMS level; one bit per frame: did the
+energy rise?). A file identical by hash, or whose fingerprint matches an
+existing one of similar duration, is replaced by a hardlink to the first
+stored copy, and its id is recorded as an alias so find_cached_file can serve
+it even when its own file is gone. Aliases written by other processes
+(external download workers) are picked up by looking an id up again on a miss.
+"""
+from __future__ import annotations
+
+import os
+import time
+import hashlib
+import logging
+import subprocess
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from db.db_session import get_session
+from db.models import AudioFingerprint
+from services.metrics import timed, record_cache
+from services import storage
+
+FP_SAMPLE_RATE = 2000
+FP_FRAME = FP_SAMPLE_RATE // 10  # 100 ms
+FP_MAX_OFFSET = 50  # frames of misalignment tried in each direction (±5 s)
+FP_MIN_OVERLAP = 300  # frames (30 s)
+FP_MATCH_THRESHOLD = float(os.getenv('FP_MATCH_THRESHOLD', '0.85'))
+DURATION_TOLERANCE = 3  # seconds
+# an id with no alias is not looked up again for this long
+ALIAS_MISS_TTL = 60
+
+_aliases: Dict[str, str] = {}
+_aliases_loaded = False
+_alias_misses: Dict[str, float] = {}
+_lock = threading.RLock()
+
+
+def content_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _frame_levels(output: str) -> List[float]:
+    """Per-frame RMS levels (dB) from ametadata's print output, whole frames only."""
+    frames: List[Dict[str, str]] = []
+    for line in output.splitlines():
+        if line.startswith('frame:'):
+            frames.append({})
+        elif frames and '=' in line:
+            key, _, value = line.partition('=')
+            frames[-1][key.rsplit('.', 1)[-1]] = value.strip()
+    return [float(f['RMS_level']) for f in frames
+            if 'RMS_level' in f and int(float(f.get('Number_of_samples', 0))) == FP_FRAME]
+
+
+def fingerprint(path: str) -> Tuple[int, int]:
+    """(bits as int, number of bits); bit i = 1 when frame i+1 is louder than frame i."""
+    # ffmpeg reduces each 100 ms frame to its RMS level (monotonic in energy), so no
+    # per-sample loop runs in Python while holding the GIL
+    levels = _frame_levels(subprocess.run(
+        ['ffmpeg', '-v', 'error', '-i', path, '-af',
+         # resample inside the chain: output -ar/-ac would only apply after astats
+         f'aresample={FP_SAMPLE_RATE},aformat=channel_layouts=mono,asetnsamples=n={FP_FRAME}:p=0,'
+         'astats=metadata=1:reset=1:measure_perchannel=none:measure_overall=RMS_level+Number_of_samples,'
+         'ametadata=mode=print:file=-',
+         '-f', 'null', '-'],
+        check=True, capture_output=True, text=True,
+    ).stdout)
+    value = 0
+    for i, (a, b) in enumerate(zip(levels, levels[1:])):
+        if b > a:
+            value |= 1 << i
+    return value, max(len(levels) - 1, 0)
+
+
+def similarity(a: int, a_bits: int, b: int, b_bits: int) -> float:
+    """Best share of equal bits over alignments within ±FP_MAX_OFFSET frames."""
+    best = 0.0
+    for offset in range(-FP_MAX_OFFSET, FP_MAX_OFFSET + 1):
+        x, x_bits, y, y_bits = (a >> offset, a_bits - offset, b, b_bits) if offset >= 0 else \
+            (a, a_bits, b >> -offset, b_bits + offset)
+        overlap = min(x_bits, y_bits)
+        if overlap < FP_MIN_OVERLAP:
+            continue
+        diff = ((x ^ y) & ((1 << overlap) - 1)).bit_count()
+        best = max(best, 1 - diff / overlap)
+    return best
+
+
+def _find_canonical(session, video_id: str, digest: str, fp: int, fp_bits: int, duration: int | None) -> Optional[str]:
+    row = session.execute(
+        select(AudioFingerprint.canonical_id)
+        .where(AudioFingerprint.content_hash == digest, AudioFingerprint.video_id != video_id)
+        .limit(1)
+    ).first()
+    if row:
+        return row.canonical_id
+    if not duration or fp_bits < FP_MIN_OVERLAP:
+        return None
+    candidates = session.execute(
+        select(AudioFingerprint.canonical_id, AudioFingerprint.fingerprint, AudioFingerprint.fp_bits)
+        .where(AudioFingerprint.duration.between(duration - DURATION_TOLERANCE, duration + DURATION_TOLERANCE),
+               AudioFingerprint.video_id != video_id,
+               AudioFingerprint.video_id == AudioFingerprint.canonical_id)
+    ).all()
+    best_id, best_score = None, FP_MATCH_THRESHOLD
+    for c in candidates:
+        score = similarity(fp, fp_bits, int.from_bytes(c.fingerprint, 'little'), c.fp_bits)
+        if score >= best_score:
+            best_id, best_score = c.canonical_id, score
+    return best_id
+
+
+def _link(src: str, dst: str) -> bool:
+    """Atomically make dst a hardlink to src."""
+    tmp = storage.staging_path(os.path.basename(dst) + '.link')
+    try:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        os.link(src, tmp)
+        storage.commit(tmp, dst)
+        return True
+    except OSError:
+        logging.warning("Could not hardlink %s -> %s; keeping separate copy", dst, src)
+        return False
+
+
+def register_audio(video_id: str, path: str, duration: int | None, profile: str | None = None) -> str:
+    """Index a freshly transcoded MP3 and dedupe it against the cache. Returns the path to use."""
+    with timed('fingerprint'):
+        digest = content_hash(path)
+        try:
+            fp, fp_bits = fingerprint(path)
+        except (OSError, subprocess.CalledProcessError):
+            # undecodable or no ffmpeg: exact-hash dedup still applies
+            logging.warning("Fingerprinting failed for %s", video_id)
+            fp, fp_bits = 0, 0
+    with get_session() as session:
+        canonical_id = _find_canonical(session, video_id, digest, fp, fp_bits, duration) or video_id
+        stmt = pg_insert(AudioFingerprint).values(
+            video_id=video_id, content_hash=digest, fingerprint=fp.to_bytes((fp_bits + 7) // 8, 'little'),
+            fp_bits=fp_bits, duration=duration, canonical_id=canonical_id, profile=profile,
+        )
+        session.execute(stmt.on_conflict_do_update(
+            index_elements=[AudioFingerprint.video_id],
+            set_={c: stmt.excluded[c] for c in ('content_hash', 'fingerprint', 'fp_bits', 'duration', 'canonical_id', 'profile')},
+        ))
+    record_cache('audio_dedup', canonical_id != video_id)
+    if canonical_id == video_id:
+        return path
+    with _lock:
+        _aliases[video_id] = canonical_id
+    canonical_path = storage.existing_path(canonical_id, 'mp3')
+    if canonical_path is None:
+        # the shared copy was evicted: this file takes its place
+        _link(path, storage.media_path(canonical_id, 'mp3'))
+        return path
+    if not os.path.samefile(path, canonical_path):
+        _link(canonical_path, path)
+    logging.info("Audio %s deduplicated onto %s", video_id, canonical_id)
+    return path
+
+
+def _lookup_alias(video_id: str) -> Optional[str]:
+    with get_session() as session:
+        row = session.execute(
+            select(AudioFingerprint.canonical_id).where(AudioFingerprint.video_id == video_id)
+        ).first()
+    return row.canonical_id if row and row.canonical_id != video_id else None
+
+
+def resolve_alias(video_id: str) -> Optional[str]:
+    """The id whose file holds the same audio, if video_id was deduplicated onto another one."""
+    global _aliases_loaded
+    with _lock:
+        if not _aliases_loaded:
+            _aliases_loaded = True
+            try:
+                with get_session() as session:
+                    rows = session.execute(
+                        select(AudioFingerprint.video_id, AudioFingerprint.canonical_id)
+                        .where(AudioFingerprint.video_id != AudioFingerprint.canonical_id)
+                    ).all()
+                _aliases.update({r.video_id: r.canonical_id for r in rows})
+            except Exception:
+                logging.exception("Failed to load audio aliases")
+        alias = _aliases.get(video_id)
+        if alias is not None or time.monotonic() - _alias_misses.get(video_id, float('-inf')) < ALIAS_MISS_TTL:
+            return alias
+    # not known here: an external worker may have registered it since the load
+    try:
+        alias = _lookup_alias(video_id)
+    except Exception:
+        logging.exception("Failed to look up audio alias for %s", video_id)
+        return None
+    with _lock:
+        if alias is None:
+            _alias_misses[video_id] = time.monotonic()
+            if len(_alias_misses) > 10_000:
+                now = time.monotonic()
+                for key in [k for k, t in _alias_misses.items() if now - t >= ALIAS_MISS_TTL]:
+                    del _alias_misses[key]
+        else:
+            _aliases[video_id] = alias
+            _alias_misses.pop(video_id, None)
+    return alias
@@ -0,0 +1,134 @@
+import os
+import asyncio
+import logging
+from typing import Dict
+from telegram import Bot, InputFile, Message
+from telegram.error import TelegramError
+
+from services.youtube import TrackMeta
+from services.media import ensure_thumbnail
+from services.metrics import timed, record_cache
+from services.tracing import span
+from services.file_id_cache import get_file_id, remember_file_id, forget_file_id
+from services.favorites import favorite_markup
+
+CAPTION = "@i_am_web_music_bot"
+
+# file_id key -> upload in progress; concurrent sends of the same file wait for it
+_uploads: Dict[str, asyncio.Future] = {}
+
+
+def _file_id_key(track_meta: TrackMeta, kind: str) -> str:
+    return track_meta.id if kind == 'audio' else f"{kind}:{track_meta.id}"
+
+
+def is_deliverable(track_meta: TrackMeta, file_path: str | None, kind: str = 'audio') -> bool:
+    """True when the track can be sent without downloading (known file_id or cached file)."""
+    return bool(get_file_id(_file_id_key(track_meta, kind)) or (file_path and os.path.isfile(file_path)))
+
+
+async def _upload(send, chat_id: int, track_meta: TrackMeta, file_path: str, extra: dict) -> Message:
+    thumb_path = None
+    try:
+        thumb_res = await ensure_thumbnail(track_meta.thumbnail, track_meta.id)
+        if thumb_res:
+            thumb_path = thumb_res.path
+    except Exception:
+        logging.exception("ensure_thumbnail failed for %s", track_meta.id)
+
+    thumb_fh = None
+    try:
+        if thumb_path and os.path.isfile(thumb_path):
+            try:
+                thumb_fh = open(thumb_path, 'rb')
+            except Exception:
+                thumb_fh = None
+        with timed('upload'), span('upload'), open(file_path, 'rb') as fh:
+            message = await send(
+                chat_id,
+                InputFile(fh, filename=os.path.basename(file_path)),
+                duration=track_meta.duration or 0,
+                caption=CAPTION,
+                thumbnail=InputFile(thumb_fh) if thumb_fh else None,
+                **extra,
+            )
+    finally:
+        if thumb_fh:
+            try:
+                thumb_fh.close()
+            except Exception:
+                pass
+    return message
+
+
+async def _send_media(bot: Bot, chat_id: int, track_meta: TrackMeta, file_path: str | None, kind: str) -> Message:
+    if kind == 'audio':
+        send, extra = bot.send_audio, {
+            'title': track_meta.title,
+            'performer': track_meta.uploader or "Unknown",
+            'reply_markup': await favorite_markup(chat_id, track_meta.id),
+        }
+    else:
+        send, extra = bot.send_video, {'supports_streaming': True}
+    key = _file_id_key(track_meta, kind)
+
+    file_id = get_file_id(key)
+    if not file_id and key in _uploads:
+        # another chat is uploading the same file right now: wait and re-use its file_id
+        try:
+            await asyncio.shield(_uploads[key])
+        except Exception:
+            pass
+        file_id = get_file_id(key)
+        record_cache('upload_coalesced', bool(file_id))
+    record_cache('file_id', bool(file_id))
+    if file_id:
+        try:
+            with timed('upload'), span('upload'):
+                return await send(
+                    chat_id,
+                    file_id,
+                    duration=track_meta.duration or 0,
+                    caption=CAPTION,
+                    **extra,
+                )
+        except TelegramError:
+            logging.warning("Cached file_id rejected for %s; uploading file instead", key)
+            forget_file_id(key)
+            if not file_path:
+                raise
+    if not file_path:
+        raise FileNotFoundError(f"No cached {kind} for {track_meta.id}")
+
+    upload = asyncio.get_running_loop().create_future()
+    upload.add_done_callback(lambda f: f.cancelled() or f.exception())
+    _uploads[key] = upload
+    try:
+        message = await _upload(send, chat_id, track_meta, file_path, extra)
+    except asyncio.CancelledError:
+        upload.cancel()
+        raise
+    except BaseException as e:
+        upload.set_exception(e)
+        raise
+    finally:
+        if _uploads.get(key) is upload:
+            del _uploads[key]
+    media = message.audio if kind == 'audio' else message.video
+    if media and track_meta.id:
+        remember_file_id(key, media.file_id)
+    upload.set_result(None)
+    return message
+
+
+async def send_audio_file(bot: Bot, chat_id: int, track_meta: TrackMeta, file_path: str | None) -> Message:
+    """Send a track to a chat, re-using Telegram's file_id when the audio was uploaded before.
+
+    Falls back to uploading the cached/downloaded file (with thumbnail when available).
+    """
+    return await _send_media(bot, chat_id, track_meta, file_path, 'audio')
+
+
+async def send_video_file(bot: Bot, chat_id: int, track_meta: TrackMeta, file_path: str | None) -> Message:
+    """Video counterpart of send_audio_file; file_ids are cached under "video:<id>"."""
+    return await _send_media(bot, chat_id, track_meta, file_path, 'video')
@@ -0,0 +1,136 @@
+"""Per-user favorite tracks.
+
+Membership is answered from an in-memory set of video ids per user (loaded
+once from the favorites table, then kept in step with every toggle), so the
+❤️ button under each sent audio costs no query. A toggle is one statement:
+INSERT ... SELECT ... ON CONFLICT DO NOTHING to add, DELETE to remove.
+"""
+from __future__ import annotations
+
+import os
+import asyncio
+import logging
+from collections import OrderedDict
+from threading import RLock
+from typing import Optional, Set
+
+from sqlalchemy import BigInteger, delete, exists, literal, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+
+from db.db_session import get_session
+from db.models import Favorite, Track
+from services.metrics import record_cache
+from utils.keyboard import favorite_keyboard
+
+# Users whose favorite sets are kept in memory (LRU)
+FAVORITES_CACHE_USERS = int(os.getenv('FAVORITES_CACHE_USERS', '5000'))
+
+_sets: "OrderedDict[int, Set[str]]" = OrderedDict()
+_lock = RLock()
+
+
+class UnknownTrackError(LookupError):
+    """The track (or the user) has no row yet, e.g. the button was pressed before history was saved."""
+
+
+def _load(user_id: int) -> Set[str]:
+    with get_session() as session:
+        rows = session.execute(
+            select(Track.video_id).join(Favorite, Favorite.track_id == Track.id).where(Favorite.user_id == user_id)
+        ).scalars().all()
+    return set(rows)
+
+
+def _cached(user_id: int) -> Optional[Set[str]]:
+    with _lock:
+        ids = _sets.get(user_id)
+        if ids is not None:
+            _sets.move_to_end(user_id)
+        return ids
+
+
+def _store(user_id: int, ids: Set[str]) -> Set[str]:
+    with _lock:
+        # a concurrent toggle may have populated the entry first; it is at least as fresh
+        ids = _sets.setdefault(user_id, ids)
+        _sets.move_to_end(user_id)
+        while len(_sets) > FAVORITES_CACHE_USERS:
+            _sets.popitem(last=False)
+        return ids
+
+
+def favorite_ids(user_id: int) -> Set[str]:
+    ids = _cached(user_id)
+    record_cache('favorites', ids is not None)
+    if ids is None:
+        ids = _store(user_id, _load(user_id))
+    return ids
+
+
+def is_favorite(user_id: int, video_id: str) -> bool:
+    return video_id in favorite_ids(user_id)
+
+
+def _set_member(user_id: int, video_id: str, member: bool) -> None:
+    with _lock:
+        ids = _sets.get(user_id)
+        if ids is None:
+            return
+        if member:
+            ids.add(video_id)
+        else:
+            ids.discard(video_id)
+
+
+def add_favorite(user_id: int, video_id: str) -> None:
+    stmt = (
+        pg_insert(Favorite)
+        .from_select(
+            ['user_id', 'track_id'],
+            select(literal(user_id, BigInteger), Track.id).where(Track.video_id == video_id),
+        )
+        .on_conflict_do_nothing(constraint='uq_favorites_user_track')
+        .returning(Favorite.id)
+    )
+    try:
+        with get_session() as session:
+            inserted = session.execute(stmt).first()
+            # nothing inserted: either already a favorite or the track is unknown
+            if inserted is None and not session.execute(select(exists().where(Track.video_id == video_id))).scalar():
+                raise UnknownTrackError(video_id)
+    except IntegrityError as e:
+        raise UnknownTrackError(video_id) from e
+    _set_member(user_id, video_id, True)
+
+
+def remove_favorite(user_id: int, video_id: str) -> None:
+    track_id = select(Track.id).where(Track.video_id == video_id).scalar_subquery()
+    with get_session() as session:
+        session.execute(delete(Favorite).where(Favorite.user_id == user_id, Favorite.track_id == track_id))
+    _set_member(user_id, video_id, False)
+
+
+def toggle_favorite(user_id: int, video_id: str) -> bool:
+    """Flip membership; returns the new state. Raises UnknownTrackError when adding an unknown track."""
+    if is_favorite(user_id, video_id):
+        remove_favorite(user_id, video_id)
+        return False
+    add_favorite(user_id, video_id)
+    return True
+
+
+async def favorite_markup(chat_id: int, video_id: str):
+    """Keyboard for a sent audio. Private chats show the recipient's state; groups start empty."""
+    favorite = False
+    if chat_id > 0:
+        try:
+            ids = _cached(chat_id)
+            if ids is None:
+                ids = await asyncio.to_thread(favorite_ids, chat_id)
+            else:
+                record_cache('favorites', True)
+            favorite = video_id in ids
+        except Exception:
+            logging.exception("Failed to load favorites for %s", chat_id)
+    return favorite_keyboard(video_id, favorite)
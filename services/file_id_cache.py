@@ -0,0 +1,34 @@
+from __future__ import annotations
+import os
+from collections import OrderedDict
+from typing import Optional
+from threading import RLock
+
+# video_id -> Telegram file_id of an already uploaded audio (bounded LRU)
+FILE_ID_CACHE_SIZE = int(os.getenv('FILE_ID_CACHE_SIZE', '20000'))
+
+_file_ids: "OrderedDict[str, str]" = OrderedDict()
+_lock = RLock()
+
+
+def get_file_id(video_id: str | None) -> Optional[str]:
+    if not video_id:
+        return None
+    with _lock:
+        file_id = _file_ids.get(video_id)
+        if file_id is not None:
+            _file_ids.move_to_end(video_id)
+        return file_id
+
+
+def remember_file_id(video_id: str, file_id: str) -> None:
+    with _lock:
+        _file_ids[video_id] = file_id
+        _file_ids.move_to_end(video_id)
+        while len(_file_ids) > FILE_ID_CACHE_SIZE:
+            _file_ids.popitem(last=False)
+
+
+def forget_file_id(video_id: str) -> None:
+    with _lock:
+        _file_ids.pop(video_id, None)
@@ -4,15 +4,27 @@ import os
 import threading
 import logging
 import asyncio
+from types import SimpleNamespace
 from typing import Optional, Dict, Any, Callable
 
-from flask import Flask, request, jsonify
-from telegram import InputFile
+from flask import Flask, Response, request, jsonify, g
 from telegram.ext import Application
 
 from services.youtube import get_youtube_service, TrackMeta
-from services.media import ensure_thumbnail
-from services.repository import record_download, get_user_by_link_code, mark_user_linked_by_code, logout_user_by_id
+from services.delivery import send_audio_file, is_deliverable
+from services.resolver import resolve_query
+from services.jobs import run_download
+from services.progress import ProgressMessage
+from services.throttle import check_user, check_link_code
+from services import metrics, tracing
+from db.db_session import set_pool, reset_pool, pool_stats
+from services.repository import (
+    record_download, get_user_by_link_code, mark_user_linked_by_code, logout_user_by_id,
+    list_history, list_favorites, get_track_meta,
+)
+from services.favorites import add_favorite, remove_favorite, UnknownTrackError
+from services.stats import top_tracks
+from services.recomender import recommend_tracks
 from services.link_state import get_link_message, clear_link_message
 from utils.keyboard import account_inline_keyboard
 from config import WEBAPP_URL
@@ -57,13 +69,80 @@ class FlaskService:
             return True
         return req.headers.get('X-Api-Key') == self.api_key
 
+    def _throttled(self, retry_after: float):
+        resp = jsonify({"error": "too many requests", "retry_after": int(retry_after) + 1})
+        resp.headers['Retry-After'] = str(int(retry_after) + 1)
+        return resp, 429
+
+    def _page_args(self, req):
+        """Common parsing for paginated read endpoints: (user, limit, cursor) or an error response."""
+        try:
+            code = int(req.args.get('code', ''))
+        except ValueError:
+            return None, (jsonify({"error": "code required"}), 400)
+        try:
+            limit = int(req.args.get('limit', '20'))
+        except ValueError:
+            return None, (jsonify({"error": "invalid limit"}), 400)
+        user = get_user_by_link_code(code)
+        if not user or not user.website_linked:
+            return None, (jsonify({"error": "code not linked"}), 404)
+        return (user, limit, req.args.get('cursor') or None), None
+
+    def _favorite_args(self, req):
+        """(user, video_id) of a favorites write from the JSON body, or an error response."""
+        data: Dict[str, Any] = req.get_json(silent=True) or {}
+        video_id = (data.get('video_id') or '').strip()
+        try:
+            code = int(data.get('code'))
+        except (TypeError, ValueError):
+            code = None
+        if not code or not video_id:
+            return None, None, (jsonify({"error": "code and video_id are required"}), 400)
+        user = get_user_by_link_code(code)
+        if not user or not user.website_linked:
+            return None, None, (jsonify({"error": "code not linked"}), 404)
+        return user, video_id, None
+
+    def _change_favorite(self, req, change):
+        if not self._check_auth(req):
+            return jsonify({"error": "unauthorized"}), 401
+        user, video_id, error = self._favorite_args(req)
+        if error:
+            return error
+        try:
+            change(user.id, video_id)
+        except UnknownTrackError:
+            return jsonify({"error": "track not found"}), 404
+        except Exception:
+            logging.exception("FlaskService: favorites update failed")
+            return jsonify({"error": "internal error"}), 500
+        return jsonify({"status": "ok", "video_id": video_id, "favorite": change is add_favorite})
+
+    @staticmethod
+    def _page_response(rows, next_cursor):
+        items = []
+        for row in rows:
+            item = dict(row)
+            for key, value in item.items():
+                if hasattr(value, 'isoformat'):
+                    item[key] = value.isoformat()
+            items.append(item)
+        return jsonify({"items": items, "next_cursor": next_cursor})
+
     def _schedule(self, coro_factory: Callable[..., asyncio.coroutines.Coroutine], *args, **kwargs) -> bool:
         if not self._application:
             return False
         loop = self._loop
         if loop and loop.is_running():
-            fut = asyncio.run_coroutine_threadsafe(coro_factory(*args, **kwargs), loop)
+            # The PTB loop does not inherit this thread's context: hand the trace over explicitly
+            trace = tracing.current_trace()
+            if trace is not None:
+                trace.acquire()
+            fut = asyncio.run_coroutine_threadsafe(tracing.bind(trace, coro_factory(*args, **kwargs)), loop)
+            metrics.QUEUE_DEPTH.inc(queue='bridge_tasks')
             def _cb(f):
+                metrics.QUEUE_DEPTH.dec(queue='bridge_tasks')
                 try:
                     f.result()
                 except Exception:
@@ -73,10 +152,45 @@ class FlaskService:
         return False
 
     def _setup_routes(self):
+        @self.app.before_request
+        def _start_trace():
+            if request.path.startswith('/api/'):
+                g.trace = tracing.start_trace(
+                    f"http {request.method} {request.path}",
+                    request_id=request.headers.get('X-Request-Id'),
+                )
+            g.db_pool_token = set_pool('bridge')
+
+        @self.app.after_request
+        def _trace_header(response):
+            trace = g.get('trace')
+            if trace is not None:
+                response.headers['X-Request-Id'] = trace.id
+            return response
+
+        @self.app.teardown_request
+        def _release_trace(_exc):
+            trace = g.pop('trace', None)
+            if trace is not None:
+                trace.release()
+            token = g.pop('db_pool_token', None)
+            if token is not None:
+                reset_pool(token)
+
         @self.app.get('/healthz')
         def healthz():
             return jsonify({"status": "ok"})
 
+        @self.app.get('/metrics')
+        def metrics_endpoint():
+            return Response(metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+        @self.app.get('/api/diagnostics/db')
+        def db_diagnostics():
+            if not self._check_auth(request):
+                return jsonify({"error": "unauthorized"}), 401
+            return jsonify({"pools": pool_stats()})
+
         @self.app.post('/api/link_by_code')
         def link_by_code():
             # if not self._check_auth(request):
@@ -89,19 +203,17 @@ class FlaskService:
                 code = None
             if not code:
                 return jsonify({"error": "code required"}), 400
-            ok = False
             try:
-                ok = mark_user_linked_by_code(code)
+                user_id = mark_user_linked_by_code(code)
             except Exception:
                 logging.exception("FlaskService: link_by_code failed")
                 return jsonify({"error": "internal error"}), 500
-            if not ok:
+            if user_id is None:
                 return jsonify({"error": "invalid code"}), 404
-            user = get_user_by_link_code(code)
             # Schedule message update in bot loop
-            if user and self._application:
-                self._schedule(self._link_success_task, user.id)
-            return jsonify({"status": "linked", "user_id": user.id if user else None})
+            if self._application:
+                self._schedule(self._link_success_task, user_id)
+            return jsonify({"status": "linked", "user_id": user_id})
 
         @self.app.post('/api/send_song_by_code')
         def send_song_by_code():
@@ -119,8 +231,14 @@ class FlaskService:
             user = get_user_by_link_code(code)
             if not user or not user.website_linked:
                 return jsonify({"error": "code not linked"}), 404
+            retry_after = check_link_code(code)
+            if retry_after:
+                return self._throttled(retry_after)
             if not self._application:
                 return jsonify({"error": "bot not ready"}), 503
+            retry_after = check_user(user.id)
+            if retry_after:
+                return self._throttled(retry_after)
             ok = self._schedule(self._send_song_task, user.id, query)
             if not ok:
                 return jsonify({"error": "bot loop not running"}), 503
@@ -134,17 +252,100 @@ class FlaskService:
             data: Dict[str, Any] = request.get_json(silent=True) or {}
             chat_id = data.get('chat_id')
             query = (data.get('query') or '').strip()
+            try:
+                # one throttle bucket per chat whether the id arrives as "123" or 123
+                chat_id = int(chat_id)
+            except (TypeError, ValueError):
+                chat_id = None
 
             if not chat_id or not query:
                 return jsonify({"error": "chat_id and query are required"}), 400
             if not self._application:
                 return jsonify({"error": "bot not ready"}), 503
+            retry_after = check_user(chat_id)
+            if retry_after:
+                return self._throttled(retry_after)
 
             ok = self._schedule(self._send_song_task, chat_id, query)
             if not ok:
                 return jsonify({"error": "bot loop not running"}), 503
             return jsonify({"status": "scheduled", "chat_id": chat_id, "query": query})
 
+        @self.app.get('/api/history')
+        def history():
+            if not self._check_auth(request):
+                return jsonify({"error": "unauthorized"}), 401
+            args, error = self._page_args(request)
+            if error:
+                return error
+            user, limit, cursor = args
+            try:
+                rows, next_cursor = list_history(user.id, limit=limit, cursor=cursor)
+            except ValueError:
+                return jsonify({"error": "invalid cursor"}), 400
+            return self._page_response(rows, next_cursor)
+
+        @self.app.get('/api/favorites')
+        def favorites():
+            if not self._check_auth(request):
+                return jsonify({"error": "unauthorized"}), 401
+            args, error = self._page_args(request)
+            if error:
+                return error
+            user, limit, cursor = args
+            try:
+                rows, next_cursor = list_favorites(user.id, limit=limit, cursor=cursor)
+            except ValueError:
+                return jsonify({"error": "invalid cursor"}), 400
+            return self._page_response(rows, next_cursor)
+
+        @self.app.post('/api/favorites')
+        def favorite_add():
+            return self._change_favorite(request, add_favorite)
+
+        @self.app.delete('/api/favorites')
+        def favorite_remove():
+            return self._change_favorite(request, remove_favorite)
+
+        @self.app.post('/api/favorites/send')
+        def favorite_send():
+            if not self._check_auth(request):
+                return jsonify({"error": "unauthorized"}), 401
+            user, video_id, error = self._favorite_args(request)
+            if error:
+                return error
+            retry_after = check_user(user.id)
+            if retry_after:
+                return self._throttled(retry_after)
+            if not self._schedule(self._send_favorite_task, user.id, video_id):
+                return jsonify({"error": "bot loop not running"}), 503
+            return jsonify({"status": "scheduled", "user_id": user.id, "video_id": video_id})
+
+        @self.app.get('/api/recommend')
+        def recommend():
+            if not self._check_auth(request):
+                return jsonify({"error": "unauthorized"}), 401
+            args, error = self._page_args(request)
+            if error:
+                return error
+            user, limit, _cursor = args
+            limit = max(1, min(limit, 50))
+            return self._page_response(recommend_tracks(user.id, k=limit), None)
+
+        @self.app.get('/api/top')
+        def top():
+            if not self._check_auth(request):
+                return jsonify({"error": "unauthorized"}), 401
+            try:
+                limit = max(1, min(int(request.args.get('limit', '10')), 100))
+                days = request.args.get('days')
+                days = int(days) if days else None
+            except ValueError:
+                return jsonify({"error": "invalid limit or days"}), 400
+            if days is not None and days < 1:
+                return jsonify({"error": "invalid limit or days"}), 400
+            return self._page_response(top_tracks(limit=limit, days=days), None)
+
         @self.app.post('/api/logout')
         def logout():
             if not self._check_auth(request):
@@ -190,70 +391,48 @@ class FlaskService:
     async def _send_song_task(self, chat_id: int, query: str):
         msg = await self._application.bot.send_message(chat_id=chat_id, text="Download from website started. Please wait…")
 
-        svc = get_youtube_service()
         try:
-            results = await svc.search(query, limit=1)
+            track_meta: TrackMeta | None = await resolve_query(query)
         except Exception:
             logging.exception("FlaskService: search failed for %s", query)
             return
-        if not results:
+        if not track_meta:
             logging.info("FlaskService: no results for %s", query)
             return
-        track_meta: TrackMeta = results[0]
+        await self._deliver(chat_id, track_meta, msg)
+
+    async def _send_favorite_task(self, chat_id: int, video_id: str):
+        track_meta = get_track_meta(video_id)
+        if not track_meta:
+            logging.info("FlaskService: favorite %s is not a known track", video_id)
+            return
+        msg = await self._application.bot.send_message(chat_id=chat_id, text=f"Sending from website: {track_meta.title} …")
+        await self._deliver(chat_id, track_meta, msg)
 
+    async def _deliver(self, chat_id: int, track_meta: TrackMeta, msg):
+        """Send a resolved track: straight from the file_id/disk cache when possible, else as a download job."""
+        svc = get_youtube_service()
+        tg_user = SimpleNamespace(id=chat_id, username=None, first_name=None, last_name=None)
         file_path = svc.find_cached_file(track_meta.id)
-        if not file_path:
+        if is_deliverable(track_meta, file_path):
+            try:
+                await send_audio_file(self._application.bot, chat_id, track_meta, file_path)
+            except Exception:
+                logging.exception("FlaskService: failed to send audio to chat %s", chat_id)
+                return
+            try:
+                record_download(tg_user, track_meta)
+            except Exception:
+                logging.exception("FlaskService: record_download failed")
+        else:
+            # persisted as a download job so a restart resumes it
+            progress = ProgressMessage(self._application.bot, msg.chat_id, msg.message_id)
             try:
-                file_path, track_meta = await svc.download_audio(track_meta.url)
+                await run_download(self._application.bot, 'audio', track_meta, tg_user, progress)
             except Exception:
                 logging.exception("FlaskService: download failed for %s", track_meta.url)
                 return
 
-        thumb_path = None
-        try:
-            thumb_res = await ensure_thumbnail(track_meta.thumbnail, track_meta.id)
-            if thumb_res:
-                thumb_path = thumb_res.path
-        except Exception:
-            logging.exception("FlaskService: ensure_thumbnail failed for %s", track_meta.id)
-
-        try:
-            with open(file_path, 'rb') as fh:
-                if thumb_path and os.path.isfile(thumb_path):
-                    with open(thumb_path, 'rb') as th:
-                        await self._application.bot.send_audio(
-                            chat_id=chat_id,
-                            audio=InputFile(fh, filename=os.path.basename(file_path)),
-                            title=track_meta.title,
-                            performer=track_meta.uploader or "Unknown",
-                            duration=track_meta.duration or 0,
-                            caption="@i_am_web_music_bot",
-                            thumbnail=InputFile(th),
-                        )
-                else:
-                    await self._application.bot.send_audio(
-                        chat_id=chat_id,
-                        audio=InputFile(fh, filename=os.path.basename(file_path)),
-                        title=track_meta.title,
-                        performer=track_meta.uploader or "Unknown",
-                        duration=track_meta.duration or 0,
-                        caption="@i_am_web_music_bot",
-                    )
-        except Exception:
-            logging.exception("FlaskService: failed to send audio to chat %s", chat_id)
-            return
-
-        try:
-            class _FakeTgUser:
-                def __init__(self, id_: int):
-                    self.id = id_
-                    self.username = None
-                    self.first_name = None
-                    self.last_name = None
-            record_download(_FakeTgUser(chat_id), track_meta)
-        except Exception:
-            logging.exception("FlaskService: record_download failed")
-
         try:
             await msg.edit_text("Downloaded from website")
         except Exception:
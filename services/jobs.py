@@ -0,0 +1,353 @@
+"""Durable download jobs.
+
+Every user-facing download is a row in download_jobs (queued -> running ->
+done | failed). A restart leaves rows in queued/running; on startup they are
+retried (up to JOB_MAX_ATTEMPTS) and their progress messages are updated, and
+partial files left by the killed downloads are removed from the staging dir.
+
+With DOWNLOAD_WORKERS=external the downloads themselves run in separate
+processes (services/worker.py); the bot only queues jobs, waits for the
+workers' NOTIFY and sends the finished file from the shared cache.
+"""
+from __future__ import annotations
+
+import os
+import glob
+import time
+import select as select_io
+import asyncio
+import logging
+import threading
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select, update
+
+from db.db_session import get_session, engine
+from db.models import DownloadJob
+from services.youtube import TrackMeta, get_youtube_service, MediaTooLargeError
+from services.storage import DOWNLOAD_DIR, clean_staging
+from services.worker import JOB_CHANNEL, JOB_MAX_ATTEMPTS
+from services.delivery import send_audio_file, send_video_file, is_deliverable
+from services.repository import record_download, get_track_meta
+from services.progress import ProgressMessage
+
+# inline: download in this process; external: queue for `python -m services.worker`
+DOWNLOAD_WORKERS = os.getenv('DOWNLOAD_WORKERS', 'inline')
+EXTERNAL_WORKERS = DOWNLOAD_WORKERS == 'external'
+# fallback re-check when a NOTIFY is missed (e.g. listener reconnecting)
+JOB_POLL_SECONDS = 5
+# a queued job no worker claims within this long is failed instead of waited on forever
+JOB_CLAIM_TIMEOUT_SECONDS = int(os.getenv('JOB_CLAIM_TIMEOUT_SECONDS', '600'))
+# yt-dlp/FFmpeg leftovers: fragments, resume state, pre-merge/pre-transcode sources
+PARTIAL_PATTERNS = ('*.part', '*.part-Frag*', '*.ytdl', '*.temp.*', '*.src.*')
+
+
+class JobNotClaimedError(RuntimeError):
+    pass
+
+
+def create_job(kind: str, track_meta: TrackMeta, user_id: int, chat_id: int, message_id: int | None) -> int:
+    with get_session() as session:
+        job = DownloadJob(kind=kind, video_id=track_meta.id, url=track_meta.url, title=track_meta.title,
+                          user_id=user_id, chat_id=chat_id, message_id=message_id, status='queued', attempts=0)
+        session.add(job)
+        session.flush()
+        return job.id
+
+
+def mark_running(job_id: int) -> None:
+    with get_session() as session:
+        session.execute(update(DownloadJob).where(DownloadJob.id == job_id)
+                        .values(status='running', attempts=DownloadJob.attempts + 1))
+
+
+def mark_done(job_id: int) -> None:
+    with get_session() as session:
+        session.execute(update(DownloadJob).where(DownloadJob.id == job_id).values(status='done', error=None))
+
+
+def mark_failed(job_id: int, error: str) -> None:
+    with get_session() as session:
+        session.execute(update(DownloadJob).where(DownloadJob.id == job_id).values(status='failed', error=error[:2000]))
+
+
+def fail_unclaimed(job_id: int, error: str) -> bool:
+    """Fail a job that is still queued; False when a worker claimed it in the meantime."""
+    with get_session() as session:
+        return session.execute(
+            update(DownloadJob).where(DownloadJob.id == job_id, DownloadJob.status == 'queued')
+            .values(status='failed', error=error)
+        ).rowcount == 1
+
+
+def recover_interrupted_jobs() -> Tuple[List[dict], List[dict]]:
+    """Jobs left undelivered by a previous process: (to resume, given up).
+
+    With external workers the rows are left as they are: workers own queued/running
+    jobs (and their retries); the bot only resumes waiting for them.
+    """
+    resume, given_up = [], []
+    statuses = ('queued', 'running', 'ready') if EXTERNAL_WORKERS else ('queued', 'running')
+    with get_session() as session:
+        jobs = session.execute(
+            select(DownloadJob).where(DownloadJob.status.in_(statuses)).order_by(DownloadJob.id)
+        ).scalars().all()
+        for job in jobs:
+            row = {c: getattr(job, c) for c in ('id', 'kind', 'video_id', 'url', 'title', 'user_id', 'chat_id', 'message_id')}
+            if EXTERNAL_WORKERS:
+                resume.append(row)
+            elif job.attempts >= JOB_MAX_ATTEMPTS:
+                job.status = 'failed'
+                job.error = 'interrupted too many times'
+                given_up.append(row)
+            else:
+                job.status = 'queued'
+                resume.append(row)
+    return resume, given_up
+
+
+def cleanup_partial_files() -> int:
+    """Empty the staging dir (and clear leftovers of the pre-staging flat layout)."""
+    if EXTERNAL_WORKERS:
+        return 0  # workers clean their own stale files
+    removed = clean_staging()
+    for pattern in PARTIAL_PATTERNS:
+        for path in glob.glob(os.path.join(DOWNLOAD_DIR, pattern)):
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                logging.warning("Could not remove partial file %s", path)
+    return removed
+
+
+def _job_state(job_id: int) -> Optional[dict]:
+    with get_session() as session:
+        row = session.execute(
+            select(DownloadJob.status, DownloadJob.progress, DownloadJob.error, DownloadJob.result_meta)
+            .where(DownloadJob.id == job_id)
+        ).first()
+        return dict(row._mapping) if row else None
+
+
+class JobListener:
+    """LISTENs on JOB_CHANNEL in a thread and wakes the coroutines waiting for those jobs."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._events: Dict[int, Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = {}
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="job-listener", daemon=True)
+                self._thread.start()
+
+    def register(self, job_id: int) -> asyncio.Event:
+        event = asyncio.Event()
+        with self._lock:
+            self._events[job_id] = (asyncio.get_running_loop(), event)
+        return event
+
+    def unregister(self, job_id: int) -> None:
+        with self._lock:
+            self._events.pop(job_id, None)
+
+    def _dispatch(self, payload: str) -> None:
+        try:
+            job_id = int(payload)
+        except ValueError:
+            return
+        with self._lock:
+            entry = self._events.get(job_id)
+        if entry:
+            loop, event = entry
+            loop.call_soon_threadsafe(event.set)
+
+    def _run(self) -> None:
+        while True:
+            raw = None
+            try:
+                raw = engine.raw_connection()
+                raw.detach()  # a dedicated connection for the process lifetime, not a pool slot
+                conn = raw.driver_connection
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {JOB_CHANNEL}")
+                while True:
+                    if select_io.select([conn], [], [], 30) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self._dispatch(conn.notifies.pop(0).payload)
+            except Exception:
+                logging.exception("Job listener connection lost; reconnecting")
+                if raw is not None:
+                    try:
+                        raw.close()
+                    except Exception:
+                        pass
+                time.sleep(5)
+
+
+_listener: JobListener | None = None
+
+
+def get_job_listener() -> JobListener:
+    global _listener
+    if _listener is None:
+        _listener = JobListener()
+        _listener.start()
+    return _listener
+
+
+async def wait_for_job(job_id: int, progress: ProgressMessage) -> dict:
+    """Wait until an external worker finishes a job; mirrors its progress into the status message."""
+    listener = get_job_listener()
+    event = listener.register(job_id)
+    claim_deadline = time.monotonic() + JOB_CLAIM_TIMEOUT_SECONDS
+    try:
+        while True:
+            event.clear()
+            state = await asyncio.to_thread(_job_state, job_id)
+            if state is None:
+                raise LookupError(f"download job {job_id} disappeared")
+            if state['status'] in ('ready', 'done'):
+                return state
+            if state['status'] == 'failed':
+                error = state['error'] or 'failed'
+                if error.startswith('MediaTooLargeError'):
+                    raise MediaTooLargeError(error)
+                raise RuntimeError(f"download job {job_id}: {error}")
+            if state['status'] == 'queued' and time.monotonic() > claim_deadline:
+                if await asyncio.to_thread(fail_unclaimed, job_id, 'not claimed by a worker'):
+                    await progress.update("No download worker is available right now. Try again later.")
+                    raise JobNotClaimedError(f"download job {job_id} was not claimed")
+            if state['status'] == 'running' and state['progress']:
+                await progress.update(f"Downloading: {state['progress']}%")
+            try:
+                await asyncio.wait_for(event.wait(), timeout=JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        listener.unregister(job_id)
+
+
+async def _store(fn, *args):
+    """Job bookkeeping must never break the download itself."""
+    try:
+        return await asyncio.to_thread(fn, *args)
+    except Exception:
+        logging.exception("Job store update failed (%s)", fn.__name__)
+        return None
+
+
+async def _run_external(bot, kind: str, track_meta: TrackMeta, tg_user, progress: ProgressMessage,
+                        job_id: int | None) -> TrackMeta:
+    if job_id is None:
+        job_id = await asyncio.to_thread(create_job, kind, track_meta, tg_user.id, progress.chat_id, progress.message_id)
+    state = await wait_for_job(job_id, progress)
+    final_meta = TrackMeta(**state['result_meta']) if state['result_meta'] else track_meta
+    try:
+        file_path = get_youtube_service().find_cached_file(final_meta.id, ext='mp4' if kind == 'video' else 'mp3')
+        send = send_video_file if kind == 'video' else send_audio_file
+        await send(bot, progress.chat_id, final_meta, file_path)
+    except Exception as e:
+        await _store(mark_failed, job_id, repr(e))
+        raise
+    await _store(mark_done, job_id)
+    return final_meta
+
+
+async def run_download(bot, kind: str, track_meta: TrackMeta, tg_user, progress: ProgressMessage,
+                       job_id: int | None = None) -> TrackMeta:
+    """Download, send and record one track as a persisted job. Raises on failure (job marked failed)."""
+    if EXTERNAL_WORKERS:
+        final_meta = await _run_external(bot, kind, track_meta, tg_user, progress, job_id)
+        try:
+            record_download(tg_user, final_meta)
+        except Exception:
+            logging.exception("DB error while saving history")
+        return final_meta
+    if job_id is None:
+        job_id = await _store(create_job, kind, track_meta, tg_user.id, progress.chat_id, progress.message_id)
+    if job_id is not None:
+        await _store(mark_running, job_id)
+    svc = get_youtube_service()
+    try:
+        if kind == 'video':
+            file_path, final_meta = await svc.download_video(track_meta.url, progress=progress.hook)
+            await send_video_file(bot, progress.chat_id, final_meta, file_path)
+        else:
+            file_path, final_meta = await svc.download_audio(track_meta.url, progress=progress.hook)
+            await send_audio_file(bot, progress.chat_id, final_meta, file_path)
+    except Exception as e:
+        if job_id is not None:
+            await _store(mark_failed, job_id, repr(e))
+        raise
+    if job_id is not None:
+        await _store(mark_done, job_id)
+    try:
+        record_download(tg_user, final_meta)
+    except Exception:
+        logging.exception("DB error while saving history")
+    return final_meta
+
+
+async def _resume(bot, job: dict) -> None:
+    title = job['title'] or job['video_id']
+    if job['message_id']:
+        progress = ProgressMessage(bot, job['chat_id'], job['message_id'], label=job['kind'])
+        await progress.update(f"Bot restarted — resuming: {title} …")
+    else:
+        progress = await ProgressMessage.send(bot, job['chat_id'], f"Resuming: {title} …", label=job['kind'])
+    tg_user = SimpleNamespace(id=job['user_id'])
+    try:
+        # no tracks row until the first delivery: fall back to what the job row knows
+        track_meta = get_track_meta(job['video_id']) or TrackMeta(
+            id=job['video_id'], title=title, url=job['url'], duration=None, uploader=None, thumbnail=None,
+        )
+        ext = 'mp4' if job['kind'] == 'video' else 'mp3'
+        # with external workers the job row carries the result; always go through it
+        cached = None if EXTERNAL_WORKERS else get_youtube_service().find_cached_file(track_meta.id, ext=ext)
+        if cached is not None and is_deliverable(track_meta, cached, kind=job['kind']):
+            send = send_video_file if job['kind'] == 'video' else send_audio_file
+            await send(bot, job['chat_id'], track_meta, cached)
+            await _store(mark_done, job['id'])
+            try:
+                record_download(tg_user, track_meta)
+            except Exception:
+                logging.exception("DB error while saving history")
+        else:
+            await run_download(bot, job['kind'], track_meta, tg_user, progress, job_id=job['id'])
+    except JobNotClaimedError:
+        logging.warning("Resumed job %s was not claimed by a worker", job['id'])
+        return
+    except Exception as e:
+        logging.exception("Resumed job %s failed", job['id'])
+        # run_download marks its own failures; anything raised before it must not leave the row pending
+        await _store(mark_failed, job['id'], repr(e))
+        await progress.update(f"Download failed: {title}")
+        return
+    await progress.delete()
+
+
+async def resume_jobs(app) -> None:
+    """Startup hook: clean partial files, then retry or close out interrupted jobs."""
+    try:
+        removed = await asyncio.to_thread(cleanup_partial_files)
+        resume, given_up = await asyncio.to_thread(recover_interrupted_jobs)
+    except Exception:
+        logging.exception("Job recovery failed")
+        return
+    if removed or resume or given_up:
+        logging.info("Job recovery: %d partial files removed, %d jobs resumed, %d given up",
+                     removed, len(resume), len(given_up))
+    for job in given_up:
+        if job['message_id']:
+            progress = ProgressMessage(app.bot, job['chat_id'], job['message_id'])
+            await progress.update(f"⚠️ Download of {job['title'] or job['video_id']} was interrupted. Please try again.")
+    for job in resume:
+        app.create_task(_resume(app.bot, job))
@@ -1,24 +1,35 @@
 
 from __future__ import annotations
+import time
 from typing import Dict, Tuple, Optional
 from threading import RLock
 
-# user_id -> (chat_id, message_id)
-_link_messages: Dict[int, Tuple[int, int]] = {}
+# user_id -> (chat_id, message_id, registered at (monotonic))
+_link_messages: Dict[int, Tuple[int, int, float]] = {}
 _lock = RLock()
 
 
 def register_link_message(user_id: int, chat_id: int, message_id: int) -> None:
     with _lock:
-        _link_messages[user_id] = (chat_id, message_id)
+        _link_messages[user_id] = (chat_id, message_id, time.monotonic())
 
 
 def get_link_message(user_id: int) -> Optional[Tuple[int, int]]:
     with _lock:
-        return _link_messages.get(user_id)
+        ref = _link_messages.get(user_id)
+        return ref[:2] if ref else None
 
 
 def clear_link_message(user_id: int) -> None:
     with _lock:
         _link_messages.pop(user_id, None)
 
+
+def expire_link_messages(max_age: float) -> int:
+    """Forget link prompts older than max_age seconds (never completed). Returns entries removed."""
+    cutoff = time.monotonic() - max_age
+    with _lock:
+        stale = [user_id for user_id, ref in _link_messages.items() if ref[2] < cutoff]
+        for user_id in stale:
+            del _link_messages[user_id]
+    return len(stale)
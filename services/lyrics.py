@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import os
+import re
+import asyncio
+import logging
+from urllib.parse import quote
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from db.db_session import get_session
+from db.models import Lyrics
+from services.youtube import TrackMeta
+from services.repository import track_video_id
+from services.metrics import timed, record_cache
+from services.tracing import span
+from utils.track_text import normalize_query
+
+# Providers are queried concurrently; the first non-empty answer wins.
+LYRICS_PROVIDERS = os.getenv('LYRICS_PROVIDERS', 'lrclib,lyricsovh')
+LYRICS_TIMEOUT = float(os.getenv('LYRICS_TIMEOUT', '6'))
+# "not found" results are retried after this long
+LYRICS_MISS_TTL = timedelta(days=int(os.getenv('LYRICS_MISS_TTL_DAYS', '7')))
+
+
+@dataclass
+class LyricsResult:
+    text: str
+    provider: str
+    from_cache: bool
+
+
+def normalize_lyrics(text: str) -> str:
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    lines = [line.rstrip() for line in text.split('\n')]
+    text = '\n'.join(lines).strip()
+    return re.sub(r'\n{3,}', '\n\n', text)
+
+
+class LyricsProvider:
+    name = 'base'
+
+    async def fetch(self, client: httpx.AsyncClient, artist: str, title: str, duration: int | None) -> Optional[str]:
+        raise NotImplementedError
+
+
+class LrclibProvider(LyricsProvider):
+    name = 'lrclib'
+    url = 'https://lrclib.net/api/get'
+
+    async def fetch(self, client, artist, title, duration):
+        params = {'artist_name': artist, 'track_name': title}
+        if duration:
+            params['duration'] = duration
+        r = await client.get(self.url, params=params)
+        if r.status_code != 200:
+            return None
+        return r.json().get('plainLyrics')
+
+
+class LyricsOvhProvider(LyricsProvider):
+    name = 'lyricsovh'
+    url = 'https://api.lyrics.ovh/v1/{artist}/{title}'
+
+    async def fetch(self, client, artist, title, duration):
+        if not artist:
+            return None
+        r = await client.get(self.url.format(artist=quote(artist, safe=''), title=quote(title, safe='')))
+        if r.status_code != 200:
+            return None
+        return r.json().get('lyrics')
+
+
+class StubProvider(LyricsProvider):
+    """Local provider for tests and benchmarks: answers from a dict after an optional delay."""
+
+    def __init__(self, lyrics: Dict[Tuple[str, str], str], *, name: str = 'stub', delay: float = 0.0):
+        self.name = name
+        self.delay = delay
+        self.lyrics = {(a.lower(), t.lower()): text for (a, t), text in lyrics.items()}
+
+    async def fetch(self, client, artist, title, duration):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return self.lyrics.get(((artist or '').lower(), title.lower()))
+
+
+PROVIDER_REGISTRY = {
+    LrclibProvider.name: LrclibProvider,
+    LyricsOvhProvider.name: LyricsOvhProvider,
+}
+
+_providers: List[LyricsProvider] | None = None
+_client: httpx.AsyncClient | None = None
+
+
+def get_providers() -> List[LyricsProvider]:
+    global _providers
+    if _providers is None:
+        names = [n.strip() for n in LYRICS_PROVIDERS.split(',') if n.strip()]
+        _providers = [PROVIDER_REGISTRY[n]() for n in names if n in PROVIDER_REGISTRY]
+    return _providers
+
+
+def set_providers(providers: List[LyricsProvider]) -> None:
+    global _providers
+    _providers = list(providers)
+
+
+def _get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(timeout=LYRICS_TIMEOUT, follow_redirects=True,
+                                    headers={'User-Agent': 'i-am-web-music-bot'})
+    return _client
+
+
+async def _query_providers(artist: str, title: str, duration: int | None) -> Optional[Tuple[str, str]]:
+    providers = get_providers()
+    if not providers:
+        return None
+    client = _get_client()
+    tasks = {asyncio.create_task(p.fetch(client, artist, title, duration)): p for p in providers}
+    pending = set(tasks)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + LYRICS_TIMEOUT
+    try:
+        while pending:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                provider = tasks[task]
+                try:
+                    text = task.result()
+                except Exception as e:
+                    logging.warning("Lyrics provider %s failed: %s", provider.name, e)
+                    continue
+                if text and text.strip():
+                    return normalize_lyrics(text), provider.name
+        return None
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def _load_cached(video_id: str) -> Optional[Lyrics]:
+    with get_session() as session:
+        return session.get(Lyrics, video_id)
+
+
+def _store(video_id: str, text: Optional[str], provider: Optional[str]) -> None:
+    stmt = pg_insert(Lyrics).values(video_id=video_id, text=text, provider=provider, fetched_at=datetime.now(timezone.utc))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Lyrics.video_id],
+        set_={'text': stmt.excluded.text, 'provider': stmt.excluded.provider, 'fetched_at': stmt.excluded.fetched_at},
+    )
+    with get_session() as session:
+        session.execute(stmt)
+
+
+async def get_lyrics(track_meta: TrackMeta) -> Optional[LyricsResult]:
+    """Lyrics for a track: from the lyrics table when known, otherwise from providers (then stored)."""
+    video_id = track_video_id(track_meta)
+    cached = await asyncio.to_thread(_load_cached, video_id)
+    if cached is not None:
+        fresh_miss = cached.text is None and datetime.now(timezone.utc) - cached.fetched_at < LYRICS_MISS_TTL
+        if cached.text or fresh_miss:
+            record_cache('lyrics', True)
+            return LyricsResult(cached.text, cached.provider, True) if cached.text else None
+    record_cache('lyrics', False)
+
+    artist, title = normalize_query(track_meta.title, track_meta.uploader)
+    with timed('lyrics'), span('lyrics'):
+        found = await _query_providers(artist, title, track_meta.duration)
+    text, provider = found if found else (None, None)
+    try:
+        await asyncio.to_thread(_store, video_id, text, provider)
+    except Exception:
+        logging.exception("Failed to store lyrics for %s", video_id)
+    return LyricsResult(text, provider, False) if text else None
@@ -0,0 +1,299 @@
+"""Periodic housekeeping on the PTB JobQueue.
+
+One repeating tick runs whichever tasks are due:
+
+- history: keep monthly partitions created HISTORY_PARTITIONS_AHEAD months
+  ahead and drop whole months older than HISTORY_RETENTION_DAYS (on an
+  unpartitioned table: delete expired rows in small batches); play-count
+  aggregates are kept;
+- media_cache: remove stale staging files, cached files whose id has no
+  track row (failed sends, deleted tracks), then evict least recently used
+  media/thumbnails until the cache is back under MEDIA_CACHE_MAX_GB;
+- state: expire abandoned link prompts and finished download_jobs rows.
+
+Every task runs in a worker thread with a time budget: it checks its deadline
+between batches and simply resumes on the next run, so a large backlog is
+worked off gradually without long transactions or a busy event loop.
+"""
+from __future__ import annotations
+
+import os
+import time
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import delete, select, text
+
+from db.db_session import engine, get_session
+from db import partitions
+from db.models import DownloadJob, History, Track
+from services import storage
+from services.link_state import expire_link_messages
+from services.metrics import Counter, Gauge, timed
+
+MAINTENANCE_INTERVAL_SECONDS = int(os.getenv('MAINTENANCE_INTERVAL_SECONDS', '300'))
+# Wall-clock budget of one task run; unfinished work continues on the next run
+MAINTENANCE_TASK_BUDGET = float(os.getenv('MAINTENANCE_TASK_BUDGET', '20'))
+MAINTENANCE_BATCH_SIZE = int(os.getenv('MAINTENANCE_BATCH_SIZE', '1000'))
+# Pause between batches so live queries get the database in between
+BATCH_PAUSE = 0.05
+
+HISTORY_RETENTION_DAYS = int(os.getenv('HISTORY_RETENTION_DAYS', '365'))  # 0: keep forever
+HISTORY_PARTITIONS_AHEAD = int(os.getenv('HISTORY_PARTITIONS_AHEAD', '3'))
+# Partition DDL locks the history parent; give up quickly rather than queue behind (and block) inserts
+DDL_LOCK_TIMEOUT = '2s'
+MEDIA_CACHE_MAX_GB = float(os.getenv('MEDIA_CACHE_MAX_GB', '20'))  # 0: unlimited
+# Eviction stops at this share of the quota so it does not run on every tick
+MEDIA_CACHE_LOW_WATERMARK = 0.9
+# Files touched more recently than this are never evicted (may be mid-upload)
+MEDIA_MIN_EVICT_AGE = 3600
+ORPHAN_MIN_AGE = int(os.getenv('ORPHAN_MIN_AGE_HOURS', '24')) * 3600
+STAGING_MAX_AGE = 6 * 3600
+LINK_MESSAGE_TTL = 24 * 3600
+JOB_RETENTION_DAYS = int(os.getenv('JOB_RETENTION_DAYS', '7'))
+
+CACHE_EXTS = ('mp3', 'mp4', 'jpg')
+
+MAINTENANCE_REMOVED = Counter('musicbot_maintenance_removed_total', 'Rows, files and entries removed by maintenance.',
+                              ('task', 'kind'))
+MAINTENANCE_INCOMPLETE = Counter('musicbot_maintenance_incomplete_total',
+                                 'Maintenance runs that hit their time budget.', ('task',))
+MEDIA_CACHE_BYTES = Gauge('musicbot_media_cache_bytes', 'Size of the media cache at the last scan.')
+
+
+class Deadline:
+    def __init__(self, budget: float = MAINTENANCE_TASK_BUDGET):
+        self.at = time.monotonic() + budget
+        self.hit = False
+
+    def expired(self) -> bool:
+        if time.monotonic() >= self.at:
+            self.hit = True
+        return self.hit
+
+
+@dataclass
+class MaintenanceTask:
+    name: str
+    run: Callable[[Deadline], Dict[str, int]]
+    interval: int
+
+
+# History
+
+def _oldest_history() -> Optional[Tuple[int, datetime]]:
+    with get_session() as session:
+        row = session.execute(select(History.id, History.downloaded_at).order_by(History.id).limit(1)).first()
+    return (row.id, row.downloaded_at) if row else None
+
+
+def _maintain_partitions(cutoff: Optional[datetime]) -> Optional[Dict[str, int]]:
+    """Create upcoming and drop expired monthly partitions; None when history is not partitioned."""
+    with engine.begin() as conn:
+        if not partitions.is_partitioned(conn):
+            return None
+        conn.execute(text(f"SET LOCAL lock_timeout = '{DDL_LOCK_TIMEOUT}'"))
+        created = partitions.ensure_partitions(conn, HISTORY_PARTITIONS_AHEAD)
+        dropped = partitions.drop_partitions_before(conn, cutoff) if cutoff else []
+    if created or dropped:
+        logging.info("History partitions: created %s, dropped %s", created, dropped)
+    return {'partitions_created': len(created), 'partitions_dropped': len(dropped)}
+
+
+def expire_history(deadline: Deadline) -> Dict[str, int]:
+    cutoff = None
+    if HISTORY_RETENTION_DAYS > 0:
+        cutoff = datetime.now(timezone.utc) - timedelta(days=HISTORY_RETENTION_DAYS)
+    result = _maintain_partitions(cutoff)
+    if result is not None or cutoff is None:
+        return result or {}
+    removed = 0
+    # ids grow with downloaded_at: walk the primary key from the oldest row in bounded ranges
+    while not deadline.expired():
+        oldest = _oldest_history()
+        if oldest is None or oldest[1] is None or oldest[1] >= cutoff:
+            break
+        low = oldest[0]
+        with get_session() as session:
+            removed += session.execute(
+                delete(History).where(History.id >= low, History.id < low + MAINTENANCE_BATCH_SIZE,
+                                      History.downloaded_at < cutoff)
+            ).rowcount
+        time.sleep(BATCH_PAUSE)
+    return {'history_rows': removed}
+
+
+# Media cache
+
+def _iter_cache_files() -> Iterator[os.DirEntry]:
+    skip = os.path.abspath(storage.STAGING_DIR)
+    stack = [storage.DOWNLOAD_DIR]
+    while stack:
+        path = stack.pop()
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if os.path.abspath(entry.path) != skip:
+                            stack.append(entry.path)
+                    elif entry.name.rsplit('.', 1)[-1] in CACHE_EXTS:
+                        yield entry
+        except OSError:
+            logging.warning("Could not scan %s", path)
+
+
+def _scan(deadline: Deadline) -> Optional[List[Tuple[str, str, float, int, Tuple[int, int]]]]:
+    """(path, stem, last use, size, inode) of every cached file, or None when out of time."""
+    files = []
+    for entry in _iter_cache_files():
+        if len(files) % 1000 == 0 and deadline.expired():
+            return None
+        try:
+            st = entry.stat(follow_symlinks=False)
+        except OSError:
+            continue
+        stem = entry.name.rsplit('.', 1)[0]
+        files.append((entry.path, stem, max(st.st_atime, st.st_mtime), st.st_size, (st.st_dev, st.st_ino)))
+    return files
+
+
+def _known_ids(stems: List[str]) -> set:
+    known = set()
+    for i in range(0, len(stems), MAINTENANCE_BATCH_SIZE):
+        chunk = stems[i:i + MAINTENANCE_BATCH_SIZE]
+        with get_session() as session:
+            known.update(session.execute(select(Track.video_id).where(Track.video_id.in_(chunk))).scalars())
+    return known
+
+
+def _remove(path: str) -> bool:
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+    except OSError:
+        logging.warning("Could not remove cached file %s", path)
+        return False
+
+
+def clean_media_cache(deadline: Deadline) -> Dict[str, int]:
+    result = {'staging_files': storage.clean_staging(min_age=STAGING_MAX_AGE)}
+    files = _scan(deadline)
+    if files is None:
+        return result
+    now = time.time()
+
+    old_stems = sorted({stem for _, stem, used, _, _ in files if now - used > ORPHAN_MIN_AGE})
+    known = _known_ids(old_stems)
+    orphans = 0
+    kept = []
+    for item in files:
+        path, stem, used, _, _ = item
+        if now - used > ORPHAN_MIN_AGE and stem not in known and _remove(path):
+            orphans += 1
+        else:
+            kept.append(item)
+    result['orphan_files'] = orphans
+
+    # hardlinked dedup copies share storage: count each inode once
+    sizes: Dict[Tuple[int, int], int] = {}
+    links: Dict[Tuple[int, int], int] = {}
+    for _, _, _, size, inode in kept:
+        sizes[inode] = size
+        links[inode] = links.get(inode, 0) + 1
+    total = sum(sizes.values())
+    MEDIA_CACHE_BYTES.set(total)
+    quota = int(MEDIA_CACHE_MAX_GB * 1024 ** 3)
+    evicted = 0
+    if quota and total > quota:
+        target = quota * MEDIA_CACHE_LOW_WATERMARK
+        for path, _, used, size, inode in sorted(kept, key=lambda f: f[2]):
+            if total <= target or now - used < MEDIA_MIN_EVICT_AGE or deadline.expired():
+                break
+            if not _remove(path):
+                continue
+            evicted += 1
+            links[inode] -= 1
+            if not links[inode]:
+                total -= size
+        MEDIA_CACHE_BYTES.set(total)
+    result['evicted_files'] = evicted
+    return result
+
+
+# In-memory and job state
+
+def expire_state(deadline: Deadline) -> Dict[str, int]:
+    result = {'link_messages': expire_link_messages(LINK_MESSAGE_TTL)}
+    cutoff = datetime.now(timezone.utc) - timedelta(days=JOB_RETENTION_DAYS)
+    removed = 0
+    while not deadline.expired():
+        ids = (
+            select(DownloadJob.id)
+            .where(DownloadJob.status.in_(('done', 'failed')), DownloadJob.updated_at < cutoff)
+            .limit(MAINTENANCE_BATCH_SIZE)
+            .scalar_subquery()
+        )
+        with get_session() as session:
+            count = session.execute(delete(DownloadJob).where(DownloadJob.id.in_(ids))).rowcount
+        removed += count
+        if count < MAINTENANCE_BATCH_SIZE:
+            break
+        time.sleep(BATCH_PAUSE)
+    result['download_jobs'] = removed
+    return result
+
+
+TASKS = [
+    MaintenanceTask('history', expire_history, 3600),
+    MaintenanceTask('media_cache', clean_media_cache, 3600),
+    MaintenanceTask('state', expire_state, MAINTENANCE_INTERVAL_SECONDS),
+]
+
+_last_run: Dict[str, float] = {}
+_running = False
+
+
+def run_task(task: MaintenanceTask) -> Dict[str, int]:
+    deadline = Deadline()
+    with timed(f'maintenance_{task.name}'):
+        result = task.run(deadline)
+    for kind, count in result.items():
+        if count:
+            MAINTENANCE_REMOVED.inc(count, task=task.name, kind=kind)
+    if deadline.hit:
+        MAINTENANCE_INCOMPLETE.inc(task=task.name)
+    if any(result.values()) or deadline.hit:
+        logging.info("Maintenance %s: %s%s", task.name, result, " (time budget hit)" if deadline.hit else "")
+    return result
+
+
+async def _maintenance_job(context) -> None:
+    global _running
+    if _running:
+        return
+    _running = True
+    try:
+        for task in TASKS:
+            now = time.monotonic()
+            if now - _last_run.get(task.name, float('-inf')) < task.interval:
+                continue
+            _last_run[task.name] = now
+            try:
+                await asyncio.to_thread(run_task, task)
+            except Exception:
+                logging.exception("Maintenance task %s failed", task.name)
+    finally:
+        _running = False
+
+
+def schedule_maintenance(app) -> None:
+    if app.job_queue is None:
+        logging.warning("JobQueue unavailable; history retention and cache cleanup will not run")
+        return
+    app.job_queue.run_repeating(_maintenance_job, interval=MAINTENANCE_INTERVAL_SECONDS,
+                                first=MAINTENANCE_INTERVAL_SECONDS, name="maintenance")
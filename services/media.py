@@ -4,11 +4,12 @@ import asyncio
 from typing import Optional
 from dataclasses import dataclass
 import hashlib
-import requests
-from PIL import Image
+import uuid
 
-THUMBS_DIR = os.path.join(os.getenv("MUSIC_DOWNLOAD_DIR", "downloads"), "thumbs")
-os.makedirs(THUMBS_DIR, exist_ok=True)
+from services.metrics import timed, record_cache
+from services.tracing import span
+from services import storage
+from services.storage import THUMBS_DIR
 
 DEFAULT_MAX_SIZE_KB = 200
 MAX_DIM = 320
@@ -25,27 +26,35 @@ async def ensure_thumbnail(url: str | None, video_id: str | None, max_size_kb: i
         # fallback name
         video_id = hashlib.sha1(url.encode('utf-8')).hexdigest()[:16]
 
-    out_path = os.path.join(THUMBS_DIR, f"{video_id}.jpg")
-    if os.path.isfile(out_path) and os.path.getsize(out_path) <= max_size_kb * 1024:
-        return ThumbnailResult(path=out_path, from_cache=True)
+    cached = storage.existing_path(video_id, 'jpg', THUMBS_DIR)
+    if cached and os.path.getsize(cached) <= max_size_kb * 1024:
+        record_cache('thumbnail', True)
+        return ThumbnailResult(path=cached, from_cache=True)
+    record_cache('thumbnail', False)
+    out_path = storage.media_path(video_id, 'jpg', THUMBS_DIR)
+    tmp_path = storage.staging_path(f"{video_id}.{uuid.uuid4().hex}.jpg")
 
     def _work():
+        import requests
         try:
             r = requests.get(url, timeout=10)
             if r.status_code != 200:
                 logging.warning("Thumbnail download failed with status %s", r.status_code)
                 return None
-            with open(out_path, 'wb') as f:
+            with open(tmp_path, 'wb') as f:
                 f.write(r.content)
-            if os.path.getsize(out_path) > max_size_kb * 1024:
-                _shrink_image(out_path, max_size_kb)
+            if os.path.getsize(tmp_path) > max_size_kb * 1024:
+                _shrink_image(tmp_path, max_size_kb)
+            storage.commit(tmp_path, out_path)
             return ThumbnailResult(path=out_path, from_cache=False)
         except Exception as e:
             logging.error("Thumbnail error: %s", e)
             return None
-    return await asyncio.to_thread(_work)
+    with timed('thumbnail'), span('thumbnail'):
+        return await asyncio.to_thread(_work)
 
 def _shrink_image(path: str, max_size_kb: int):
+    from PIL import Image
     try:
         quality = 90
         while os.path.getsize(path) > max_size_kb * 1024 and quality >= 40:
@@ -0,0 +1,99 @@
+"""Playlist / album jobs.
+
+Entries come from a flat extraction (one request for the whole list). Each
+entry is then fetched by its own task, at most PLAYLIST_PARALLELISM at a time
+per job (on top of the global download pool), skipping ids that are already
+cached. Delivery walks the tasks in playlist order, so track N is sent as soon
+as tracks 1..N are ready rather than after the whole batch.
+"""
+from __future__ import annotations
+
+import os
+import uuid
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from services.youtube import TrackMeta, get_youtube_service
+from services.delivery import is_deliverable
+
+PLAYLIST_PARALLELISM = int(os.getenv('PLAYLIST_PARALLELISM', '2'))
+
+
+@dataclass
+class PlaylistJob:
+    job_id: str
+    user_id: int
+    title: str
+    entries: List[TrackMeta]
+    delivered: int = 0
+    failed: int = 0
+    cancelled: bool = False
+    tasks: List[asyncio.Task] = field(default_factory=list, repr=False)
+
+    @property
+    def done(self) -> int:
+        return self.delivered + self.failed
+
+    def cancel(self) -> None:
+        self.cancelled = True
+        for task in self.tasks:
+            task.cancel()
+
+
+_jobs: Dict[str, PlaylistJob] = {}
+_lock = threading.RLock()
+
+
+def start_job(user_id: int, title: str, entries: List[TrackMeta]) -> PlaylistJob:
+    job = PlaylistJob(uuid.uuid4().hex[:12], user_id, title, entries)
+    with _lock:
+        _jobs[job.job_id] = job
+    return job
+
+
+def get_job(job_id: str) -> Optional[PlaylistJob]:
+    with _lock:
+        return _jobs.get(job_id)
+
+
+async def _fetch(meta: TrackMeta, gate: asyncio.Semaphore) -> tuple[str | None, TrackMeta]:
+    svc = get_youtube_service()
+    cached = svc.find_cached_file(meta.id)
+    if is_deliverable(meta, cached):
+        return cached, meta
+    async with gate:
+        return await svc.download_audio(meta.url)
+
+
+async def run_playlist(
+    job: PlaylistJob,
+    deliver: Callable[[TrackMeta, str | None], Awaitable[None]],
+    on_progress: Callable[[PlaylistJob], Awaitable[None]] | None = None,
+) -> None:
+    gate = asyncio.Semaphore(PLAYLIST_PARALLELISM)
+    job.tasks = [asyncio.create_task(_fetch(meta, gate)) for meta in job.entries]
+    try:
+        for task, meta in zip(job.tasks, job.entries):
+            if job.cancelled:
+                break
+            try:
+                file_path, final_meta = await task
+                await deliver(final_meta, file_path)
+                job.delivered += 1
+            except asyncio.CancelledError:
+                if job.cancelled and task.cancelled():
+                    break
+                raise
+            except Exception:
+                logging.exception("Playlist %s: failed to deliver %s", job.job_id, meta.id)
+                job.failed += 1
+            if on_progress:
+                await on_progress(job)
+    finally:
+        for task in job.tasks:
+            task.cancel()
+        with _lock:
+            _jobs.pop(job.job_id, None)
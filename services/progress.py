@@ -0,0 +1,62 @@
+import time
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+from telegram import Bot
+
+# Minimum seconds between progress edits; Telegram rate-limits message edits
+PROGRESS_EDIT_INTERVAL = 1.5
+
+
+class ProgressMessage:
+    """A status message edited from yt-dlp progress hooks (which run in worker threads)."""
+
+    def __init__(self, bot: Bot, chat_id: int, message_id: int, *, label: str = "audio"):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.label = label
+        self._loop = asyncio.get_running_loop()
+        self._last_edit = 0.0
+        self._last_text: Optional[str] = None
+
+    @classmethod
+    async def send(cls, bot: Bot, chat_id: int, text: str, *, label: str = "audio") -> "ProgressMessage":
+        message = await bot.send_message(chat_id=chat_id, text=text)
+        return cls(bot, message.chat_id, message.message_id, label=label)
+
+    async def update(self, text: str, reply_markup=None) -> None:
+        if text == self._last_text:
+            return
+        self._last_text = text
+        try:
+            await self.bot.edit_message_text(chat_id=self.chat_id, message_id=self.message_id, text=text,
+                                             reply_markup=reply_markup)
+        except Exception:
+            pass
+
+    async def delete(self) -> None:
+        try:
+            await self.bot.delete_message(chat_id=self.chat_id, message_id=self.message_id)
+        except Exception:
+            pass
+
+    def _post(self, text: str, *, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._last_edit < PROGRESS_EDIT_INTERVAL:
+            return
+        self._last_edit = now
+        try:
+            self._loop.call_soon_threadsafe(asyncio.create_task, self.update(text))
+        except RuntimeError:
+            logging.debug("Progress loop closed; dropping update %r", text)
+
+    def hook(self, d: Dict[str, Any]) -> None:
+        """yt-dlp progress hook; safe to call from any thread."""
+        if d.get('status') == 'downloading':
+            total = d.get('total_bytes') or d.get('total_bytes_estimate') or 0
+            downloaded = d.get('downloaded_bytes', 0)
+            if total:
+                self._post(f"Downloading: {downloaded / total * 100:.1f}%")
+        elif d.get('status') == 'finished':
+            self._post(f"Processing {self.label}…", force=True)
@@ -0,0 +1,217 @@
+"""Item-item recommendations from co-listening history.
+
+Users who downloaded X also downloaded Y: the model is a sparse co-occurrence
+matrix over (user, track) pairs, kept as dict-of-dicts and updated
+incrementally from new history rows. For every track that changed, the top
+neighbours by cosine similarity (co / sqrt(n_x * n_y)) are recomputed and kept
+in memory, so serving a user is a merge of a few short precomputed lists.
+Per-user results are memoised until the next refresh that touches them.
+"""
+from __future__ import annotations
+
+import os
+import math
+import heapq
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Set, Tuple
+
+from sqlalchemy import select, func
+
+from db.db_session import get_session
+from db.models import History, Track, UserTrackPlayCount
+from services.metrics import timed
+
+RECOMMENDER_REFRESH_SECONDS = int(os.getenv('RECOMMENDER_REFRESH_SECONDS', '300'))
+NEIGHBORS_PER_TRACK = 50
+# Only a user's most recent tracks create new co-occurrences / seed recommendations
+USER_WINDOW = 200
+SEED_ITEMS = 30
+BATCH_SIZE = 50_000
+
+
+class CoListenIndex:
+    def __init__(self, neighbors: int = NEIGHBORS_PER_TRACK):
+        self.neighbors_per_track = neighbors
+        # one writer (the refresh job) builds the model under _write_lock; readers only take
+        # _lock, which is held just long enough to swap in the writer's results
+        self._write_lock = threading.Lock()
+        self._lock = threading.RLock()
+        self._user_items: Dict[int, Set[int]] = {}
+        self._user_recent: Dict[int, Deque[int]] = {}
+        self._item_users: Dict[int, int] = {}
+        self._co: Dict[int, Dict[int, int]] = {}
+        # published state, read by recommend()
+        self._user_seeds: Dict[int, Tuple[int, ...]] = {}
+        self._neighbors: Dict[int, List[Tuple[float, int]]] = {}
+        self._user_cache: Dict[int, List[Tuple[int, float]]] = {}
+        self.last_history_id = 0
+        self.loaded = False
+
+    def ingest(self, pairs: Iterable[Tuple[int, int]]) -> Set[int]:
+        """Add (user_id, track_id) pairs; returns the tracks whose neighbours changed.
+
+        Idempotent: a pair the index already knows is ignored.
+        """
+        dirty: Set[int] = set()
+        users: Set[int] = set()
+        with self._write_lock:
+            for user_id, track_id in pairs:
+                items = self._user_items.setdefault(user_id, set())
+                if track_id in items:
+                    continue
+                recent = self._user_recent.setdefault(user_id, deque(maxlen=USER_WINDOW))
+                row = self._co.setdefault(track_id, {})
+                for other in recent:
+                    row[other] = row.get(other, 0) + 1
+                    other_row = self._co.setdefault(other, {})
+                    other_row[track_id] = other_row.get(track_id, 0) + 1
+                    dirty.add(other)
+                items.add(track_id)
+                recent.append(track_id)
+                self._item_users[track_id] = self._item_users.get(track_id, 0) + 1
+                users.add(user_id)
+                dirty.add(track_id)
+            seeds = {u: tuple(self._user_recent[u])[-SEED_ITEMS:] for u in users}
+        with self._lock:
+            self._user_seeds.update(seeds)
+            for user_id in users:
+                self._user_cache.pop(user_id, None)
+        return dirty
+
+    def rebuild_neighbors(self, items: Iterable[int]) -> None:
+        fresh: Dict[int, List[Tuple[float, int]]] = {}
+        with self._write_lock:
+            for item in items:
+                row = self._co.get(item)
+                if not row:
+                    continue
+                n_item = self._item_users.get(item, 1)
+                scored = (
+                    (count / math.sqrt(n_item * self._item_users.get(other, 1)), other)
+                    for other, count in row.items()
+                )
+                fresh[item] = heapq.nlargest(self.neighbors_per_track, scored)
+        with self._lock:
+            self._neighbors.update(fresh)
+            # neighbour lists feed every user's result; drop memoised answers
+            self._user_cache.clear()
+
+    def recommend(self, user_id: int, k: int = 10) -> List[Tuple[int, float]]:
+        with self._lock:
+            cached = self._user_cache.get(user_id)
+            if cached is not None:
+                return cached[:k]
+            # the writer only adds to this set; membership tests need no snapshot
+            seen = self._user_items.get(user_id)
+            if not seen:
+                return []
+            recent = self._user_seeds.get(user_id, ())
+            scores: Dict[int, float] = {}
+            for weight, item in enumerate(recent, 1):
+                # newer seeds weigh more
+                w = weight / len(recent)
+                for sim, other in self._neighbors.get(item, ()):
+                    if other not in seen:
+                        scores[other] = scores.get(other, 0.0) + sim * w
+            result = heapq.nlargest(max(k, 50), scores.items(), key=lambda kv: kv[1])
+            self._user_cache[user_id] = result
+            return result[:k]
+
+    def _load_initial(self) -> None:
+        with get_session() as session:
+            max_id = session.execute(select(func.max(History.id))).scalar() or 0
+            stmt = (
+                select(UserTrackPlayCount.user_id, UserTrackPlayCount.track_id)
+                .order_by(UserTrackPlayCount.user_id, UserTrackPlayCount.last_played_at)
+                .execution_options(yield_per=BATCH_SIZE)
+            )
+            if session.execute(select(UserTrackPlayCount.user_id).limit(1)).first() is None:
+                # aggregates not populated yet (fresh deploy): seed from the raw history instead
+                logging.info("Recommender: user_track_play_counts is empty; loading from history")
+                stmt = (
+                    select(History.user_id, History.track_id)
+                    .where(History.user_id.is_not(None), History.track_id.is_not(None))
+                    .order_by(History.user_id, History.id)
+                    .execution_options(yield_per=BATCH_SIZE)
+                )
+            dirty: Set[int] = set()
+            for partition in session.execute(stmt).partitions():
+                dirty |= self.ingest(partition)
+        self.rebuild_neighbors(dirty)
+        self.last_history_id = max_id
+        self.loaded = True
+
+    def refresh(self) -> int:
+        """Pull history rows newer than the last seen id. Returns rows ingested."""
+        with timed('recommender_refresh'):
+            if not self.loaded:
+                self._load_initial()
+                return 0
+            total = 0
+            dirty: Set[int] = set()
+            while True:
+                with get_session() as session:
+                    rows = session.execute(
+                        select(History.id, History.user_id, History.track_id)
+                        .where(History.id > self.last_history_id)
+                        .order_by(History.id)
+                        .limit(BATCH_SIZE)
+                    ).all()
+                if not rows:
+                    break
+                dirty |= self.ingest((r.user_id, r.track_id) for r in rows if r.user_id and r.track_id)
+                self.last_history_id = rows[-1].id
+                total += len(rows)
+            if dirty:
+                self.rebuild_neighbors(dirty)
+            return total
+
+
+_index: CoListenIndex | None = None
+
+
+def get_recommender() -> CoListenIndex:
+    global _index
+    if _index is None:
+        _index = CoListenIndex()
+    return _index
+
+
+def recommend_tracks(user_id: int, k: int = 10) -> List[dict]:
+    """Top-K recommendations with track data (one query for the metadata)."""
+    ranked = get_recommender().recommend(user_id, k)
+    if not ranked:
+        return []
+    ids = [track_id for track_id, _ in ranked]
+    with get_session() as session:
+        rows = session.execute(
+            select(Track.id.label('track_id'), Track.video_id, Track.title, Track.artist, Track.duration)
+            .where(Track.id.in_(ids))
+        ).mappings().all()
+    by_id = {r['track_id']: dict(r) for r in rows}
+    result = []
+    for track_id, score in ranked:
+        row = by_id.get(track_id)
+        if row:
+            row['score'] = round(score, 4)
+            result.append(row)
+    return result
+
+
+async def _refresh_job(context) -> None:
+    try:
+        ingested = await asyncio.to_thread(get_recommender().refresh)
+        if ingested:
+            logging.info("Recommender: ingested %d history rows", ingested)
+    except Exception:
+        logging.exception("Recommender refresh failed")
+
+
+def schedule_refresh(app) -> None:
+    if app.job_queue is None:
+        logging.warning("JobQueue unavailable; recommendations will not refresh (install python-telegram-bot[job-queue])")
+        return
+    app.job_queue.run_repeating(_refresh_job, interval=RECOMMENDER_REFRESH_SECONDS, first=5, name="recommender_refresh")
@@ -1,13 +1,62 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from db.db_session import get_session
-from db.models import User, Track, History
-from services.youtube import TrackMeta
+from db.models import User, Track, History, Favorite
+from services.youtube import TrackMeta, YouTubeService
+from services.metrics import timed
+from services.tracing import span
+from services.stats import bump_play_counts
+from services.search_index import get_search_index
+from utils.youtube_url import parse_video_id, canonical_url
 from random import randint
 
 
+# Read models: plain values selected column by column, safe to use after the session is closed
+
+@dataclass(frozen=True, slots=True)
+class UserView:
+    id: int
+    username: str | None
+    first_name: str | None
+    last_name: str | None
+    website_linked: bool
+    website_link_code: int
+
+
+@dataclass(frozen=True, slots=True)
+class TrackView:
+    id: int
+    video_id: str
+    title: str
+    artist: str | None
+    youtube_url: str
+    thumbnail_url: str | None
+    duration: int | None
+
+    def to_meta(self) -> TrackMeta:
+        return TrackMeta(id=self.video_id, title=self.title, url=self.youtube_url, duration=self.duration,
+                         uploader=self.artist, thumbnail=self.thumbnail_url)
+
+
+_USER_VIEW_COLUMNS = (User.id, User.username, User.first_name, User.last_name, User.website_linked,
+                      User.website_link_code)
+_TRACK_VIEW_COLUMNS = (Track.id, Track.video_id, Track.title, Track.artist, Track.youtube_url,
+                       Track.thumbnail_url, Track.duration)
+
+
+def _user_view(row) -> UserView | None:
+    if row is None:
+        return None
+    return UserView(row.id, row.username, row.first_name, row.last_name, bool(row.website_linked),
+                    row.website_link_code)
+
+
 def _generate_unique_link_code(session):
     while True:
         code = randint(10000000, 99999999)
-        if not session.query(User).filter_by(website_link_code=code).first():
+        if session.execute(select(User.id).where(User.website_link_code == code)).first() is None:
             return code
 
 
@@ -25,9 +74,9 @@ def get_or_create_user(session, tg_user) -> User:
     return user
 
 
-def get_user(tg_user_id: int) -> User | None:
+def get_user(tg_user_id: int) -> UserView | None:
     with get_session() as session:
-        return session.get(User, tg_user_id)
+        return _user_view(session.execute(select(*_USER_VIEW_COLUMNS).where(User.id == tg_user_id)).first())
 
 
 def request_link_code(tg_user) -> int:
@@ -45,18 +94,37 @@ def disconnect_user(tg_user) -> None:
         user.website_link_code = _generate_unique_link_code(session)
 
 
+def track_video_id(meta: TrackMeta) -> str:
+    return parse_video_id(meta.url or '') or meta.id
+
+
 def get_or_create_track(session, meta: TrackMeta) -> Track:
-    track = session.query(Track).filter_by(youtube_url=meta.url).first()
-    if not track:
-        track = Track(
-            title=meta.title,
-            artist=meta.uploader,
-            youtube_url=meta.url,
-            thumbnail_url=meta.thumbnail,
-            duration=meta.duration,
-        )
-        session.add(track)
-    return track
+    video_id = track_video_id(meta)
+    track = session.query(Track).filter_by(video_id=video_id).first()
+    if track:
+        return track
+    # concurrent downloads of one video race on ux_tracks_video_id: let the loser read the winner's row
+    session.execute(pg_insert(Track).values(
+        video_id=video_id,
+        title=meta.title,
+        artist=meta.uploader,
+        youtube_url=YouTubeService.normalize_url(meta.url) if meta.url else canonical_url(video_id),
+        thumbnail_url=meta.thumbnail,
+        duration=meta.duration,
+    ).on_conflict_do_nothing(index_elements=[Track.video_id]))
+    return session.execute(select(Track).where(Track.video_id == video_id)).scalar_one()
+
+
+def get_track(video_id: str) -> TrackView | None:
+    with get_session() as session:
+        row = session.execute(select(*_TRACK_VIEW_COLUMNS).where(Track.video_id == video_id)).first()
+    return TrackView(*row) if row else None
+
+
+def get_track_meta(video_id: str) -> TrackMeta | None:
+    """Metadata of an already known track, so cached audio can be sent without yt-dlp."""
+    track = get_track(video_id)
+    return track.to_meta() if track else None
 
 
 def add_history(session, user: User, track: Track) -> History:
@@ -66,24 +134,27 @@ def add_history(session, user: User, track: Track) -> History:
 
 
 def record_download(tg_user, track_meta: TrackMeta) -> None:
-    with get_session() as session:
+    with timed('db_write'), span('db_write'), get_session() as session:
         user = get_or_create_user(session, tg_user)
         track = get_or_create_track(session, track_meta)
         add_history(session, user, track)
+        session.flush()
+        bump_play_counts(session, user.id, track.id)
+    get_search_index().add(track.id, track.video_id, track.title, track.artist, track.youtube_url,
+                           track.duration, track.thumbnail_url)
 
 
-def get_user_by_link_code(code: int) -> User | None:
+def get_user_by_link_code(code: int) -> UserView | None:
     with get_session() as session:
-        return session.query(User).filter(User.website_link_code == code).first()
+        return _user_view(session.execute(select(*_USER_VIEW_COLUMNS).where(User.website_link_code == code)).first())
 
 
-def mark_user_linked_by_code(code: int) -> bool:
+def mark_user_linked_by_code(code: int) -> int | None:
+    """Mark the code's owner as linked; returns their user id (None for an unknown code)."""
     with get_session() as session:
-        user = session.query(User).filter(User.website_link_code == code).first()
-        if not user:
-            return False
-        user.website_linked = True
-        return True
+        return session.execute(
+            update(User).where(User.website_link_code == code).values(website_linked=True).returning(User.id)
+        ).scalar()
 
 
 def logout_user_by_id(user_id: int) -> bool:
@@ -94,3 +165,81 @@ def logout_user_by_id(user_id: int) -> bool:
         user.website_linked = False
         user.website_link_code = _generate_unique_link_code(session)
         return True
+
+
+# Keyset pagination (history / favorites)
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MAX_PAGE_SIZE = 100
+
+
+def encode_history_cursor(downloaded_at: datetime, history_id: int) -> str:
+    us = (downloaded_at - _EPOCH) // timedelta(microseconds=1)
+    return f"{us}.{history_id}"
+
+
+def decode_history_cursor(cursor: str) -> tuple[datetime, int]:
+    us, _, history_id = cursor.partition('.')
+    return _EPOCH + timedelta(microseconds=int(us)), int(history_id)
+
+
+def _track_columns():
+    return (
+        Track.id.label('track_id'),
+        Track.video_id,
+        Track.title,
+        Track.artist,
+        Track.duration,
+        Track.youtube_url,
+        Track.thumbnail_url,
+    )
+
+
+def list_history(user_id: int, limit: int = 20, cursor: str | None = None) -> tuple[list[dict], str | None]:
+    """One page of a user's history, newest first, with track data joined in.
+
+    Seeks on (user_id, downloaded_at, id) so each page costs O(limit)
+    regardless of how deep the cursor is. Raises ValueError on a bad cursor.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    stmt = (
+        select(History.id.label('history_id'), History.downloaded_at, *_track_columns())
+        .join(Track, Track.id == History.track_id)
+        .where(History.user_id == user_id)
+        .order_by(History.downloaded_at.desc(), History.id.desc())
+        .limit(limit + 1)
+    )
+    if cursor:
+        ts, history_id = decode_history_cursor(cursor)
+        # the plain bound lets the planner skip newer monthly partitions
+        stmt = stmt.where(History.downloaded_at <= ts,
+                          tuple_(History.downloaded_at, History.id) < tuple_(ts, history_id))
+    with get_session() as session:
+        rows = [dict(r) for r in session.execute(stmt).mappings()]
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_history_cursor(last['downloaded_at'], last['history_id'])
+    return rows, next_cursor
+
+
+def list_favorites(user_id: int, limit: int = 20, cursor: str | None = None) -> tuple[list[dict], str | None]:
+    """One page of a user's favorites, most recently added first (keyset on favorites.id)."""
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    stmt = (
+        select(Favorite.id.label('favorite_id'), *_track_columns())
+        .join(Track, Track.id == Favorite.track_id)
+        .where(Favorite.user_id == user_id)
+        .order_by(Favorite.id.desc())
+        .limit(limit + 1)
+    )
+    if cursor:
+        stmt = stmt.where(Favorite.id < int(cursor))
+    with get_session() as session:
+        rows = [dict(r) for r in session.execute(stmt).mappings()]
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = str(rows[-1]['favorite_id'])
+    return rows, next_cursor
@@ -0,0 +1,61 @@
+import os
+import logging
+from typing import List
+
+from services.youtube import get_youtube_service, TrackMeta
+from services.repository import get_track_meta
+from services.delivery import is_deliverable
+from services.metrics import record_cache
+from services.search_index import get_search_index, normalize_text
+from services.coalesce import Coalescer
+from utils.youtube_url import parse_video_id, canonical_url
+
+# Identical queries arriving within this many seconds share one resolution
+RESOLVE_COALESCE_SECONDS = float(os.getenv('RESOLVE_COALESCE_SECONDS', '10'))
+
+_resolve_coalescer = Coalescer('resolve_coalesced', window=RESOLVE_COALESCE_SECONDS)
+
+
+def query_key(query: str) -> str:
+    video_id = parse_video_id(query)
+    return f"v:{video_id}" if video_id else f"q:{normalize_text(query)}"
+
+
+async def resolve_query(query: str) -> TrackMeta | None:
+    """resolve_track, merged across users: concurrent and recent identical queries resolve once."""
+    return await _resolve_coalescer.run(query_key(query), lambda: resolve_track(query))
+
+
+async def resolve_track(query: str) -> TrackMeta | None:
+    """Turn a user query into a track, avoiding yt-dlp work where possible.
+
+    YouTube links are parsed locally: known tracks come straight from the
+    database, cached-but-unknown ones get a single metadata extraction, and
+    anything else returns a placeholder so the download performs the only
+    extraction. Free-text queries try the local trigram index over known
+    tracks first and only go to YouTube search on a low-confidence match.
+    """
+    svc = get_youtube_service()
+    video_id = parse_video_id(query)
+    if video_id:
+        try:
+            meta = get_track_meta(video_id)
+        except Exception:
+            logging.exception("Track lookup failed for %s", video_id)
+            meta = None
+        record_cache('track_meta', meta is not None)
+        if meta:
+            return meta
+        url = canonical_url(video_id)
+        placeholder = TrackMeta(id=video_id, title=url, url=url, duration=None, uploader=None, thumbnail=None)
+        if is_deliverable(placeholder, svc.find_cached_file(video_id)):
+            return await svc.fetch_meta(url)
+        return placeholder
+
+    local = get_search_index().best_match(query)
+    record_cache('local_search', local is not None)
+    if local:
+        return local.to_meta()
+
+    results: List[TrackMeta] = await svc.search(query, limit=1)
+    return results[0] if results else None
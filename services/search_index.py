@@ -0,0 +1,184 @@
+"""In-process fuzzy search over known tracks.
+
+A trigram inverted index over normalised "artist title" text lets common
+queries resolve to tracks we already have (and usually have on disk or as a
+Telegram file_id) without a YouTube search. The index is loaded from the
+tracks table in the background, extended on every recorded download and
+topped up periodically for rows written by other processes.
+"""
+from __future__ import annotations
+
+import os
+import re
+import asyncio
+import logging
+import threading
+import unicodedata
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+
+from db.db_session import get_session
+from db.models import Track
+from services.youtube import TrackMeta
+from utils.track_text import normalize_query
+from services.metrics import timed
+
+LOCAL_SEARCH_MIN_COVERAGE = float(os.getenv('LOCAL_SEARCH_MIN_COVERAGE', '0.9'))
+LOCAL_SEARCH_MIN_MARGIN = float(os.getenv('LOCAL_SEARCH_MIN_MARGIN', '0.05'))
+# Coverage alone lets a short generic query ("love") match any long title containing it
+LOCAL_SEARCH_MIN_DICE = float(os.getenv('LOCAL_SEARCH_MIN_DICE', '0.5'))
+LOCAL_SEARCH_REFRESH_SECONDS = int(os.getenv('LOCAL_SEARCH_REFRESH_SECONDS', '120'))
+MIN_QUERY_TRIGRAMS = 4
+BATCH_SIZE = 20_000
+# each refresh re-reads this many ids below the watermark: ids can commit out of order
+REFRESH_OVERLAP_IDS = 500
+
+_NON_ALNUM_RE = re.compile(r"[^0-9a-z]+")
+
+
+def normalize_text(text: str) -> str:
+    text = unicodedata.normalize('NFKD', text or '').lower()
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return _NON_ALNUM_RE.sub(' ', text).strip()
+
+
+def trigrams(text: str) -> FrozenSet[str]:
+    grams: Set[str] = set()
+    for word in normalize_text(text).split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+@dataclass(frozen=True)
+class IndexedTrack:
+    track_id: int
+    video_id: str
+    title: str
+    artist: Optional[str]
+    url: str
+    duration: Optional[int]
+    thumbnail: Optional[str]
+    grams: FrozenSet[str]
+
+    def to_meta(self) -> TrackMeta:
+        return TrackMeta(id=self.video_id, title=self.title, url=self.url, duration=self.duration,
+                         uploader=self.artist, thumbnail=self.thumbnail)
+
+
+class TrigramIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._docs: Dict[int, IndexedTrack] = {}
+        self._postings: Dict[str, Set[int]] = {}
+        # highest track id loaded from the database; only refresh() moves it
+        self._loaded_through = 0
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def add(self, track_id: int, video_id: str, title: str, artist: str | None, url: str,
+            duration: int | None = None, thumbnail: str | None = None) -> None:
+        clean_artist, clean_title = normalize_query(title, artist)
+        doc = IndexedTrack(track_id, video_id, title, artist, url, duration, thumbnail,
+                           trigrams(f"{clean_artist} {clean_title}"))
+        with self._lock:
+            old = self._docs.get(track_id)
+            if old is not None:
+                for g in old.grams:
+                    self._postings.get(g, set()).discard(track_id)
+            self._docs[track_id] = doc
+            for g in doc.grams:
+                self._postings.setdefault(g, set()).add(track_id)
+
+    def search(self, query: str, limit: int = 5) -> List[Tuple[float, float, IndexedTrack]]:
+        """Candidates as (coverage, dice, doc), best first.
+
+        coverage = share of the query's trigrams found in the track;
+        dice = 2|q ∩ d| / (|q| + |d|) breaks ties towards tighter matches.
+        """
+        q = trigrams(query)
+        if not q:
+            return []
+        counts: Dict[int, int] = {}
+        with self._lock:
+            for g in q:
+                for track_id in self._postings.get(g, ()):
+                    counts[track_id] = counts.get(track_id, 0) + 1
+            scored = []
+            for track_id, overlap in counts.items():
+                doc = self._docs[track_id]
+                scored.append((overlap / len(q), 2 * overlap / (len(q) + len(doc.grams)), doc))
+        scored.sort(key=lambda s: (s[0], s[1]), reverse=True)
+        return scored[:limit]
+
+    def best_match(self, query: str) -> Optional[IndexedTrack]:
+        """A confident match or None (caller falls back to YouTube search)."""
+        if len(trigrams(query)) < MIN_QUERY_TRIGRAMS:
+            return None
+        with timed('local_search'):
+            candidates = self.search(query, limit=2)
+        if not candidates:
+            return None
+        coverage, dice, doc = candidates[0]
+        if coverage < LOCAL_SEARCH_MIN_COVERAGE or dice < LOCAL_SEARCH_MIN_DICE:
+            return None
+        if len(candidates) > 1:
+            runner_cov, runner_dice, runner = candidates[1]
+            ambiguous = runner_cov >= LOCAL_SEARCH_MIN_COVERAGE and dice - runner_dice < LOCAL_SEARCH_MIN_MARGIN
+            if ambiguous and runner.video_id != doc.video_id:
+                return None
+        return doc
+
+    def refresh(self) -> int:
+        """Load tracks with ids above the last one loaded (and a few below it). Returns tracks added."""
+        total = 0
+        after = max(self._loaded_through - REFRESH_OVERLAP_IDS, 0) if self.loaded else 0
+        while True:
+            with get_session() as session:
+                rows = session.execute(
+                    select(Track.id, Track.video_id, Track.title, Track.artist, Track.youtube_url,
+                           Track.duration, Track.thumbnail_url)
+                    .where(Track.id > after)
+                    .order_by(Track.id)
+                    .limit(BATCH_SIZE)
+                ).all()
+            for r in rows:
+                total += r.id not in self._docs
+                self.add(r.id, r.video_id, r.title, r.artist, r.youtube_url, r.duration, r.thumbnail_url)
+            if rows:
+                after = rows[-1].id
+                self._loaded_through = max(self._loaded_through, after)
+            if len(rows) < BATCH_SIZE:
+                break
+        self.loaded = True
+        return total
+
+
+_index: TrigramIndex | None = None
+
+
+def get_search_index() -> TrigramIndex:
+    global _index
+    if _index is None:
+        _index = TrigramIndex()
+    return _index
+
+
+async def _refresh_job(context) -> None:
+    try:
+        added = await asyncio.to_thread(get_search_index().refresh)
+        if added:
+            logging.info("Search index: %d tracks added (%d total)", added, len(get_search_index()))
+    except Exception:
+        logging.exception("Search index refresh failed")
+
+
+def schedule_refresh(app) -> None:
+    if app.job_queue is None:
+        logging.warning("JobQueue unavailable; local search index will only learn from new downloads")
+        return
+    app.job_queue.run_repeating(_refresh_job, interval=LOCAL_SEARCH_REFRESH_SECONDS, first=1, name="search_index_refresh")
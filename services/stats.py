@@ -0,0 +1,127 @@
+"""Play-count aggregates maintained alongside history.
+
+Every recorded download bumps three small tables in the same transaction:
+per-track totals, per-user per-track counts and daily per-track buckets (UTC
+days). Leaderboards then read a handful of index entries instead of grouping
+the whole history table.
+
+Backfill or repair from history with:
+
+    python -m services.stats rebuild
+"""
+import sys
+import logging
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, func, text, Date
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from db.db_session import get_session
+from db.models import Track, TrackPlayCount, UserTrackPlayCount, DailyTrackPlayCount, History
+
+
+def _utc_day(ts):
+    return func.timezone('UTC', ts).cast(Date)
+
+
+def bump_play_counts(session, user_id: int, track_id: int) -> None:
+    now = func.now()
+    total = pg_insert(TrackPlayCount).values(track_id=track_id, plays=1, last_played_at=now)
+    session.execute(total.on_conflict_do_update(
+        index_elements=[TrackPlayCount.track_id],
+        set_={'plays': TrackPlayCount.plays + 1, 'last_played_at': total.excluded.last_played_at},
+    ))
+    per_user = pg_insert(UserTrackPlayCount).values(user_id=user_id, track_id=track_id, plays=1, last_played_at=now)
+    session.execute(per_user.on_conflict_do_update(
+        index_elements=[UserTrackPlayCount.user_id, UserTrackPlayCount.track_id],
+        set_={'plays': UserTrackPlayCount.plays + 1, 'last_played_at': per_user.excluded.last_played_at},
+    ))
+    daily = pg_insert(DailyTrackPlayCount).values(day=_utc_day(now), track_id=track_id, plays=1)
+    session.execute(daily.on_conflict_do_update(
+        index_elements=[DailyTrackPlayCount.day, DailyTrackPlayCount.track_id],
+        set_={'plays': DailyTrackPlayCount.plays + 1},
+    ))
+
+
+def _track_columns():
+    return (Track.id.label('track_id'), Track.video_id, Track.title, Track.artist, Track.duration)
+
+
+def top_tracks(limit: int = 10, days: int | None = None) -> list[dict]:
+    """Most played tracks overall, or over the last `days` UTC days."""
+    if days is None:
+        stmt = (
+            select(*_track_columns(), TrackPlayCount.plays)
+            .join(Track, Track.id == TrackPlayCount.track_id)
+            .order_by(TrackPlayCount.plays.desc())
+            .limit(limit)
+        )
+    else:
+        since = (datetime.now(timezone.utc) - timedelta(days=days - 1)).date()
+        window = (
+            select(DailyTrackPlayCount.track_id, func.sum(DailyTrackPlayCount.plays).label('plays'))
+            .where(DailyTrackPlayCount.day >= since)
+            .group_by(DailyTrackPlayCount.track_id)
+            .order_by(func.sum(DailyTrackPlayCount.plays).desc())
+            .limit(limit)
+            .subquery()
+        )
+        stmt = (
+            select(*_track_columns(), window.c.plays)
+            .join(window, window.c.track_id == Track.id)
+            .order_by(window.c.plays.desc())
+        )
+    with get_session() as session:
+        return [dict(r) for r in session.execute(stmt).mappings()]
+
+
+def user_top_tracks(user_id: int, limit: int = 10) -> list[dict]:
+    stmt = (
+        select(*_track_columns(), UserTrackPlayCount.plays, UserTrackPlayCount.last_played_at)
+        .join(Track, Track.id == UserTrackPlayCount.track_id)
+        .where(UserTrackPlayCount.user_id == user_id)
+        .order_by(UserTrackPlayCount.plays.desc())
+        .limit(limit)
+    )
+    with get_session() as session:
+        return [dict(r) for r in session.execute(stmt).mappings()]
+
+
+def rebuild() -> None:
+    """Recompute all aggregates from history in one transaction.
+
+    History inserts are blocked (SHARE lock) for the duration so no play is
+    counted twice or missed.
+    """
+    with get_session() as session:
+        session.execute(text("LOCK TABLE history IN SHARE MODE"))
+        for model in (TrackPlayCount, UserTrackPlayCount, DailyTrackPlayCount):
+            session.execute(text(f"TRUNCATE {model.__tablename__}"))
+        session.execute(pg_insert(TrackPlayCount).from_select(
+            ['track_id', 'plays', 'last_played_at'],
+            select(History.track_id, func.count(), func.max(History.downloaded_at))
+            .where(History.track_id.isnot(None))
+            .group_by(History.track_id),
+        ))
+        session.execute(pg_insert(UserTrackPlayCount).from_select(
+            ['user_id', 'track_id', 'plays', 'last_played_at'],
+            select(History.user_id, History.track_id, func.count(), func.max(History.downloaded_at))
+            .where(History.user_id.isnot(None), History.track_id.isnot(None))
+            .group_by(History.user_id, History.track_id),
+        ))
+        day = _utc_day(History.downloaded_at)
+        session.execute(pg_insert(DailyTrackPlayCount).from_select(
+            ['day', 'track_id', 'plays'],
+            select(day, History.track_id, func.count())
+            .where(History.track_id.isnot(None), History.downloaded_at.isnot(None))
+            .group_by(day, History.track_id),
+        ))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    if sys.argv[1:] != ['rebuild']:
+        print("usage: python -m services.stats rebuild", file=sys.stderr)
+        sys.exit(2)
+    rebuild()
+    logging.info("Play-count aggregates rebuilt.")
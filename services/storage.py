@@ -0,0 +1,110 @@
+"""On-disk layout of the media cache.
+
+Files are keyed by video id, not by content: <root>/<aa>/<bb>/<stem>.<ext>,
+where the stem is the video id and aabb are the first hex digits of
+sha1(stem), which only spreads files so no directory grows past a few hundred
+entries. Downloads are written under STAGING_DIR (same filesystem) and
+renamed into place with os.replace, so a path returned by a lookup is always a
+complete file. Caches created before sharding are still read from the flat
+layout until ``python -m services.storage migrate`` moves them.
+"""
+import os
+import sys
+import time
+import hashlib
+import logging
+from typing import Iterator, Optional
+
+DOWNLOAD_DIR = os.getenv("MUSIC_DOWNLOAD_DIR", "downloads")
+THUMBS_DIR = os.path.join(DOWNLOAD_DIR, "thumbs")
+STAGING_DIR = os.path.join(DOWNLOAD_DIR, ".incoming")
+for _d in (DOWNLOAD_DIR, THUMBS_DIR, STAGING_DIR):
+    os.makedirs(_d, exist_ok=True)
+
+MEDIA_EXTS = ('mp3', 'mp4')
+
+
+def shard(stem: str) -> str:
+    digest = hashlib.sha1(stem.encode('utf-8')).hexdigest()
+    return os.path.join(digest[:2], digest[2:4])
+
+
+def media_path(stem: str, ext: str, root: str = DOWNLOAD_DIR) -> str:
+    return os.path.join(root, shard(stem), f"{stem}.{ext}")
+
+
+def legacy_path(stem: str, ext: str, root: str = DOWNLOAD_DIR) -> str:
+    return os.path.join(root, f"{stem}.{ext}")
+
+
+def existing_path(stem: str, ext: str, root: str = DOWNLOAD_DIR) -> Optional[str]:
+    """Path of a cached file in the sharded or (not yet migrated) flat layout."""
+    for path in (media_path(stem, ext, root), legacy_path(stem, ext, root)):
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def staging_path(name: str) -> str:
+    return os.path.join(STAGING_DIR, name)
+
+
+def commit(tmp_path: str, final_path: str) -> str:
+    """Atomically publish a finished file at final_path."""
+    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+    os.replace(tmp_path, final_path)
+    return final_path
+
+
+def clean_staging(min_age: float = 0) -> int:
+    """Remove staged files not modified for min_age seconds (0: everything). Returns files removed."""
+    removed = 0
+    cutoff = time.time() - min_age
+    with os.scandir(STAGING_DIR) as entries:
+        for entry in entries:
+            try:
+                if entry.is_file() and (not min_age or entry.stat().st_mtime < cutoff):
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError:
+                logging.warning("Could not remove staged file %s", entry.path)
+    return removed
+
+
+def iter_media(root: str = DOWNLOAD_DIR) -> Iterator[str]:
+    """All committed media files (sharded and flat), skipping staging and thumbnails."""
+    skip = {os.path.abspath(STAGING_DIR), os.path.abspath(THUMBS_DIR)}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if os.path.abspath(os.path.join(dirpath, d)) not in skip]
+        for name in filenames:
+            if name.rsplit('.', 1)[-1] in MEDIA_EXTS:
+                yield os.path.join(dirpath, name)
+
+
+def migrate_flat(dry_run: bool = False) -> int:
+    """Move flat <root>/<id>.<ext> files (media and thumbnails) into the sharded layout."""
+    moved = 0
+    for root, exts in ((DOWNLOAD_DIR, MEDIA_EXTS), (THUMBS_DIR, ('jpg',))):
+        with os.scandir(root) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                stem, _, ext = entry.name.rpartition('.')
+                if ext not in exts or not stem or '.' in stem:
+                    continue  # partial/staging leftovers such as x.src.webm
+                if not dry_run:
+                    commit(entry.path, media_path(stem, ext, root))
+                moved += 1
+                if moved % 10_000 == 0:
+                    logging.info("Moved %d files…", moved)
+    return moved
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    args = sys.argv[1:]
+    if not args or args[0] != 'migrate' or args[1:] not in ([], ['--dry-run']):
+        print("usage: python -m services.storage migrate [--dry-run]", file=sys.stderr)
+        sys.exit(2)
+    count = migrate_flat(dry_run='--dry-run' in args)
+    logging.info("%s %d files into the sharded layout.", "Would move" if '--dry-run' in args else "Moved", count)
@@ -0,0 +1,158 @@
+"""Per-user / per-link-code rate limits, checked before any yt-dlp work.
+
+Each limiter keeps three ints per key (window index, count in the current
+fixed window, count in the previous one) and estimates the sliding-window
+total as current + previous * (share of the previous window still covered).
+State is written to THROTTLE_STATE_FILE periodically and reloaded on start,
+so a restart does not reset everybody's budget.
+"""
+from __future__ import annotations
+
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from typing import Dict, List
+
+from services.metrics import Counter
+
+THROTTLE_WINDOW_SECONDS = int(os.getenv('THROTTLE_WINDOW_SECONDS', '600'))
+THROTTLE_USER_LIMIT = int(os.getenv('THROTTLE_USER_LIMIT', '30'))
+THROTTLE_CODE_LIMIT = int(os.getenv('THROTTLE_CODE_LIMIT', '30'))
+THROTTLE_STATE_FILE = os.getenv('THROTTLE_STATE_FILE', 'throttle_state.json')
+THROTTLE_PERSIST_SECONDS = 60
+
+THROTTLED = Counter('musicbot_throttled_total', 'Requests rejected by rate limits.', ('scope',))
+
+
+class SlidingWindowLimiter:
+    def __init__(self, name: str, limit: int, window: int = THROTTLE_WINDOW_SECONDS):
+        self.name = name
+        self.limit = limit
+        self.window = window
+        self._lock = threading.RLock()
+        self._counts: Dict[str, List[int]] = {}
+
+    def _roll(self, entry: List[int], index: int) -> None:
+        if entry[0] == index:
+            return
+        entry[2] = entry[1] if entry[0] == index - 1 else 0
+        entry[1] = 0
+        entry[0] = index
+
+    def hit(self, key, cost: int = 1, now: float | None = None) -> float:
+        """Count a request. Returns 0 when allowed, else seconds until it would be."""
+        now = time.time() if now is None else now
+        index, offset = divmod(now, self.window)
+        index = int(index)
+        key = str(key)
+        with self._lock:
+            entry = self._counts.setdefault(key, [index, 0, 0])
+            self._roll(entry, index)
+            weight = 1 - offset / self.window
+            used = entry[1] + entry[2] * weight
+            if used + cost > self.limit:
+                THROTTLED.inc(scope=self.name)
+                if entry[2]:
+                    # previous-window share must decay by the excess
+                    retry = (used + cost - self.limit) / entry[2] * self.window
+                    return max(1.0, min(retry, self.window - offset))
+                return max(1.0, self.window - offset)
+            entry[1] += cost
+            return 0.0
+
+    def prune(self, now: float | None = None) -> None:
+        """Drop keys idle for two windows (they count as zero anyway)."""
+        index = int((time.time() if now is None else now) // self.window)
+        with self._lock:
+            for key in [k for k, e in self._counts.items() if e[0] < index - 1]:
+                del self._counts[key]
+
+    def snapshot(self) -> Dict[str, List[int]]:
+        with self._lock:
+            return {k: list(v) for k, v in self._counts.items()}
+
+    def restore(self, counts: Dict[str, List[int]]) -> None:
+        with self._lock:
+            self._counts.update({k: [int(x) for x in v] for k, v in counts.items() if len(v) == 3})
+
+
+_limiters: Dict[str, SlidingWindowLimiter] | None = None
+_init_lock = threading.Lock()
+
+
+def _get_limiters() -> Dict[str, SlidingWindowLimiter]:
+    global _limiters
+    with _init_lock:
+        if _limiters is None:
+            limiters = {
+                'user': SlidingWindowLimiter('user', THROTTLE_USER_LIMIT),
+                'link_code': SlidingWindowLimiter('link_code', THROTTLE_CODE_LIMIT),
+            }
+            try:
+                with open(THROTTLE_STATE_FILE) as fh:
+                    state = json.load(fh)
+                for name, counts in state.items():
+                    if name in limiters:
+                        limiters[name].restore(counts)
+            except FileNotFoundError:
+                pass
+            except Exception:
+                logging.exception("Failed to load throttle state")
+            _limiters = limiters
+        return _limiters
+
+
+def check_user(user_id: int, cost: int = 1) -> float:
+    return _get_limiters()['user'].hit(user_id, cost)
+
+
+def check_link_code(code: int, cost: int = 1) -> float:
+    return _get_limiters()['link_code'].hit(code, cost)
+
+
+def save_state() -> None:
+    limiters = _get_limiters()
+    for limiter in limiters.values():
+        limiter.prune()
+    tmp = THROTTLE_STATE_FILE + '.tmp'
+    with open(tmp, 'w') as fh:
+        json.dump({name: l.snapshot() for name, l in limiters.items()}, fh, separators=(',', ':'))
+    os.replace(tmp, THROTTLE_STATE_FILE)
+
+
+def retry_text(retry_after: float) -> str:
+    return f"⏳ Too many requests. Try again in {int(retry_after // 60) + 1} min."
+
+
+async def reject_if_throttled(update, cost: int = 1) -> bool:
+    """Check the sender's budget; tells them when to retry and returns True if over it.
+
+    cost=0 only refuses senders already over budget, for requests charged later.
+    """
+    retry_after = check_user(update.effective_user.id, cost)
+    if not retry_after:
+        return False
+    text = retry_text(retry_after)
+    if update.callback_query:
+        await update.callback_query.answer(text, show_alert=True)
+    elif update.effective_message:
+        await update.effective_message.reply_text(text)
+    return True
+
+
+async def _persist_job(context) -> None:
+    try:
+        await asyncio.to_thread(save_state)
+    except Exception:
+        logging.exception("Saving throttle state failed")
+
+
+def schedule_persistence(app) -> None:
+    if app.job_queue is None:
+        logging.warning("JobQueue unavailable; throttle counters will not be persisted")
+        return
+    app.job_queue.run_repeating(_persist_job, interval=THROTTLE_PERSIST_SECONDS, first=THROTTLE_PERSIST_SECONDS,
+                                name="throttle_persist")
@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field, asdict
+from functools import wraps
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional
+
+# Lightweight per-request tracing. A trace is opened at an entry point (bot
+# handler or Flask route) and carried in a ContextVar, which asyncio tasks and
+# asyncio.to_thread copy automatically. Hops that do not copy context (the
+# Flask -> PTB loop bridge) pass the trace explicitly via bind().
+
+TRACE_SLOW_MS = float(os.getenv('TRACE_SLOW_MS', '2000'))
+TRACE_FILE = os.getenv('TRACE_FILE', 'slow_traces.jsonl')
+
+_current: ContextVar[Optional["Trace"]] = ContextVar('musicbot_trace', default=None)
+_sinks: List[Callable[["Trace"], None]] = []
+_file_lock = threading.Lock()
+
+
+@dataclass
+class Span:
+    name: str
+    start_ms: float
+    duration_ms: float
+    thread: str
+    error: Optional[str] = None
+
+
+@dataclass
+class Trace:
+    id: str
+    name: str
+    started_at: float
+    attrs: Dict[str, Any] = field(default_factory=dict)
+    spans: List[Span] = field(default_factory=list)
+    duration_ms: Optional[float] = None
+    _t0: float = field(default_factory=time.perf_counter, repr=False)
+    _refs: int = field(default=1, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add_span(self, name: str, start: float, end: float, error: Optional[str] = None) -> None:
+        span = Span(
+            name=name,
+            start_ms=round((start - self._t0) * 1000, 3),
+            duration_ms=round((end - start) * 1000, 3),
+            thread=threading.current_thread().name,
+            error=error,
+        )
+        with self._lock:
+            self.spans.append(span)
+
+    def acquire(self) -> "Trace":
+        """Keep the trace open across a hand-off (e.g. a scheduled coroutine)."""
+        with self._lock:
+            self._refs += 1
+        return self
+
+    def release(self) -> None:
+        with self._lock:
+            self._refs -= 1
+            done = self._refs == 0 and self.duration_ms is None
+            if done:
+                self.duration_ms = round((time.perf_counter() - self._t0) * 1000, 3)
+        if done:
+            _finish(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'id': self.id,
+                'name': self.name,
+                'started_at': self.started_at,
+                'duration_ms': self.duration_ms,
+                'attrs': dict(self.attrs),
+                'spans': [asdict(s) for s in self.spans],
+            }
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def start_trace(name: str, request_id: Optional[str] = None, **attrs) -> Trace:
+    """Create a trace and make it current. Call release() when the entry point is done."""
+    trace = Trace(id=request_id or new_request_id(), name=name, started_at=time.time(), attrs=attrs)
+    _current.set(trace)
+    return trace
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+def current_request_id() -> Optional[str]:
+    trace = _current.get()
+    return trace.id if trace else None
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        trace.add_span(name, start, time.perf_counter(), error)
+
+
+def record_span(name: str, start: float, end: float) -> None:
+    """Record a span measured elsewhere (perf_counter timestamps), e.g. from yt-dlp hooks."""
+    trace = _current.get()
+    if trace is not None:
+        trace.add_span(name, start, end)
+
+
+async def bind(trace: Optional[Trace], coro: Awaitable[Any]) -> Any:
+    """Run a coroutine with the given trace current, releasing the trace afterwards.
+
+    The caller must have called trace.acquire() before handing the coroutine off.
+    """
+    if trace is None:
+        return await coro
+    token = _current.set(trace)
+    try:
+        with span('scheduled'):
+            return await coro
+    finally:
+        _current.reset(token)
+        trace.release()
+
+
+def traced(name: str):
+    """Decorator for PTB handlers: open a trace for the duration of the handler."""
+    def decorator(fn: Callable[..., Awaitable[Any]]):
+        @wraps(fn)
+        async def wrapper(update, context, *args, **kwargs):
+            attrs = {}
+            if getattr(update, 'effective_user', None):
+                attrs['user_id'] = update.effective_user.id
+            token = _current.set(None)
+            trace = start_trace(name, **attrs)
+            try:
+                return await fn(update, context, *args, **kwargs)
+            finally:
+                trace.release()
+                _current.reset(token)
+        return wrapper
+    return decorator
+
+
+def add_sink(sink: Callable[[Trace], None]) -> None:
+    """Register a callback receiving every finished trace (used by benchmarks)."""
+    _sinks.append(sink)
+
+
+def remove_sink(sink: Callable[[Trace], None]) -> None:
+    try:
+        _sinks.remove(sink)
+    except ValueError:
+        pass
+
+
+def _finish(trace: Trace) -> None:
+    for sink in list(_sinks):
+        try:
+            sink(trace)
+        except Exception:
+            logging.exception("Trace sink failed")
+    if TRACE_FILE and trace.duration_ms is not None and trace.duration_ms >= TRACE_SLOW_MS:
+        _dump(trace)
+
+
+def _dump(trace: Trace) -> None:
+    try:
+        line = json.dumps(trace.to_dict(), ensure_ascii=False)
+        with _file_lock:
+            with open(TRACE_FILE, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+        logging.info("Slow trace %s (%s) took %.0f ms", trace.id, trace.name, trace.duration_ms)
+    except Exception:
+        logging.exception("Failed to write slow trace %s", trace.id)
@@ -0,0 +1,161 @@
+"""Out-of-process download/transcode workers.
+
+    python -m services.worker [--concurrency N]
+
+With DOWNLOAD_WORKERS=external the bot only queues rows in download_jobs;
+any number of worker processes (on the same host, sharing the cache
+directory) claim them with SELECT ... FOR UPDATE SKIP LOCKED, run yt-dlp and
+FFmpeg, publish the file into the cache and mark the job ready. Every state
+change is announced with NOTIFY on JOB_CHANNEL so the bot can send the result
+right away. A running job whose heartbeat (updated_at) is older than
+JOB_LEASE_SECONDS belonged to a dead worker and is claimed again.
+"""
+from __future__ import annotations
+
+import os
+import sys
+import socket
+import asyncio
+import logging
+import argparse
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import select, update, or_, and_, text
+
+from db.db_session import get_session
+from db.models import DownloadJob
+from services.youtube import get_youtube_service, MAX_CONCURRENT_DOWNLOADS
+from services.storage import clean_staging
+
+JOB_CHANNEL = 'download_jobs'
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', '120'))
+HEARTBEAT_SECONDS = max(JOB_LEASE_SECONDS // 4, 1)
+# progress changes are written at most this often (each write also renews the lease)
+PROGRESS_MIN_INTERVAL = 1.5
+IDLE_POLL_SECONDS = 1.0
+
+
+def notify(session, job_id: int) -> None:
+    """Sent on commit of the surrounding transaction."""
+    session.execute(text("SELECT pg_notify(:channel, :payload)"), {'channel': JOB_CHANNEL, 'payload': str(job_id)})
+
+
+def claim_job(worker_id: str) -> Optional[dict]:
+    lease_expired = datetime.now(timezone.utc) - timedelta(seconds=JOB_LEASE_SECONDS)
+    while True:
+        with get_session() as session:
+            job = session.execute(
+                select(DownloadJob)
+                .where(or_(DownloadJob.status == 'queued',
+                           and_(DownloadJob.status == 'running', DownloadJob.updated_at < lease_expired)))
+                .order_by(DownloadJob.id)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+            ).scalar_one_or_none()
+            if job is None:
+                return None
+            if job.attempts >= JOB_MAX_ATTEMPTS:
+                job.status = 'failed'
+                job.error = 'too many attempts'
+                notify(session, job.id)
+                continue
+            job.status = 'running'
+            job.attempts += 1
+            job.worker_id = worker_id
+            job.progress = 0
+            return {'id': job.id, 'kind': job.kind, 'video_id': job.video_id, 'url': job.url}
+
+
+def heartbeat(job_id: int, progress: int | None) -> None:
+    with get_session() as session:
+        session.execute(update(DownloadJob).where(DownloadJob.id == job_id, DownloadJob.status == 'running')
+                        .values(progress=progress, updated_at=datetime.now(timezone.utc)))
+        notify(session, job_id)
+
+
+def finish_job(job_id: int, result_meta: dict | None, error: str | None = None) -> None:
+    with get_session() as session:
+        values = {'status': 'ready', 'progress': 100, 'result_meta': result_meta, 'error': None} if error is None \
+            else {'status': 'failed', 'error': error[:2000]}
+        # the bot may have delivered from cache meanwhile (status done); leave that alone
+        session.execute(update(DownloadJob).where(DownloadJob.id == job_id, DownloadJob.status == 'running')
+                        .values(**values))
+        notify(session, job_id)
+
+
+async def process(job: dict) -> None:
+    svc = get_youtube_service()
+    state = {'progress': 0}
+    loop = asyncio.get_running_loop()
+    changed = asyncio.Event()
+
+    def hook(d):
+        # runs in the yt-dlp thread: only wake the writer below
+        total = d.get('total_bytes') or d.get('total_bytes_estimate') or 0
+        if d.get('status') == 'downloading' and total:
+            progress = int(d.get('downloaded_bytes', 0) * 100 / total)
+            if progress != state['progress']:
+                state['progress'] = progress
+                loop.call_soon_threadsafe(changed.set)
+
+    async def beat():
+        while True:
+            try:
+                await asyncio.wait_for(changed.wait(), timeout=HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            changed.clear()
+            await asyncio.to_thread(heartbeat, job['id'], state['progress'])
+            await asyncio.sleep(PROGRESS_MIN_INTERVAL)
+
+    beater = asyncio.create_task(beat())
+    try:
+        ext = 'mp4' if job['kind'] == 'video' else 'mp3'
+        if svc.find_cached_file(job['video_id'], ext=ext):
+            meta = None  # cached meanwhile; the bot fills metadata from the tracks table
+        elif job['kind'] == 'video':
+            _, meta = await svc.download_video(job['url'], progress=hook)
+        else:
+            _, meta = await svc.download_audio(job['url'], progress=hook)
+    except Exception as e:
+        logging.exception("Job %s failed", job['id'])
+        await asyncio.to_thread(finish_job, job['id'], None, repr(e))
+        return
+    finally:
+        beater.cancel()
+    await asyncio.to_thread(finish_job, job['id'], meta.to_dict() if meta else None)
+    logging.info("Job %s ready (%s %s)", job['id'], job['kind'], job['video_id'])
+
+
+async def run(concurrency: int) -> None:
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    # other workers may be mid-download: only drop staged files nobody has written to for a lease
+    removed = clean_staging(min_age=JOB_LEASE_SECONDS)
+    logging.info("Worker %s started with %d slots (%d stale staged files removed)", worker_id, concurrency, removed)
+
+    async def slot():
+        while True:
+            try:
+                job = await asyncio.to_thread(claim_job, worker_id)
+            except Exception:
+                logging.exception("Claiming a job failed")
+                job = None
+            if job is None:
+                await asyncio.sleep(IDLE_POLL_SECONDS)
+                continue
+            await process(job)
+
+    await asyncio.gather(*(slot() for _ in range(concurrency)))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)-8s | %(name)s | %(message)s")
+    parser = argparse.ArgumentParser(prog='python -m services.worker')
+    parser.add_argument('--concurrency', type=int, default=MAX_CONCURRENT_DOWNLOADS)
+    args = parser.parse_args()
+    try:
+        asyncio.run(run(args.concurrency))
+    except KeyboardInterrupt:
+        sys.exit(0)
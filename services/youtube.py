@@ -1,10 +1,20 @@
 import asyncio
+import logging
 import re
 import os
-import uuid
+import math
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, asdict
-from typing import List, Optional, Callable, Dict, Any
-import yt_dlp
+from typing import List, Optional, Callable, Dict, Any, Tuple
+
+from services.metrics import timed, record_cache, STAGE_SECONDS, QUEUE_DEPTH
+from services.tracing import span, record_span
+from services.dedup import register_audio, resolve_alias
+from services import storage
+from services.storage import DOWNLOAD_DIR
+from utils.youtube_url import parse_video_id, canonical_url, is_youtube_url, parse_playlist_id, playlist_url
 
 YDL_AUDIO_OPTS_BASE = {
     "format": "bestaudio/best",
@@ -14,10 +24,26 @@ YDL_AUDIO_OPTS_BASE = {
     "skip_download": True,
 }
 
-DOWNLOAD_DIR = os.getenv("MUSIC_DOWNLOAD_DIR", "downloads")
-os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+YDL_VIDEO_OPTS_BASE = {
+    "format": "best",
+    "noplaylist": True,
+    "quiet": True,
+    "nocheckcertificate": True,
+    "skip_download": True,
+}
+
+# Shared by audio and video: at most this many yt-dlp/FFmpeg jobs run at once
+MAX_CONCURRENT_DOWNLOADS = int(os.getenv("MAX_CONCURRENT_DOWNLOADS", "3"))
+# Bot API upload limit (50 MB on api.telegram.org, up to 2000 MB with a local Bot API server)
+TELEGRAM_UPLOAD_LIMIT = int(os.getenv("TELEGRAM_UPLOAD_LIMIT_MB", "50")) * 1024 * 1024
+MIN_VIDEO_KBPS = 200
+VIDEO_AUDIO_KBPS = 96
+MAX_PLAYLIST_ITEMS = int(os.getenv("MAX_PLAYLIST_ITEMS", "50"))
+# Inputs longer than this are encoded as parallel segments and concatenated
+PARALLEL_ENCODE_SECONDS = int(os.getenv("PARALLEL_ENCODE_SECONDS", "3600"))
+PARALLEL_ENCODE_WORKERS = int(os.getenv("PARALLEL_ENCODE_WORKERS", str(min(os.cpu_count() or 1, 4))))
 
-YT_URL_RE = re.compile(r"^(https?://)?(www\.)?(youtube\.com|youtu\.be)/")
+YT_URL_RE = re.compile(r"^(https?://)?([\w-]+\.)*(youtube\.com|youtube-nocookie\.com|youtu\.be)/")
 
 @dataclass
 class TrackMeta:
@@ -32,9 +58,256 @@ class TrackMeta:
     def to_dict(self):
         return asdict(self)
 
+
+def _youtube_dl(opts: Dict[str, Any]):
+    # yt-dlp's extractor registry is slow to import; pay for it on the first request, not at startup
+    import yt_dlp
+    return yt_dlp.YoutubeDL(opts)
+
+
+def preload_youtube_dl() -> None:
+    """Import yt-dlp in the background once the bot is serving, ahead of the first download."""
+    import yt_dlp  # noqa: F401
+
+
+class MediaTooLargeError(Exception):
+    """The media cannot be delivered within Telegram's upload limit."""
+
+
+@dataclass(frozen=True)
+class AudioProfile:
+    name: str
+    kbps: int
+    channels: int = 2
+
+
+# Best first. Telegram's audio player only takes MP3/M4A, so long content gets a
+# lower MP3 bitrate (mono at the bottom end) rather than Opus.
+AUDIO_PROFILES = (
+    AudioProfile('standard', 192),
+    AudioProfile('long', 128),
+    AudioProfile('compact', 96),
+    AudioProfile('low', 64, 1),
+    AudioProfile('minimal', 48, 1),
+    AudioProfile('tiny', 32, 1),
+)
+# (max duration in seconds, best profile allowed): long mixes do not need 192 kbps
+_PROFILE_TIERS = ((15 * 60, 0), (60 * 60, 1), (float('inf'), 2))
+
+
+def select_audio_profile(duration: int | None, max_bytes: int = TELEGRAM_UPLOAD_LIMIT) -> AudioProfile:
+    """Best profile allowed for the duration whose output fits max_bytes."""
+    if not duration:
+        return AUDIO_PROFILES[0]
+    start = next(i for limit, i in _PROFILE_TIERS if duration <= limit)
+    budget = max_bytes * 0.97
+    for profile in AUDIO_PROFILES[start:]:
+        if profile.kbps * 1000 / 8 * duration <= budget:
+            return profile
+    raise MediaTooLargeError(f"{duration}s of audio does not fit {max_bytes} bytes even at {AUDIO_PROFILES[-1].kbps} kbps")
+
+
+# Segmented MP3 encoding (see _encode_segments)
+MP3_SAMPLE_RATE = 44100
+MP3_FRAME_SAMPLES = 1152
+# LAME's encoder delay plus the decoder's filterbank delay: decoded sample n is input sample n - 1105
+MP3_CODEC_DELAY = 576 + 529
+# frames encoded before/after each segment and dropped when joining
+SEGMENT_OVERLAP_FRAMES = 2
+_MP3_KBPS = (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320)
+_MP3_RATES = (44100, 48000, 32000)
+
+
+def _mp3_frames(data: bytes) -> List[Tuple[int, int]]:
+    """(offset, length) of every frame of a bare MPEG-1 Layer III stream (no ID3/Xing)."""
+    frames = []
+    pos = 0
+    while pos + 4 <= len(data):
+        b1, b2 = data[pos + 1], data[pos + 2]
+        if data[pos] != 0xFF or b1 & 0xFE != 0xFA:
+            raise ValueError(f"not an MPEG-1 Layer III frame at byte {pos}")
+        bitrate, rate = b2 >> 4, (b2 >> 2) & 3
+        kbps = _MP3_KBPS[bitrate] if bitrate < len(_MP3_KBPS) else 0
+        if not kbps or rate == 3:
+            raise ValueError(f"bad MP3 frame header at byte {pos}")
+        length = 144000 * kbps // _MP3_RATES[rate] + ((b2 >> 1) & 1)
+        frames.append((pos, length))
+        pos += length
+    return frames
+
+
+def _encode_segments(src: str, dst: str, profile: AudioProfile, duration: int) -> None:
+    """Encode src to MP3 as parallel time segments and join them without gaps.
+
+    Concatenating independently encoded MP3s is not gapless: each one starts with
+    MP3_CODEC_DELAY samples of priming and ends in padding, and a Xing frame decodes
+    as silence. Instead segments start on frame boundaries and each encode also covers
+    SEGMENT_OVERLAP_FRAMES frames of the neighbouring audio (the first one is preceded
+    by silence), offset so that after dropping those frames decoded sample n is input
+    sample n exactly. The bit reservoir is off, so no kept frame references bits in a
+    dropped one; joins then differ from a single encode only by quantisation noise.
+    """
+    count = max(2, min(PARALLEL_ENCODE_WORKERS, math.ceil(duration / 900)))
+    frames_per_segment = math.ceil(duration * MP3_SAMPLE_RATE / count / MP3_FRAME_SAMPLES)
+    segment = frames_per_segment * MP3_FRAME_SAMPLES
+    overlap = SEGMENT_OVERLAP_FRAMES * MP3_FRAME_SAMPLES
+    # input samples encoded before a boundary so that it falls on the first kept frame
+    lead = overlap - MP3_CODEC_DELAY
+    stem = os.path.splitext(dst)[0]
+    parts = [f"{stem}.seg{i}.mp3" for i in range(count)]
+
+    def encode(i: int) -> None:
+        # resample first: adelay/atrim count samples at their input rate (48 kHz for YouTube Opus)
+        if i == 0:
+            trim = f'adelay={lead}S:all=1'
+        else:
+            # sample-exact; an input -ss into WebM/Opus lands a few hundred samples off
+            trim = f'atrim=start_sample={i * segment - lead}'
+        if i < count - 1:
+            # the last segment runs to the end of the input
+            trim += f',atrim=end_sample={lead + segment + overlap}'
+        subprocess.run([
+            'ffmpeg', '-y', '-v', 'error', '-i', src, '-vn', '-af', f'aresample={MP3_SAMPLE_RATE},{trim}',
+            '-ac', str(profile.channels), '-c:a', 'libmp3lame', '-b:a', f'{profile.kbps}k', '-reservoir', '0',
+            '-write_xing', '0', '-id3v2_version', '0', '-f', 'mp3', parts[i],
+        ], check=True, capture_output=True)
+
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(count) as pool:
+            list(pool.map(encode, range(count)))
+        with open(dst, 'wb') as out:
+            for i, part in enumerate(parts):
+                with open(part, 'rb') as fh:
+                    data = fh.read()
+                frames = _mp3_frames(data)[SEGMENT_OVERLAP_FRAMES:]
+                if i < count - 1:
+                    frames = frames[:frames_per_segment]
+                if frames:
+                    out.write(data[frames[0][0]:frames[-1][0] + frames[-1][1]])
+    finally:
+        for path in parts:
+            if os.path.exists(path):
+                os.remove(path)
+    end = time.perf_counter()
+    STAGE_SECONDS.observe(end - start, stage='transcode')
+    record_span('transcode', start, end)
+
+
+@dataclass
+class VideoFormatChoice:
+    format_spec: str
+    mode: str  # 'premuxed' (no processing), 'remux' (stream copy) or 'transcode'
+    estimated_bytes: int | None = None
+    target_kbps: int | None = None
+
+
+def _meta_from_info(info: Dict[str, Any], fallback_url: str) -> TrackMeta:
+    return TrackMeta(
+        id=info.get('id'),
+        title=info.get('title'),
+        url=info.get('webpage_url') or fallback_url,
+        duration=info.get('duration'),
+        uploader=info.get('uploader'),
+        thumbnail=info.get('thumbnail'),
+    )
+
+
+def _estimate_size(f: Dict[str, Any], duration: float) -> int | None:
+    size = f.get('filesize') or f.get('filesize_approx')
+    if size:
+        return int(size)
+    if f.get('tbr') and duration:
+        return int(f['tbr'] * 1000 / 8 * duration)
+    return None
+
+
+def select_video_format(info: Dict[str, Any], max_bytes: int) -> VideoFormatChoice:
+    """Pick the cheapest way to get a video under max_bytes.
+
+    Preference: best pre-muxed MP4 that fits (no processing), then the best
+    MP4 video + M4A audio pair that fits (stream-copy remux), then a
+    bounded-bitrate transcode of a <=720p source.
+    """
+    duration = info.get('duration') or 0
+    formats = info.get('formats') or []
+    budget = int(max_bytes * 0.97)  # container overhead
+
+    def has_video(f):
+        return f.get('vcodec') not in (None, 'none')
+
+    def has_audio(f):
+        return f.get('acodec') not in (None, 'none')
+
+    def quality(f):
+        return (f.get('height') or 0, f.get('tbr') or 0)
+
+    premuxed = []
+    for f in formats:
+        if has_video(f) and has_audio(f) and f.get('ext') == 'mp4':
+            size = _estimate_size(f, duration)
+            if size and size <= budget:
+                premuxed.append((quality(f), size, f))
+    if premuxed:
+        _, size, f = max(premuxed, key=lambda x: x[0])
+        return VideoFormatChoice(f['format_id'], 'premuxed', size)
+
+    videos = sorted((f for f in formats if has_video(f) and not has_audio(f) and f.get('ext') == 'mp4'),
+                    key=quality, reverse=True)
+    audios = sorted((f for f in formats if has_audio(f) and not has_video(f) and f.get('ext') in ('m4a', 'mp4')),
+                    key=lambda f: f.get('abr') or f.get('tbr') or 0, reverse=True)
+    for v in videos:
+        v_size = _estimate_size(v, duration)
+        if not v_size or v_size >= budget:
+            continue
+        for a in audios:
+            a_size = _estimate_size(a, duration)
+            if a_size and v_size + a_size <= budget:
+                return VideoFormatChoice(f"{v['format_id']}+{a['format_id']}", 'remux', v_size + a_size)
+
+    if not duration:
+        raise MediaTooLargeError("unknown duration; cannot bound the transcode size")
+    target_kbps = int(budget * 8 / duration / 1000)
+    if target_kbps < MIN_VIDEO_KBPS + VIDEO_AUDIO_KBPS:
+        raise MediaTooLargeError(f"{duration}s video needs {target_kbps} kbps to fit the upload limit")
+    return VideoFormatChoice(
+        "best[height<=720][ext=mp4]/bestvideo[height<=720]+bestaudio/best",
+        'transcode',
+        budget,
+        target_kbps,
+    )
+
+
+def _transcode_video(src: str, dst: str, total_kbps: int) -> None:
+    video_kbps = total_kbps - VIDEO_AUDIO_KBPS
+    height = 720 if video_kbps >= 1200 else 480 if video_kbps >= 500 else 360
+    cmd = [
+        'ffmpeg', '-y', '-loglevel', 'error', '-i', src,
+        '-vf', f"scale=-2:'min({height},ih)'",
+        '-c:v', 'libx264', '-preset', 'veryfast',
+        '-b:v', f'{video_kbps}k', '-maxrate', f'{video_kbps}k', '-bufsize', f'{video_kbps * 2}k',
+        '-c:a', 'aac', '-b:a', f'{VIDEO_AUDIO_KBPS}k',
+        '-movflags', '+faststart', dst,
+    ]
+    start = time.perf_counter()
+    subprocess.run(cmd, check=True, capture_output=True)
+    end = time.perf_counter()
+    STAGE_SECONDS.observe(end - start, stage='transcode')
+    record_span('transcode', start, end)
+
+
+@dataclass
+class _SharedDownload:
+    hooks: List[Callable[[Dict[str, Any]], None]]
+    task: Optional[asyncio.Task] = None
+    waiters: int = 0
+
+
 class YouTubeService:
     def __init__(self):
-        pass
+        # Bounded worker pool + single-flight shared by every download kind
+        self._slots = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS)
+        self._inflight: Dict[str, _SharedDownload] = {}
 
     @staticmethod
     def _build_search_query(query: str, limit: int) -> str:
@@ -44,32 +317,35 @@ class YouTubeService:
 
     @staticmethod
     def is_url(text: str) -> bool:
-        return bool(YT_URL_RE.match(text.strip()))
+        return bool(YT_URL_RE.match(text.strip())) or is_youtube_url(text)
 
     @staticmethod
     def normalize_url(url: str) -> str:
-        return url.strip()
+        video_id = parse_video_id(url)
+        return canonical_url(video_id) if video_id else url.strip()
 
     @staticmethod
-    def cached_path_for(track_id: str) -> str:
-        return os.path.join(DOWNLOAD_DIR, f"{track_id}.mp3")
+    def cached_path_for(track_id: str, ext: str = 'mp3') -> str:
+        return storage.media_path(track_id, ext)
 
     @staticmethod
-    def find_cached_file(track_id: str) -> str | None:
+    def find_cached_file(track_id: str, ext: str = 'mp3') -> str | None:
         if not track_id:
             return None
-        path = YouTubeService.cached_path_for(track_id)
-        if os.path.isfile(path):
-            return path
-        # fallback: legacy pattern search (title-random.mp3) not deterministic; skip for now
-        # Could implement glob search if needed
-        return None
+        cache = 'audio' if ext == 'mp3' else 'video'
+        path = storage.existing_path(track_id, ext)
+        if path is None and ext == 'mp3':
+            # same audio stored under another upload's id (see services/dedup.py)
+            alias = resolve_alias(track_id)
+            path = storage.existing_path(alias, ext) if alias else None
+        record_cache(cache, path is not None)
+        return path
 
     async def search(self, query: str, limit: int = 5) -> List[TrackMeta]:
         search_q = self._build_search_query(query, limit)
         def _extract():
             opts = {**YDL_AUDIO_OPTS_BASE}
-            with yt_dlp.YoutubeDL(opts) as ydl:
+            with _youtube_dl(opts) as ydl:
                 info = ydl.extract_info(search_q, download=False)
                 entries = info.get('entries') if 'entries' in info else [info]
                 results: List[TrackMeta] = []
@@ -83,46 +359,209 @@ class YouTubeService:
                         thumbnail=e.get('thumbnail'),
                     ))
                 return results
-        return await asyncio.to_thread(_extract)
+        with timed('search'), span('search'):
+            return await asyncio.to_thread(_extract)
+
+    async def fetch_meta(self, url: str) -> TrackMeta:
+        """Metadata-only extraction for a single video URL (no download)."""
+        safe_url = self.normalize_url(url)
+        def _extract():
+            with _youtube_dl({**YDL_AUDIO_OPTS_BASE}) as ydl:
+                info = ydl.extract_info(safe_url, download=False)
+                if 'entries' in info:
+                    info = info['entries'][0]
+                return _meta_from_info(info, safe_url)
+        with timed('metadata'), span('metadata'):
+            return await asyncio.to_thread(_extract)
+
+    async def extract_playlist(self, url: str, limit: int = MAX_PLAYLIST_ITEMS) -> tuple[str, List[TrackMeta]]:
+        """Title and entries of a playlist/album without resolving each video (flat extraction)."""
+        playlist_id = parse_playlist_id(url)
+        safe_url = playlist_url(playlist_id) if playlist_id else url.strip()
+        def _extract():
+            opts = {
+                **YDL_AUDIO_OPTS_BASE,
+                'noplaylist': False,
+                'extract_flat': 'in_playlist',
+                'playlistend': limit,
+            }
+            with _youtube_dl(opts) as ydl:
+                info = ydl.extract_info(safe_url, download=False)
+            entries: List[TrackMeta] = []
+            for e in (info.get('entries') or [])[:limit]:
+                video_id = e.get('id')
+                if not video_id or not parse_video_id(canonical_url(video_id)):
+                    continue  # deleted/private placeholders, channels, nested playlists
+                entries.append(TrackMeta(
+                    id=video_id,
+                    title=e.get('title') or video_id,
+                    url=canonical_url(video_id),
+                    duration=int(e['duration']) if e.get('duration') else None,
+                    uploader=e.get('uploader') or e.get('channel'),
+                    thumbnail=(e.get('thumbnails') or [{}])[-1].get('url'),
+                ))
+            return info.get('title') or 'Playlist', entries
+        with timed('metadata'), span('playlist_metadata'):
+            return await asyncio.to_thread(_extract)
+
+    async def _shared_download(self, key: str, stage: str, work: Callable, progress=None):
+        """Run work(hook) in a worker thread under the download pool, once per key.
+
+        Concurrent callers for the same key await one shared task; their progress
+        hooks are fanned out from the single running download. A cancelled caller
+        only detaches itself: the download is cancelled once no caller is left.
+        """
+        entry = self._inflight.get(key)
+        if entry is None:
+            record_cache('download_inflight', False)
+            entry = _SharedDownload(hooks=[])
+            entry.task = asyncio.ensure_future(self._run_download(stage, work, entry.hooks))
+            # failures nobody is left to await must not warn as "exception never retrieved"
+            entry.task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            entry.task.add_done_callback(lambda _: self._inflight.get(key) is entry and self._inflight.pop(key))
+            self._inflight[key] = entry
+            leader = True
+        else:
+            record_cache('download_inflight', True)
+            leader = False
+        if progress:
+            entry.hooks.append(progress)
+        entry.waiters += 1
+        try:
+            if leader:
+                return await asyncio.shield(entry.task)
+            with span(f'{stage}_shared'):
+                return await asyncio.shield(entry.task)
+        except asyncio.CancelledError:
+            entry.waiters -= 1
+            if progress in entry.hooks:
+                entry.hooks.remove(progress)
+            if not entry.waiters and not entry.task.done():
+                # later callers start a fresh download instead of joining the cancelled one
+                if self._inflight.get(key) is entry:
+                    self._inflight.pop(key)
+                entry.task.cancel()
+            raise
+
+    async def _run_download(self, stage: str, work: Callable, hooks: List[Callable[[Dict[str, Any]], None]]):
+        def fanout(d):
+            for h in list(hooks):
+                try:
+                    h(d)
+                except Exception:
+                    logging.debug("Progress hook failed", exc_info=True)
+
+        QUEUE_DEPTH.inc(queue='downloads')
+        try:
+            await self._slots.acquire()
+        finally:
+            QUEUE_DEPTH.dec(queue='downloads')
+        job = asyncio.ensure_future(asyncio.to_thread(work, fanout))
+        # the worker thread cannot be interrupted: keep its slot until it actually ends
+        job.add_done_callback(lambda _: self._slots.release())
+        with timed(stage), span(stage):
+            return await asyncio.shield(job)
 
     async def download_audio(self, url: str, *, progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> tuple[str, TrackMeta]:
         safe_url = self.normalize_url(url)
-        tmp_id = uuid.uuid4().hex
-        def hook(d):
-            if progress:
-                progress(d)
-        def _download():
+        transcode_started: Dict[str, float] = {}
+        def pp_hook(d):
+            # yt-dlp reports postprocessor start/finish; FFmpegExtractAudio is the transcode
+            key = d.get('postprocessor')
+            if d.get('status') == 'started':
+                transcode_started[key] = time.perf_counter()
+            elif d.get('status') == 'finished' and key in transcode_started:
+                start, end = transcode_started.pop(key), time.perf_counter()
+                STAGE_SECONDS.observe(end - start, stage='transcode')
+                record_span('transcode', start, end)
+        def _download(hook):
+            with _youtube_dl({**YDL_AUDIO_OPTS_BASE}) as ydl:
+                info = ydl.extract_info(safe_url, download=False)
+            if 'entries' in info:
+                info = info['entries'][0]
+            meta = _meta_from_info(info, safe_url)
+            profile = select_audio_profile(meta.duration)
+            segmented = bool(meta.duration and meta.duration > PARALLEL_ENCODE_SECONDS and PARALLEL_ENCODE_WORKERS > 1)
             opts = {
                 **YDL_AUDIO_OPTS_BASE,
                 'skip_download': False,
-                # deterministic filename: id.ext (yt-dlp will substitute id)
-                'outtmpl': os.path.join(DOWNLOAD_DIR, '%(id)s.%(ext)s'),
-                'postprocessors': [{
+                # written to staging, published by rename once complete
+                'outtmpl': storage.staging_path('%(id)s.%(ext)s'),
+                'progress_hooks': [hook],
+                'postprocessor_hooks': [pp_hook],
+            }
+            if not segmented:
+                opts['postprocessors'] = [{
                     'key': 'FFmpegExtractAudio',
                     'preferredcodec': 'mp3',
-                    'preferredquality': '192',
-                }],
+                    'preferredquality': str(profile.kbps),
+                }]
+                if profile.channels == 1:
+                    opts['postprocessor_args'] = {'extractaudio': ['-ac', '1']}
+            with _youtube_dl(opts) as ydl:
+                # re-use the extraction above instead of hitting YouTube twice
+                result = ydl.process_ie_result(info, download=True)
+                source = os.path.splitext(ydl.prepare_filename(result))[0]
+            staged = source + '.mp3'
+            if segmented:
+                src_path = (result.get('requested_downloads') or [{}])[0].get('filepath') or ydl.prepare_filename(result)
+                try:
+                    _encode_segments(src_path, staged, profile, meta.duration)
+                finally:
+                    if os.path.exists(src_path) and src_path != staged:
+                        os.remove(src_path)
+            logging.info("Audio %s: profile %s (%d kbps%s)", meta.id, profile.name, profile.kbps,
+                         ", segmented" if segmented else "")
+            final_path = storage.commit(staged, self.cached_path_for(meta.id))
+            try:
+                final_path = register_audio(meta.id, final_path, meta.duration, profile.name)
+            except Exception:
+                logging.exception("Audio dedup failed for %s", meta.id)
+            return final_path, meta
+        key = f"audio:{parse_video_id(safe_url) or safe_url}"
+        return await self._shared_download(key, 'download', _download, progress)
+
+    async def download_video(self, url: str, *, progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+                             max_bytes: int = TELEGRAM_UPLOAD_LIMIT) -> tuple[str, TrackMeta]:
+        """Download a video as MP4 that fits max_bytes (see select_video_format)."""
+        safe_url = self.normalize_url(url)
+        def _download(hook):
+            with _youtube_dl({**YDL_VIDEO_OPTS_BASE}) as ydl:
+                info = ydl.extract_info(safe_url, download=False)
+            if 'entries' in info:
+                info = info['entries'][0]
+            meta = _meta_from_info(info, safe_url)
+            final_path = self.cached_path_for(meta.id, 'mp4')
+            choice = select_video_format(info, max_bytes)
+            logging.info("Video %s: %s (%s), est. %s bytes", meta.id, choice.mode, choice.format_spec, choice.estimated_bytes)
+            opts = {
+                **YDL_VIDEO_OPTS_BASE,
+                'skip_download': False,
+                'format': choice.format_spec,
+                'merge_output_format': 'mp4',
+                'outtmpl': storage.staging_path('%(id)s.src.%(ext)s'),
                 'progress_hooks': [hook],
             }
-            with yt_dlp.YoutubeDL(opts) as ydl:
-                info = ydl.extract_info(safe_url, download=True)
-                if 'entries' in info:
-                    info = info['entries'][0]
-                final_path = self.cached_path_for(info.get('id')) if info.get('id') else ydl.prepare_filename(info)
-                if not final_path.endswith('.mp3'):
-                    # ensure mp3 extension
-                    base = os.path.splitext(final_path)[0]
-                    final_path = base + '.mp3'
-                meta = TrackMeta(
-                    id=info.get('id'),
-                    title=info.get('title'),
-                    url=info.get('webpage_url') or safe_url,
-                    duration=info.get('duration'),
-                    uploader=info.get('uploader'),
-                    thumbnail=info.get('thumbnail'),
-                )
-                return final_path, meta
-        return await asyncio.to_thread(_download)
+            with _youtube_dl(opts) as ydl:
+                # re-use the extraction above instead of hitting YouTube twice
+                result = ydl.process_ie_result(info, download=True)
+                downloads = result.get('requested_downloads') or [{}]
+                src_path = downloads[0].get('filepath') or ydl.prepare_filename(result)
+            staged = storage.staging_path(f"{meta.id}.mp4")
+            try:
+                if choice.mode == 'transcode':
+                    _transcode_video(src_path, staged, choice.target_kbps)
+                else:
+                    os.replace(src_path, staged)
+            finally:
+                if os.path.exists(src_path):
+                    os.remove(src_path)
+            if os.path.getsize(staged) > max_bytes:
+                os.remove(staged)
+                raise MediaTooLargeError(f"{meta.id}: result exceeds {max_bytes} bytes")
+            return storage.commit(staged, final_path), meta
+        key = f"video:{parse_video_id(safe_url) or safe_url}"
+        return await self._shared_download(key, 'download_video', _download, progress)
 
 _youtube_service: YouTubeService | None = None
 
@@ -2,7 +2,7 @@ from telegram import ReplyKeyboardMarkup, InlineKeyboardMarkup, InlineKeyboardBu
 from urllib.parse import urlparse
 
 MAIN_MENU_LAYOUT = [
-    ["📥 Download"],
+    ["📥 Download", "🎬 Video"],
     ["🔍 Search", "📃 Lyrics"],
 ]
 
@@ -22,3 +22,8 @@ def account_inline_keyboard(website_url: str, linked: bool) -> InlineKeyboardMar
     buttons = [[InlineKeyboardButton("Link account", callback_data="link:request")]]
 
     return InlineKeyboardMarkup(buttons)
+
+
+def favorite_keyboard(video_id: str, favorite: bool) -> InlineKeyboardMarkup:
+    label = "❤️ In favorites" if favorite else "🤍 Add to favorites"
+    return InlineKeyboardMarkup([[InlineKeyboardButton(label, callback_data=f"fav:{video_id}")]])
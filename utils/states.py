@@ -4,6 +4,8 @@ from enum import Enum
 class UserMode(str, Enum):
     IDLE = "idle"
     DOWNLOAD = "download"
+    LYRICS = "lyrics"
+    VIDEO = "video"
 
 STATE_KEY = "mode"
 
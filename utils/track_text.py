@@ -0,0 +1,21 @@
+import re
+
+# Clean-up of YouTube titles/uploaders into (artist, title) for matching and lookups.
+
+_NOISE_RE = re.compile(
+    r"\s*[\(\[][^\)\]]*(official|video|audio|lyrics?|visuali[sz]er|hd|hq|4k|remaster(ed)?|mv|clip)[^\)\]]*[\)\]]",
+    re.IGNORECASE,
+)
+_FEAT_RE = re.compile(r"\s+(feat\.?|ft\.?|featuring)\s+.*$", re.IGNORECASE)
+_CHANNEL_SUFFIX_RE = re.compile(r"(\s+-\s+topic|vevo|official)$", re.IGNORECASE)
+
+
+def normalize_query(title: str, uploader: str | None) -> tuple[str, str]:
+    """Derive (artist, title) from a YouTube title/uploader such as 'Artist - Song (Official Video)'."""
+    clean = _NOISE_RE.sub('', title or '').strip()
+    artist = _CHANNEL_SUFFIX_RE.sub('', (uploader or '').strip()).strip()
+    if ' - ' in clean:
+        left, right = clean.split(' - ', 1)
+        artist, clean = left.strip(), right.strip()
+    clean = _FEAT_RE.sub('', clean).strip(' "\'')
+    return artist, clean
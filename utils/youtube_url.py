@@ -0,0 +1,89 @@
+import re
+from urllib.parse import urlsplit, parse_qs
+
+# Local (network-free) parsing of YouTube links into canonical video ids.
+
+VIDEO_ID_RE = re.compile(r"^[A-Za-z0-9_-]{11}$")
+
+_YOUTUBE_HOSTS = (
+    'youtube.com',
+    'youtube-nocookie.com',
+)
+_SHORT_HOSTS = ('youtu.be',)
+# /shorts/<id>, /embed/<id>, /live/<id>, /v/<id>, /e/<id>
+_PATH_ID_PREFIXES = ('shorts', 'embed', 'live', 'v', 'e')
+
+
+def _host_matches(host: str, domains) -> bool:
+    return any(host == d or host.endswith('.' + d) for d in domains)
+
+
+def _split(text: str):
+    text = (text or '').strip()
+    if not text or any(ch.isspace() for ch in text):
+        return None
+    if '://' not in text:
+        text = 'https://' + text
+    try:
+        parts = urlsplit(text)
+    except ValueError:
+        return None
+    host = (parts.hostname or '').lower()
+    if not (_host_matches(host, _YOUTUBE_HOSTS) or _host_matches(host, _SHORT_HOSTS)):
+        return None
+    return host, parts
+
+
+def is_youtube_url(text: str) -> bool:
+    return _split(text) is not None
+
+
+def parse_video_id(text: str) -> str | None:
+    """Extract the 11-char video id from any youtube.com / youtu.be / shorts / music link."""
+    split = _split(text)
+    if not split:
+        return None
+    host, parts = split
+    segments = [s for s in parts.path.split('/') if s]
+    query = parse_qs(parts.query)
+    candidate = None
+    if _host_matches(host, _SHORT_HOSTS):
+        candidate = segments[0] if segments else None
+    elif segments and segments[0] == 'watch':
+        candidate = (query.get('v') or [None])[0]
+    elif len(segments) >= 2 and segments[0] in _PATH_ID_PREFIXES:
+        candidate = segments[1]
+    elif segments and segments[0] == 'attribution_link':
+        inner = (query.get('u') or [''])[0]
+        candidate = (parse_qs(urlsplit(inner).query).get('v') or [None])[0]
+    if candidate and VIDEO_ID_RE.match(candidate):
+        return candidate
+    return None
+
+
+def canonical_url(video_id: str) -> str:
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+
+PLAYLIST_ID_RE = re.compile(r"^[A-Za-z0-9_-]{10,64}$")
+
+
+def parse_playlist_id(text: str) -> str | None:
+    """The list= id of a playlist / album link (also present on watch?v=...&list=... links)."""
+    split = _split(text)
+    if not split:
+        return None
+    _, parts = split
+    candidate = (parse_qs(parts.query).get('list') or [None])[0]
+    if candidate and PLAYLIST_ID_RE.match(candidate):
+        return candidate
+    return None
+
+
+def is_playlist_url(text: str) -> bool:
+    """A link to a playlist itself (not to one video that happens to be played from a playlist)."""
+    return parse_playlist_id(text) is not None and parse_video_id(text) is None
+
+
+def playlist_url(playlist_id: str) -> str:
+    return f"https://www.youtube.com/playlist?list={playlist_id}"